@@ -0,0 +1,393 @@
+"""Admission control and client-disconnect cancellation for analysis requests"""
+import asyncio
+import heapq
+import hmac
+import itertools
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.requests import HTTPConnection
+from app.exceptions import OverloadedError, TooManyRequestsError, ClientClosedRequestError, DeadlineExceededError
+from app.metrics import ADMISSION_DECISIONS, REQUESTS_CANCELLED
+from app.scheduler import Priority, set_request_priority, upstream_priority, upstream_deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+# Analysis requests worked on at once; further ones wait in the admission queue
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+# Waiting requests beyond this are rejected with 503 and Retry-After
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+# Requests one client may have running or queued; more are rejected with 429
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "16"))
+# Identify clients by the first X-Forwarded-For address (only behind a trusted proxy)
+ADMISSION_TRUST_FORWARDED = os.getenv("ADMISSION_TRUST_FORWARDED", "False").lower() == "true"
+# Browser origins (frontend URLs) allowed to call the API, comma-separated
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ALLOW_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
+    if origin.strip()
+]
+# Shared secret for maintenance endpoints (sent as X-Admin-Token); they are refused while unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+ADMIN_TOKEN_HEADER = "x-admin-token"
+
+# Clients may announce their own timeout (seconds) so work is not done past it
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"
+# Weight of the newest request in the per-lane service time average
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionController:
+    """
+    Bounds the analysis requests a worker works on at once.
+
+    Up to max_in_flight requests run; later ones wait in a queue served by
+    lane (interactive before bulk) and in arrival order within a lane. When
+    the queue is full, new requests are rejected with 503 and a Retry-After
+    estimate instead of piling up as coroutines. A client that already has
+    max_per_client requests running or queued gets 429.
+
+    Under overload, capacity goes to requests that can still be answered. A
+    waiter is shed instead of admitted once its deadline is closer than the
+    usual service time of its lane, and a waiter whose client disconnected
+    leaves the queue.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, max_per_client: int):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.max_per_client = max(1, max_per_client)
+        self.in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future, Optional[float]]] = []
+        self._sequence = itertools.count()
+        self._clients: dict[str, int] = {}
+        # Moving average of how long admitted requests hold their slot, per lane
+        self._service_seconds: dict[Priority, Optional[float]] = {lane: None for lane in Priority}
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "client_limit": 0, "deadline": 0}
+
+    def queued(self) -> int:
+        return sum(1 for _, _, future, _ in self._waiters if not future.done())
+
+    def service_time(self, priority: Priority) -> float:
+        """Typical seconds a request of the lane holds its slot (0 before any has finished)"""
+        return self._service_seconds[priority] or 0.0
+
+    def retry_after(self) -> float:
+        """Seconds until the queue ahead of a new request has likely drained"""
+        per_request = self.service_time(Priority.INTERACTIVE) or 1.0
+        return max(1.0, per_request * (self.queued() + 1) / self.max_in_flight)
+
+    async def acquire(self, client: str, priority: Priority, deadline: Optional[float]) -> None:
+        """
+        Wait for a slot to work on a request.
+
+        Args:
+            client: Client identity for the per-client cap
+            priority: Lane of the request
+            deadline: Event loop time after which the request is of no use
+
+        Raises:
+            TooManyRequestsError: If the client is at its concurrency cap
+            OverloadedError: If the queue is full, or the request cannot be
+                answered before its deadline
+        """
+        lane = priority.name.lower()
+        if self._clients.get(client, 0) >= self.max_per_client:
+            self.rejected["client_limit"] += 1
+            ADMISSION_DECISIONS.inc(lane=lane, result="client_limit")
+            raise TooManyRequestsError(retry_after=self.retry_after())
+
+        if self.in_flight < self.max_in_flight and not self.queued():
+            self.in_flight += 1
+        else:
+            if self.queued() >= self.max_queue:
+                self.rejected["queue_full"] += 1
+                ADMISSION_DECISIONS.inc(lane=lane, result="queue_full")
+                logger.warning("[Admission] Queue full (%s waiting), rejecting %s request", self.max_queue, lane)
+                raise OverloadedError(retry_after=self.retry_after())
+            await self._wait(client, priority, deadline)
+
+        self._clients[client] = self._clients.get(client, 0) + 1
+        self.admitted += 1
+        ADMISSION_DECISIONS.inc(lane=lane, result="admitted")
+
+    async def _wait(self, client: str, priority: Priority, deadline: Optional[float]) -> None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future, deadline))
+        # Count the waiter against its client so one client cannot fill the queue
+        self._clients[client] = self._clients.get(client, 0) + 1
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.0, deadline - loop.time() - self.service_time(priority))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._shed(priority)
+            raise OverloadedError("Request cannot be answered before its deadline", self.retry_after())
+        except BaseException:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted a slot just as the waiter was cancelled: pass it on
+                self.in_flight -= 1
+                self._dispatch()
+            raise
+        finally:
+            self._forget(client)
+
+    def _shed(self, priority: Priority) -> None:
+        self.rejected["deadline"] += 1
+        ADMISSION_DECISIONS.inc(lane=priority.name.lower(), result="deadline")
+
+    def _dispatch(self) -> None:
+        now = asyncio.get_running_loop().time()
+        while self._waiters and self.in_flight < self.max_in_flight:
+            priority, _, future, deadline = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            if deadline is not None and now + self.service_time(priority) > deadline:
+                self._shed(priority)
+                future.set_exception(OverloadedError("Request cannot be answered before its deadline", self.retry_after()))
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def release(self, client: str, priority: Priority, seconds: Optional[float]) -> None:
+        """
+        Give back the slot of a finished request.
+
+        Args:
+            client: Client identity passed to acquire
+            priority: Lane passed to acquire
+            seconds: How long the request held its slot; None for requests
+                that were cut short, which say nothing about service time
+        """
+        self.in_flight -= 1
+        self._forget(client)
+        if seconds is not None:
+            previous = self._service_seconds[priority]
+            self._service_seconds[priority] = seconds if previous is None else (
+                previous + _SERVICE_TIME_ALPHA * (seconds - previous)
+            )
+        self._dispatch()
+
+    def _forget(self, client: str) -> None:
+        remaining = self._clients.get(client, 0) - 1
+        if remaining > 0:
+            self._clients[client] = remaining
+        else:
+            self._clients.pop(client, None)
+
+    def stats(self) -> dict:
+        """Return slot usage, queue depth, service times and rejection counters"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued(),
+            "max_queue": self.max_queue,
+            "clients": len(self._clients),
+            "service_seconds": {lane.name.lower(): round(self.service_time(lane), 3) for lane in Priority},
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+
+admission = AdmissionController(
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_MAX_PER_CLIENT
+) if ADMISSION_ENABLED else None
+
+
+def client_key(request: HTTPConnection) -> str:
+    """Identity of the client sending a request or opening a WebSocket, for the per-client cap"""
+    if ADMISSION_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def origin_allowed(connection: HTTPConnection) -> bool:
+    """
+    Whether a browser request comes from one of the ALLOWED_ORIGINS pages.
+
+    CORS only covers requests that JavaScript may read the answer of;
+    WebSocket handshakes and simple POSTs (e.g. text/plain) reach the
+    server from any page, so routes that spend upstream quota check the
+    Origin header themselves. Requests without one come from non-browser
+    clients (curl, scripts) and are allowed.
+
+    Args:
+        connection: Incoming request or WebSocket
+
+    Returns:
+        True if the request may proceed
+    """
+    origin = connection.headers.get("origin")
+    return origin is None or origin in ALLOWED_ORIGINS
+
+
+def admin_allowed(request: Request) -> bool:
+    """
+    Whether a request carries the ADMIN_TOKEN.
+
+    Args:
+        request: Incoming request
+
+    Returns:
+        True if ADMIN_TOKEN is set and the X-Admin-Token header matches it
+    """
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+
+def start_request(request: Request, priority: Priority) -> None:
+    """
+    Put a request in a scheduler lane, with a deadline shortened by X-Request-Timeout if sent.
+
+    Args:
+        request: Incoming request
+        priority: Lane for the request's upstream calls
+    """
+    timeout = None
+    value = request.headers.get(REQUEST_TIMEOUT_HEADER)
+    if value:
+        try:
+            timeout = float(value)
+        except ValueError:
+            pass
+    set_request_priority(priority, timeout if timeout is not None and timeout > 0 else None)
+
+
+async def admit(request: Request) -> Callable[[bool], None]:
+    """
+    Wait for an admission slot for the current request (see start_request).
+
+    Args:
+        request: Incoming request
+
+    Returns:
+        Callback that releases the slot, called exactly once with whether the
+        work ran to completion
+
+    Raises:
+        TooManyRequestsError: If the client is at its concurrency cap
+        OverloadedError: If the request is shed
+    """
+    if admission is None:
+        return lambda completed: None
+    client = client_key(request)
+    priority = upstream_priority.get()
+    await admission.acquire(client, priority, upstream_deadline.get())
+    started = time.monotonic()
+    return lambda completed: admission.release(client, priority, time.monotonic() - started if completed else None)
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has been read by now, so the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await work, cancelling it when the client disconnects or the request deadline passes.
+
+    Cancellation reaches the upstream calls made on the request's behalf, so
+    an abandoned request stops costing tokens. Calls shared with other
+    requests via single-flight keep running while anyone still awaits them.
+
+    Args:
+        request: Incoming request whose body has already been read
+        work: Awaitable doing the request's work
+
+    Returns:
+        Result of work
+
+    Raises:
+        ClientClosedRequestError: If the client disconnected first
+        DeadlineExceededError: If the deadline passed first
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    deadline = upstream_deadline.get()
+    timeout = None if deadline is None else max(0.0, deadline - loop.time())
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    # Let the cancellation unwind so pooled connections and slots are given back
+    await asyncio.gather(task, return_exceptions=True)
+    if watcher in done:
+        logger.info("[Admission] Client disconnected, cancelled its analysis")
+        REQUESTS_CANCELLED.inc(reason="disconnect")
+        raise ClientClosedRequestError()
+    logger.warning("[Admission] Request deadline passed, cancelled its analysis")
+    REQUESTS_CANCELLED.inc(reason="deadline")
+    raise DeadlineExceededError()
+
+
+async def run_request(request: Request, work: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run a request's work under admission control, cancelling it on disconnect or deadline.
+
+    The wait for an admission slot is cancelled the same way, so a client
+    that gives up while queued leaves the queue.
+
+    Args:
+        request: Incoming request (call start_request first)
+        work: Zero-argument coroutine factory doing the request's work
+
+    Returns:
+        Result of work
+    """
+    async def admitted() -> T:
+        release = await admit(request)
+        completed = False
+        try:
+            result = await work()
+            completed = True
+            return result
+        finally:
+            release(completed)
+
+    return await cancel_on_disconnect(request, admitted())
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Streaming response that holds an admission slot until the stream ends.
+
+    Acquire the slot before building the response, so a shed request still
+    gets a proper 503: `release = await cancel_on_disconnect(request, admit(request))`. The slot is released however the
+    stream ends, including when the client disconnects before it starts.
+    """
+
+    def __init__(self, content, release: Callable[[bool], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        completed = False
+        try:
+            await super().__call__(scope, receive, send)
+            completed = True
+        finally:
+            self._release(completed)
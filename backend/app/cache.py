@@ -0,0 +1,377 @@
+"""Tiered cache for sentence analyses (in-memory LRU, read-only snapshot, on-disk SQLite)"""
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Iterator, Optional
+from app.models import SentenceAnalysis
+from app.snapshot import AnalysisSnapshot
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "True").lower() == "true"
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+# Set to an empty string to disable the persistent tier
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", ".cache/analysis_cache.sqlite3")
+ANALYSIS_CACHE_DISK_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_DISK_TTL_SECONDS", str(30 * 86400)))
+# Snapshot written by prewarm.py, mapped at startup if present
+ANALYSIS_SNAPSHOT_PATH = os.getenv("ANALYSIS_SNAPSHOT_PATH", ".cache/analysis_snapshot.bin")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sentence(sentence: str) -> str:
+    """
+    Normalize a sentence for use as a cache key.
+
+    Unicode is NFC-normalized and runs of whitespace are collapsed, so that
+    "Ik  heb een kat" and "Ik heb een kat" share one entry. Case is kept
+    because the components echo the words as written.
+
+    Args:
+        sentence: Sentence to normalize
+
+    Returns:
+        Normalized sentence text
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", sentence)).strip()
+
+
+def sentence_hash(sentence: str) -> str:
+    """
+    Identify a sentence by its normalized text, independent of model and prompt.
+
+    Clients use these hashes to tell the server which sentences they already
+    have analyses for (see /api/analyze/incremental).
+
+    Args:
+        sentence: Sentence text
+
+    Returns:
+        16-character hex digest
+    """
+    return hashlib.sha256(normalize_sentence(sentence).encode("utf-8")).hexdigest()[:16]
+
+
+def make_cache_key(sentence: str, model: str, prompt_version: str) -> str:
+    """
+    Build a content-addressed key for a sentence analysis.
+
+    Args:
+        sentence: Sentence being analyzed
+        model: LLM model that produces the analysis
+        prompt_version: Version of the analysis prompt
+
+    Returns:
+        Hex digest identifying the (sentence, model, prompt) combination
+    """
+    material = f"{prompt_version}\x00{model}\x00{normalize_sentence(sentence)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Bounded in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, SentenceAnalysis]] = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[SentenceAnalysis]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, analysis = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return analysis
+
+    def set(self, key: str, analysis: SentenceAnalysis) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, analysis)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        return count
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    Persistent cache tier backed by SQLite in WAL mode.
+
+    WAL lets several uvicorn workers read concurrently while one writes, so
+    the file can be shared between processes on the same host. Each thread
+    gets its own connection because calls are dispatched via asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self.expirations = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS analyses (
+                    key TEXT PRIMARY KEY,
+                    prompt_version TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_prompt_version ON analyses (prompt_version)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[SentenceAnalysis]:
+        conn = self._connection()
+        row = conn.execute("SELECT payload, created_at FROM analyses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        payload, created_at = row
+        if created_at + self.ttl_seconds < time.time():
+            conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+            conn.commit()
+            self.expirations += 1
+            return None
+        return SentenceAnalysis.model_validate_json(payload)
+
+    def set(self, key: str, analysis: SentenceAnalysis, prompt_version: str, model: str) -> None:
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO analyses (key, prompt_version, model, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+            (key, prompt_version, model, analysis.model_dump_json(), time.time()),
+        )
+        conn.commit()
+
+    def invalidate(self, prompt_version: Optional[str] = None) -> int:
+        conn = self._connection()
+        if prompt_version is None:
+            cursor = conn.execute("DELETE FROM analyses")
+        else:
+            cursor = conn.execute("DELETE FROM analyses WHERE prompt_version = ?", (prompt_version,))
+        conn.commit()
+        return cursor.rowcount
+
+    def purge_other_versions(self, prompt_version: str) -> int:
+        conn = self._connection()
+        cursor = conn.execute("DELETE FROM analyses WHERE prompt_version != ?", (prompt_version,))
+        conn.commit()
+        return cursor.rowcount
+
+    def iter_analyses(self, prompt_version: str, limit: int) -> Iterator[SentenceAnalysis]:
+        """Yield the most recent analyses stored for a prompt version (consume in the calling thread)"""
+        rows = self._connection().execute(
+            "SELECT payload FROM analyses WHERE prompt_version = ? ORDER BY created_at DESC LIMIT ?",
+            (prompt_version, limit),
+        )
+        for (payload,) in rows:
+            yield SentenceAnalysis.model_validate_json(payload)
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+
+
+class AnalysisCache:
+    """
+    Cache of SentenceAnalysis results keyed on sentence, model and prompt version.
+
+    Lookups go to the in-memory LRU first, then to the pre-warmed snapshot
+    (if one is open) and finally to the SQLite store; snapshot and disk hits
+    are promoted into memory. Disk access runs in a worker thread so the event
+    loop is never blocked on SQLite. The snapshot is read-only: new analyses
+    go to memory and disk, and invalidation leaves it alone.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, path: str = "", disk_ttl_seconds: float = 0):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.disk = SQLiteStore(path, disk_ttl_seconds) if path else None
+        self.snapshot: Optional[AnalysisSnapshot] = None
+        self.memory_hits = 0
+        self.snapshot_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    async def get(self, key: str) -> Optional[SentenceAnalysis]:
+        """
+        Look up a cached analysis.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Cached SentenceAnalysis, or None on a miss
+        """
+        analysis = self.memory.get(key)
+        if analysis is not None:
+            self.memory_hits += 1
+            return analysis
+
+        if self.snapshot is not None:
+            analysis = self.snapshot.get(key)
+            if analysis is not None:
+                self.snapshot_hits += 1
+                self.memory.set(key, analysis)
+                return analysis
+
+        if self.disk is not None:
+            try:
+                analysis = await asyncio.to_thread(self.disk.get, key)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning("[Cache] Disk lookup failed: %s", e)
+                analysis = None
+            if analysis is not None:
+                self.disk_hits += 1
+                self.memory.set(key, analysis)
+                return analysis
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, analysis: SentenceAnalysis, prompt_version: str, model: str) -> None:
+        """
+        Store an analysis in both tiers.
+
+        Args:
+            key: Cache key from make_cache_key
+            analysis: Analysis to store
+            prompt_version: Prompt version the analysis was produced with
+            model: Model the analysis was produced with
+        """
+        self.memory.set(key, analysis)
+        self.writes += 1
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, analysis, prompt_version, model)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning("[Cache] Disk write failed: %s", e)
+
+    async def invalidate(self, prompt_version: Optional[str] = None) -> int:
+        """
+        Drop cached entries.
+
+        The memory tier is not indexed by prompt version, so it is always
+        cleared completely; entries for the current prompt are simply
+        re-promoted from disk on the next hit.
+
+        Args:
+            prompt_version: Only drop disk entries for this prompt version (all if None)
+
+        Returns:
+            Number of entries removed
+        """
+        removed = self.memory.clear()
+        if self.disk is not None:
+            removed += await asyncio.to_thread(self.disk.invalidate, prompt_version)
+        logger.info("[Cache] Invalidated %s entries (prompt_version=%s)", removed, prompt_version)
+        return removed
+
+    def open_snapshot(self, path: str, prompt_version: str) -> None:
+        """
+        Map a pre-warmed snapshot as the tier between memory and disk, replacing any open one.
+
+        Args:
+            path: Snapshot file written by prewarm.py; nothing happens if it does not exist
+            prompt_version: Current prompt version, to warn about a snapshot that cannot hit
+        """
+        snapshot = AnalysisSnapshot.open(path)
+        if snapshot is None:
+            return
+        self.close_snapshot()
+        self.snapshot = snapshot
+        built_for = snapshot.metadata.get("prompt_version")
+        if built_for != prompt_version:
+            logger.warning("[Cache] Snapshot %s was built for prompt version %s, not %s; it will not hit",
+                           path, built_for, prompt_version)
+        logger.info("[Cache] Mapped snapshot %s with %s entries", path, len(snapshot))
+
+    def close_snapshot(self) -> None:
+        """Unmap the snapshot, if one is open"""
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+
+    async def purge_other_versions(self, prompt_version: str) -> int:
+        """
+        Remove disk entries produced by any prompt version other than the given one.
+
+        Args:
+            prompt_version: Prompt version to keep
+
+        Returns:
+            Number of entries removed
+        """
+        if self.disk is None:
+            return 0
+        removed = await asyncio.to_thread(self.disk.purge_other_versions, prompt_version)
+        if removed:
+            logger.info("[Cache] Purged %s entries from previous prompt versions", removed)
+        return removed
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters for both tiers"""
+        hits = self.memory_hits + self.snapshot_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "snapshot_hits": self.snapshot_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "errors": self.errors,
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "memory_evictions": self.memory.evictions,
+            "memory_expirations": self.memory.expirations,
+            "snapshot_entries": len(self.snapshot) if self.snapshot is not None else 0,
+            "disk_enabled": self.disk is not None,
+            "disk_expirations": self.disk.expirations if self.disk is not None else 0,
+        }
+
+
+analysis_cache: Optional[AnalysisCache] = (
+    AnalysisCache(
+        max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+        ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+        path=ANALYSIS_CACHE_PATH,
+        disk_ttl_seconds=ANALYSIS_CACHE_DISK_TTL_SECONDS,
+    )
+    if ANALYSIS_CACHE_ENABLED
+    else None
+)
@@ -1,4 +1,6 @@
 """Custom exception classes"""
+import math
+from typing import Optional
 from fastapi import HTTPException
 
 class ValidationError(HTTPException):
@@ -11,7 +13,42 @@ class NotFoundError(HTTPException):
     def __init__(self, detail: str = "Resource not found"):
         super().__init__(status_code=404, detail=detail)
 
+class ForbiddenError(HTTPException):
+    """Raised when a request is not allowed from where it was sent"""
+    def __init__(self, detail: str = "Forbidden"):
+        super().__init__(status_code=403, detail=detail)
+
 class ProcessingError(HTTPException):
     """Raised when text processing fails"""
     def __init__(self, detail: str = "Error processing text"):
         super().__init__(status_code=500, detail=detail)
+
+class UpstreamError(ProcessingError):
+    """Raised when the upstream LLM API answers with an error status"""
+    def __init__(self, upstream_status: int, retry_after: Optional[float] = None):
+        super().__init__(f"OpenRouter API error: {upstream_status}")
+        self.upstream_status = upstream_status
+        self.retry_after = retry_after
+
+class DeadlineExceededError(HTTPException):
+    """Raised when a request cannot be answered before its deadline"""
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=504, detail=detail)
+
+class OverloadedError(HTTPException):
+    """Raised when a request is shed because the server is at capacity"""
+    def __init__(self, detail: str = "Server is busy, please retry later", retry_after: float = 1.0,
+                 status_code: int = 503):
+        super().__init__(status_code=status_code, detail=detail,
+                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        self.retry_after = retry_after
+
+class TooManyRequestsError(OverloadedError):
+    """Raised when a client already has as many requests in progress as it may"""
+    def __init__(self, detail: str = "Too many concurrent requests", retry_after: float = 1.0):
+        super().__init__(detail, retry_after, status_code=429)
+
+class ClientClosedRequestError(HTTPException):
+    """Raised when the client disconnected before its request was answered"""
+    def __init__(self, detail: str = "Client closed the request"):
+        super().__init__(status_code=499, detail=detail)
@@ -0,0 +1,120 @@
+"""Shared pooled HTTP client for upstream LLM calls"""
+import logging
+import os
+import weakref
+import httpx
+
+logger = logging.getLogger(__name__)
+
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "100"))
+OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "30"))
+OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "False").lower() == "true"
+OPENROUTER_CONNECT_TIMEOUT = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5"))
+OPENROUTER_READ_TIMEOUT = float(os.getenv("OPENROUTER_READ_TIMEOUT", "90"))
+OPENROUTER_WRITE_TIMEOUT = float(os.getenv("OPENROUTER_WRITE_TIMEOUT", "10"))
+OPENROUTER_POOL_TIMEOUT = float(os.getenv("OPENROUTER_POOL_TIMEOUT", "10"))
+
+
+class PoolStats:
+    """
+    Counters for connection reuse on a pooled client.
+
+    httpcore does not report when it opens a connection, so new connections
+    are detected by comparing the pool contents against the connections we
+    have already seen each time a response arrives.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self._seen = weakref.WeakSet()
+
+    def observe(self, client: httpx.AsyncClient) -> None:
+        self.requests += 1
+        for connection in _pool_connections(client):
+            if connection not in self._seen:
+                self._seen.add(connection)
+                self.connections_opened += 1
+
+
+def _pool_connections(client: httpx.AsyncClient) -> list:
+    # Reaches into httpx/httpcore internals; degrade to "no data" if they move
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Create the long-lived client used for all OpenRouter requests.
+
+    Pool limits, keep-alive expiry, HTTP/2 and the individual timeouts are
+    read from the environment. HTTP/2 requires the optional ``h2`` package
+    (``pip install httpx[http2]``) and is silently skipped without it.
+
+    Returns:
+        Configured httpx.AsyncClient; the caller owns it and must close it
+    """
+    http2 = OPENROUTER_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("[HTTP] OPENROUTER_HTTP2 is enabled but 'h2' is not installed; falling back to HTTP/1.1")
+        http2 = False
+
+    stats = PoolStats()
+
+    async def on_response(response: httpx.Response) -> None:
+        stats.observe(client)
+
+    client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=OPENROUTER_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=OPENROUTER_CONNECT_TIMEOUT,
+            read=OPENROUTER_READ_TIMEOUT,
+            write=OPENROUTER_WRITE_TIMEOUT,
+            pool=OPENROUTER_POOL_TIMEOUT,
+        ),
+        event_hooks={"response": [on_response]},
+    )
+    client.pool_stats = stats
+    logger.info(
+        "[HTTP] Created upstream client (http2=%s, max_connections=%s, max_keepalive=%s, keepalive_expiry=%ss)",
+        http2, OPENROUTER_MAX_CONNECTIONS, OPENROUTER_MAX_KEEPALIVE_CONNECTIONS, OPENROUTER_KEEPALIVE_EXPIRY,
+    )
+    return client
+
+
+def pool_stats(client: httpx.AsyncClient) -> dict:
+    """
+    Describe the current state of a client's connection pool.
+
+    Args:
+        client: Client created by create_http_client
+
+    Returns:
+        Dictionary with connection counts and reuse counters
+    """
+    connections = _pool_connections(client)
+    stats = getattr(client, "pool_stats", None)
+    requests = stats.requests if stats else 0
+    opened = stats.connections_opened if stats else 0
+    return {
+        "connections": len(connections),
+        "idle_connections": sum(1 for c in connections if c.is_idle()),
+        "http2_connections": sum(1 for c in connections if "HTTP/2" in c.info()),
+        "requests": requests,
+        "connections_opened": opened,
+        "reuse_ratio": round(1 - opened / requests, 4) if requests else 0.0,
+    }
@@ -0,0 +1,310 @@
+"""Background bulk-analysis jobs with on-disk checkpoints"""
+import asyncio
+import json
+import logging
+import os
+import re
+import struct
+import time
+import uuid
+from typing import Optional
+from app.models import JobStatus, JobResult, JobResultsPage
+from app.llm_service import OpenRouterService
+from app.exceptions import NotFoundError
+from app.scheduler import Priority, set_request_priority
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("JOBS_DIR", ".cache/jobs")
+# Number of jobs analyzed at the same time; sentences within a job share the per-request limit
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+# Sentences analyzed between two checkpoints
+JOBS_CHUNK_SENTENCES = int(os.getenv("JOBS_CHUNK_SENTENCES", "16"))
+JOBS_MAX_TEXT_BYTES = int(os.getenv("JOBS_MAX_TEXT_BYTES", str(5 * 1024 * 1024)))
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+# Entry of results.idx: byte offset of a line in results.jsonl
+_OFFSET = struct.Struct("<Q")
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class JobStore:
+    """
+    File layout of the jobs directory.
+
+    Each job lives in its own directory holding the input text, the split
+    sentences, a meta.json checkpoint and a results.jsonl file with one line
+    per analyzed sentence, in sentence order. results.idx holds the byte
+    offset of every line, so a page of results is read by seeking instead of
+    scanning from the start. meta.json records how many sentences (and bytes
+    of results.jsonl) are committed; anything past that is a half-written
+    chunk and is truncated on resume.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, job_id: str, name: str) -> str:
+        return os.path.join(self.root, job_id, name)
+
+    def exists(self, job_id: str) -> bool:
+        return bool(_JOB_ID_RE.match(job_id)) and os.path.isfile(self.path(job_id, "meta.json"))
+
+    def create(self, job_id: str, text: str, sentences: list[str], meta: dict) -> None:
+        os.makedirs(os.path.join(self.root, job_id), exist_ok=True)
+        with open(self.path(job_id, "input.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        with open(self.path(job_id, "sentences.json"), "w", encoding="utf-8") as f:
+            json.dump(sentences, f, ensure_ascii=False)
+        open(self.path(job_id, "results.jsonl"), "wb").close()
+        open(self.path(job_id, "results.idx"), "wb").close()
+        self.write_meta(job_id, meta)
+
+    def read_meta(self, job_id: str) -> dict:
+        with open(self.path(job_id, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_meta(self, job_id: str, meta: dict) -> None:
+        # Write-then-rename so a crash never leaves a torn checkpoint
+        tmp = self.path(job_id, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path(job_id, "meta.json"))
+
+    def read_sentences(self, job_id: str) -> list[str]:
+        with open(self.path(job_id, "sentences.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def append_results(self, job_id: str, committed_lines: int, committed_bytes: int, lines: list[str]) -> int:
+        """Append result lines after the last checkpoint and return the new committed size"""
+        encoded = [line.encode("utf-8") for line in lines]
+        offsets = bytearray()
+        position = committed_bytes
+        for line in encoded:
+            offsets += _OFFSET.pack(position)
+            position += len(line)
+        with open(self.path(job_id, "results.jsonl"), "r+b") as f:
+            f.truncate(committed_bytes)
+            f.seek(committed_bytes)
+            f.write(b"".join(encoded))
+            f.flush()
+            os.fsync(f.fileno())
+        # Offsets past the checkpoint are never read, so the index needs no fsync of its own
+        with open(self.path(job_id, "results.idx"), "r+b") as f:
+            f.truncate(committed_lines * _OFFSET.size)
+            f.seek(committed_lines * _OFFSET.size)
+            f.write(offsets)
+        return position
+
+    def _line_offset(self, job_id: str, index: int) -> Optional[int]:
+        """Byte offset of a result line, or None if the index does not cover it"""
+        try:
+            with open(self.path(job_id, "results.idx"), "rb") as f:
+                f.seek(index * _OFFSET.size)
+                entry = f.read(_OFFSET.size)
+        except FileNotFoundError:
+            return None
+        return _OFFSET.unpack(entry)[0] if len(entry) == _OFFSET.size else None
+
+    def read_results(self, job_id: str, committed_lines: int, committed_bytes: int, offset: int, limit: int) -> list[str]:
+        """Return up to limit committed result lines starting at line offset"""
+        if offset >= committed_lines:
+            return []
+        start = self._line_offset(job_id, offset)
+        if start is None:
+            return []
+        lines = []
+        position = start
+        with open(self.path(job_id, "results.jsonl"), "rb") as f:
+            f.seek(start)
+            for line in f:
+                position += len(line)
+                # Only hand out lines covered by the checkpoint
+                if position > committed_bytes or len(lines) >= limit:
+                    break
+                lines.append(line.decode("utf-8"))
+        return lines
+
+    def job_ids(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if self.exists(name))
+
+
+class JobManager:
+    """
+    Bounded pool of workers analyzing queued jobs.
+
+    Jobs are split into sentences up front and analyzed chunk by chunk in the
+    bulk scheduler lane. After every chunk the results are appended to the
+    job's JSONL file and the checkpoint is advanced, so memory use does not
+    grow with document size and a restarted server resumes unfinished jobs
+    from their last checkpoint.
+    """
+
+    def __init__(self, root: str, max_workers: int, chunk_sentences: int):
+        self.store = JobStore(root)
+        self.max_workers = max_workers
+        self.chunk_sentences = max(1, chunk_sentences)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list[asyncio.Task] = []
+        self._active: dict[str, dict] = {}
+
+    async def start(self) -> None:
+        """Start the worker pool and re-queue jobs left unfinished by a previous run"""
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+        resumed = 0
+        for job_id in await asyncio.to_thread(self.store.job_ids):
+            meta = await asyncio.to_thread(self.store.read_meta, job_id)
+            if meta["status"] in (QUEUED, RUNNING):
+                self._queue.put_nowait(job_id)
+                resumed += 1
+        if resumed:
+            logger.info("[Jobs] Resuming %s unfinished job(s)", resumed)
+
+    async def stop(self) -> None:
+        """Cancel the workers; running jobs keep their last checkpoint and resume on the next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, text: str, name: Optional[str] = None) -> JobStatus:
+        """
+        Create a job for a text and queue it for analysis.
+
+        Args:
+            text: Document text to analyze
+            name: Optional label, e.g. the uploaded file name
+
+        Returns:
+            JobStatus of the queued job
+        """
+        job_id = uuid.uuid4().hex
+        # Segmenting a multi-megabyte upload takes seconds; keep it off the event loop
+        sentences = await asyncio.to_thread(OpenRouterService._split_sentences, text)
+        now = time.time()
+        meta = {
+            "id": job_id,
+            "name": name,
+            "status": QUEUED,
+            "created_at": now,
+            "updated_at": now,
+            "total_sentences": len(sentences),
+            "processed_sentences": 0,
+            "failed_sentences": 0,
+            "results_bytes": 0,
+            "error": None,
+        }
+        await asyncio.to_thread(self.store.create, job_id, text, sentences, meta)
+        self._queue.put_nowait(job_id)
+        logger.info("[Jobs] Queued job %s with %s sentences", job_id, len(sentences))
+        return JobStatus(**meta)
+
+    async def status(self, job_id: str) -> JobStatus:
+        """
+        Return the progress of a job.
+
+        Raises:
+            NotFoundError: If the job does not exist
+        """
+        meta = self._active.get(job_id)
+        if meta is None:
+            meta = await self._load_meta(job_id)
+        return JobStatus(**meta)
+
+    async def results(self, job_id: str, offset: int, limit: int) -> JobResultsPage:
+        """
+        Page through the analyzed sentences of a job.
+
+        Args:
+            job_id: Job to read
+            offset: Index of the first sentence to return
+            limit: Maximum number of sentences to return
+
+        Returns:
+            JobResultsPage with the committed results in that range
+
+        Raises:
+            NotFoundError: If the job does not exist
+        """
+        meta = self._active.get(job_id) or await self._load_meta(job_id)
+        lines = await asyncio.to_thread(
+            self.store.read_results, job_id, meta["processed_sentences"], meta["results_bytes"], offset, limit
+        )
+        return JobResultsPage(
+            job_id=job_id,
+            status=meta["status"],
+            offset=offset,
+            total=meta["processed_sentences"],
+            items=[JobResult.model_validate_json(line) for line in lines],
+        )
+
+    def stats(self) -> dict:
+        """Return queue length and the jobs currently being worked on"""
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": {job_id: meta["processed_sentences"] for job_id, meta in self._active.items()},
+        }
+
+    async def _load_meta(self, job_id: str) -> dict:
+        if not self.store.exists(job_id):
+            raise NotFoundError(f"Job {job_id} not found")
+        return await asyncio.to_thread(self.store.read_meta, job_id)
+
+    async def _worker(self, number: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error("[Jobs] Job %s failed: %s", job_id, e, exc_info=True)
+                meta = self._active.get(job_id) or await asyncio.to_thread(self.store.read_meta, job_id)
+                meta.update(status=FAILED, error=str(e), updated_at=time.time())
+                await asyncio.to_thread(self.store.write_meta, job_id, meta)
+            finally:
+                self._active.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        meta = await asyncio.to_thread(self.store.read_meta, job_id)
+        sentences = await asyncio.to_thread(self.store.read_sentences, job_id)
+        meta.update(status=RUNNING, updated_at=time.time())
+        self._active[job_id] = meta
+        await asyncio.to_thread(self.store.write_meta, job_id, meta)
+        logger.info("[Jobs] Running job %s from sentence %s/%s", job_id, meta["processed_sentences"], len(sentences))
+
+        for start in range(meta["processed_sentences"], len(sentences), self.chunk_sentences):
+            chunk = sentences[start:start + self.chunk_sentences]
+            # Fresh bulk-lane deadline per chunk; a long document must not starve its own tail
+            set_request_priority(Priority.BULK)
+            analyses = await OpenRouterService.analyze_sentences(chunk)
+            lines = [
+                JobResult(index=start + i, analysis=analysis).model_dump_json() + "\n"
+                for i, analysis in enumerate(analyses)
+            ]
+            results_bytes = await asyncio.to_thread(
+                self.store.append_results, job_id, start, meta["results_bytes"], lines
+            )
+            meta.update(
+                processed_sentences=start + len(chunk),
+                failed_sentences=meta["failed_sentences"] + sum(1 for a in analyses if a.error),
+                results_bytes=results_bytes,
+                updated_at=time.time(),
+            )
+            await asyncio.to_thread(self.store.write_meta, job_id, meta)
+
+        meta.update(status=COMPLETED, updated_at=time.time())
+        await asyncio.to_thread(self.store.write_meta, job_id, meta)
+        logger.info("[Jobs] Completed job %s (%s failed sentences)", job_id, meta["failed_sentences"])
+
+
+job_manager = JobManager(root=JOBS_DIR, max_workers=JOBS_MAX_WORKERS, chunk_sentences=JOBS_CHUNK_SENTENCES)
@@ -0,0 +1,297 @@
+"""Incremental and tolerant parsing of sentence-analysis JSON from LLM output"""
+import json
+import re
+from typing import Any, Callable, NamedTuple, Optional
+
+# Opening code fence, e.g. "```json"; the closing fence may be missing from truncated output
+_FENCE_RE = re.compile(r"```[A-Za-z]*[ \t]*\n?")
+# Candidate start positions tried before giving up on a strict parse
+_MAX_CANDIDATES = 8
+_decoder = json.JSONDecoder()
+
+
+class Recovered(NamedTuple):
+    """JSON value recovered from LLM output"""
+    value: Any  # Parsed document, or what could be salvaged of it; None if nothing was found
+    complete: bool  # The document parsed as a whole; False if it was salvaged
+    truncated: bool  # The document was cut off before its closing bracket (e.g. at max_tokens)
+
+
+class ComponentStreamParser:
+    """
+    Incrementally parse an analysis object as the LLM streams it.
+
+    The expected document is the object requested by the analysis prompt:
+    {"sentence_translation": "...", "components": [{...}, {...}]}. Text is fed
+    in arbitrary chunks; each element of the "components" array is reported as
+    soon as its closing brace arrives, and "sentence_translation" as soon as its
+    string value is complete. Anything before the first "{" (prose, code fences)
+    is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.components: list[dict] = []
+        self.sentence_translation: Optional[str] = None
+        self.complete = False
+        self._pos = 0
+        self._started = False
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False
+        self._last_key: Optional[str] = None
+        self._components_depth: Optional[int] = None
+        self._component_start = 0
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """
+        Consume a chunk of completion text.
+
+        Args:
+            chunk: Next piece of the streamed content
+
+        Returns:
+            Events completed by this chunk: ("translation", str) and ("component", dict)
+        """
+        self.buffer += chunk
+        events: list[tuple[str, Any]] = []
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer) and not self.complete:
+            ch = buffer[i]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._stack.append("{")
+                    self._expect_key = True
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(buffer[self._string_start:i + 1], events)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                if (ch == "[" and len(self._stack) == 1 and self._last_key == "components"
+                        and self._components_depth is None):
+                    self._components_depth = 2
+                self._stack.append(ch)
+                self._expect_key = ch == "{"
+                if ch == "{" and self._components_depth is not None and len(self._stack) == self._components_depth + 1:
+                    self._component_start = i
+            elif ch in "}]":
+                if not self._stack:
+                    break
+                self._stack.pop()
+                if (ch == "}" and self._components_depth is not None
+                        and len(self._stack) == self._components_depth):
+                    self._end_component(buffer[self._component_start:i + 1], events)
+                elif ch == "]" and self._components_depth is not None and len(self._stack) == self._components_depth - 1:
+                    self._components_depth = None
+                if not self._stack:
+                    self.complete = True
+            elif ch == ":":
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1] == "{"
+            i += 1
+        self._pos = i
+        return events
+
+    def _end_string(self, literal: str, events: list[tuple[str, Any]]) -> None:
+        if len(self._stack) != 1:
+            return
+        try:
+            value = json.loads(literal)
+        except json.JSONDecodeError:
+            return
+        if self._expect_key:
+            self._last_key = value
+        elif self._last_key == "sentence_translation" and self.sentence_translation is None:
+            self.sentence_translation = value
+            events.append(("translation", value))
+
+    def _end_component(self, text: str, events: list[tuple[str, Any]]) -> None:
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            return
+        if isinstance(item, dict):
+            self.components.append(item)
+            events.append(("component", item))
+
+
+def _array_elements(text: str, start: int) -> tuple[list[dict], bool]:
+    """
+    Parse the object elements of the JSON array opening at text[start] that closed, even if the array did not.
+
+    Returns:
+        Tuple of (element objects, whether the array itself closed)
+    """
+    items: list[dict] = []
+    depth = 0
+    in_string = escape = False
+    element_start = 0
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+            if depth == 2:
+                element_start = i
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return items, True
+            if depth == 1 and ch == "}":
+                try:
+                    item = json.loads(text[element_start:i + 1])
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(item, dict):
+                    items.append(item)
+    return items, False
+
+
+def strip_code_fences(content: str, opener: str) -> str:
+    """Return the body of the first Markdown code fence in content if it holds JSON, else content unchanged"""
+    match = _FENCE_RE.search(content)
+    if match is None:
+        return content
+    end = content.find("```", match.end())
+    body = content[match.end():end if end != -1 else len(content)]
+    return body if opener in body else content
+
+
+def _decode(text: str, opener: str, accept: Callable[[Any], bool]) -> tuple[Any, Optional[int]]:
+    """
+    Strictly decode the first acceptable JSON value starting at an opener character.
+
+    Text after the value (closing fences, explanations) is ignored, so a
+    stray brace in trailing prose cannot widen the span.
+
+    Returns:
+        Tuple of (decoded value or None, start of the candidate that decoded
+        furthest before failing, for salvaging)
+    """
+    best_start, best_reach = None, -1
+    start = text.find(opener)
+    for _ in range(_MAX_CANDIDATES):
+        if start == -1:
+            break
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError as e:
+            if e.pos > best_reach:
+                best_start, best_reach = start, e.pos
+            # Candidates inside a value that failed are fragments of it (a "components" list,
+            # "[]" in a string), never the document
+            end = _span_end(text, start)
+            if end is None:
+                # Cut off: any later candidate lies inside this value
+                break
+            start = text.find(opener, end)
+            continue
+        if accept(value):
+            return value, None
+        start = text.find(opener, start + 1)
+    return None, best_start
+
+
+def _span_end(text: str, start: int) -> Optional[int]:
+    """Index just past the bracket closing the one at text[start], or None if it never closes"""
+    depth = 0
+    in_string = escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def recover_analysis(content: str) -> Recovered:
+    """
+    Parse a single-sentence analysis object out of LLM output.
+
+    Surrounding prose and code fences are ignored. If the object does not
+    parse, typically because generation stopped at max_tokens, the
+    translation and every component object that closed are salvaged.
+
+    Args:
+        content: Completion text
+
+    Returns:
+        Recovered dict with "sentence_translation" and "components" keys (value
+        is None if no object was found)
+    """
+    text = strip_code_fences(content, "{") if "```" in content else content
+    value, salvage_from = _decode(text, "{", lambda v: isinstance(v, dict) and "components" in v)
+    if value is not None:
+        return Recovered(value, True, False)
+    if salvage_from is None:
+        return Recovered(None, False, False)
+    parser = ComponentStreamParser()
+    parser.feed(text[salvage_from:])
+    if not parser.components and parser.sentence_translation is None:
+        return Recovered(None, False, not parser.complete)
+    salvaged = {"sentence_translation": parser.sentence_translation, "components": parser.components}
+    return Recovered(salvaged, False, not parser.complete)
+
+
+def recover_array(content: str) -> Recovered:
+    """
+    Parse a batch response (a JSON array of analysis objects) out of LLM output.
+
+    Like recover_analysis, but for arrays: when the array is cut off, every
+    element object that closed is kept. An empty array is not an answer, so
+    a stray "[]" cannot pass for the batch.
+
+    Args:
+        content: Completion text
+
+    Returns:
+        Recovered list of element dicts (value is None if no array was found)
+    """
+    text = strip_code_fences(content, "[") if "```" in content else content
+    value, salvage_from = _decode(
+        text, "[", lambda v: isinstance(v, list) and bool(v) and all(isinstance(i, dict) and "components" in i for i in v)
+    )
+    if value is not None:
+        return Recovered(value, True, False)
+    if salvage_from is None:
+        return Recovered(None, False, False)
+    items, closed = _array_elements(text, salvage_from)
+    return Recovered(items or None, False, not closed)
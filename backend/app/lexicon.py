@@ -0,0 +1,523 @@
+"""Local Dutch lexicon that analyzes simple drill sentences without an LLM call"""
+import json
+import logging
+import os
+import re
+import sys
+from typing import Iterable, NamedTuple, Optional
+from app.models import SentenceComponent, SentenceAnalysis
+from app.metrics import LEXICON_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+LEXICON_ENABLED = os.getenv("LEXICON_ENABLED", "True").lower() == "true"
+LEXICON_PATH = os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(__file__), "data", "lexicon_nl.json"))
+# Learn nouns, adjectives and adverbs from LLM analyses once they were seen consistently this often
+LEXICON_LEARN = os.getenv("LEXICON_LEARN", "True").lower() == "true"
+LEXICON_LEARN_MIN_OBSERVATIONS = int(os.getenv("LEXICON_LEARN_MIN_OBSERVATIONS", "3"))
+LEXICON_MAX_LEARNED = int(os.getenv("LEXICON_MAX_LEARNED", "50000"))
+# Cached analyses replayed into the learner at startup
+LEXICON_BOOTSTRAP_ROWS = int(os.getenv("LEXICON_BOOTSTRAP_ROWS", "20000"))
+
+# Letters and internal apostrophes ("auto's"); optional closing "." or "!"
+_SIMPLE_SENTENCE_RE = re.compile(r"^[^\W\d_]+(?:'[^\W\d_]+)?(?: [^\W\d_]+(?:'[^\W\d_]+)?)*[.!]?$")
+_TOKEN_RE = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)?")
+_TRANSLATION_RE = re.compile(r"[a-z][a-z' -]{0,39}")
+_LEARNABLE = {"noun": "noun", "adjective": "adjective", "adverb": "adverb"}
+
+ARTICLE = "article"
+SUBJECT = "subject"
+OBJECT = "object"
+POSSESSIVE = "possessive"
+DETERMINER = "determiner"
+ADVERB = "adverb"
+NEGATION = "negation"
+PREPOSITION = "preposition"
+CONJUNCTION = "conjunction"
+ADJECTIVE = "adjective"
+NOUN = "noun"
+VERB = "verb"
+
+_PERSON_DETAILS = {
+    "1sg": {"pronoun-type": "personal", "person": "first", "number": "singular"},
+    "2sg": {"pronoun-type": "personal", "person": "second", "number": "singular"},
+    "3sg": {"pronoun-type": "personal", "person": "third", "number": "singular"},
+    "pl": {"pronoun-type": "personal", "number": "plural"},
+}
+_NUMERALS = {"twee", "drie", "vier", "vijf"}
+# Where an adverb goes in the English gloss, which is not the Dutch position:
+# "mid" before a full verb but after "to be" ("I also have", "I am also"),
+# "degree" only right before a predicate adjective ("very big"), and
+# "place"/"time" at the end of the clause, place first ("I am at home today").
+# Adverbs not listed (e.g. learned ones) make the sentence go to the LLM.
+_ADVERB_PLACEMENT = {
+    "ook": "mid", "vaak": "mid", "altijd": "mid", "nooit": "mid", "soms": "mid",
+    "heel": "degree", "erg": "degree", "zeer": "degree",
+    "hier": "place", "daar": "place", "thuis": "place", "buiten": "place", "binnen": "place",
+    "nu": "time", "vandaag": "time", "morgen": "time",
+}
+
+
+class Reading(NamedTuple):
+    """
+    One interpretation of a word form.
+
+    `info` depends on the kind: the person ("1sg", "2sg", "3sg", "pl") for
+    subject pronouns and verbs, (gender, number, countable) for nouns and the
+    inflection ("base", "inflected", "invariant") for adjectives. `lemma` is
+    the infinitive, singular or base form, or the article itself.
+    """
+    kind: str
+    english: str
+    info: object = None
+    lemma: Optional[str] = None
+
+
+class _Phrase(NamedTuple):
+    end: int
+    components: list
+    english: list
+    person: Optional[str]
+
+
+def _i(value: Optional[str]) -> Optional[str]:
+    # Interning keeps the thousands of repeated kinds/translations/lemmas shared
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Lexicon:
+    """
+    Word-form index for high-frequency Dutch words.
+
+    Forms map to tuples of Readings, all strings interned, so the whole index
+    is a single flat dict. analyze() only answers a sentence when it parses as
+    a simple declarative main clause (subject, finite present-tense verb,
+    then noun phrases, prepositional phrases, adverbs or a predicate
+    adjective) and every word has exactly one reading in its position.
+    Anything else returns None and goes to the LLM.
+    """
+
+    def __init__(self, entries: dict[str, tuple[Reading, ...]]):
+        self._entries = entries
+        self._learned: dict[str, Reading] = {}
+        self._observations: dict[str, tuple[Reading, int]] = {}
+        self._conflicting: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: str) -> "Lexicon":
+        """
+        Build the index from a lexicon JSON file (see app/data/lexicon_nl.json).
+
+        Args:
+            path: File to load
+
+        Returns:
+            Lexicon instance
+        """
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        entries: dict[str, list[Reading]] = {}
+
+        def add(form: str, reading: Reading) -> None:
+            reading = Reading(_i(reading.kind), _i(reading.english), reading.info, _i(reading.lemma))
+            entries.setdefault(sys.intern(form), []).append(reading)
+
+        for form, (english, article_type) in data["articles"].items():
+            add(form, Reading(ARTICLE, english, article_type, form))
+        for form, readings in data["subject_pronouns"].items():
+            for english, person in readings:
+                add(form, Reading(SUBJECT, english, person))
+        for form, english in data["object_pronouns"].items():
+            add(form, Reading(OBJECT, english))
+        for form, english in data["possessives"].items():
+            add(form, Reading(POSSESSIVE, english))
+        for form, english in data["determiners"].items():
+            add(form, Reading(DETERMINER, english, "pl" if form in _NUMERALS else None, form))
+        for form, english in data["adverbs"].items():
+            add(form, Reading(ADVERB, english))
+        for form, english in data["negation"].items():
+            add(form, Reading(NEGATION, english))
+        for form, english in data["prepositions"].items():
+            add(form, Reading(PREPOSITION, english))
+        for form, english in data["conjunctions"].items():
+            add(form, Reading(CONJUNCTION, english))
+        for base, (inflected, english) in data["adjectives"].items():
+            if inflected == base:
+                add(base, Reading(ADJECTIVE, english, "invariant", base))
+            else:
+                add(base, Reading(ADJECTIVE, english, "base", base))
+                add(inflected, Reading(ADJECTIVE, english, "inflected", base))
+        for singular, (gender, plural, english, english_plural) in data["nouns"].items():
+            # Nouns without a plural are mass nouns, which may stand without an article
+            add(singular, Reading(NOUN, english, (_i(gender), "sg", plural is not None), singular))
+            if plural:
+                add(plural, Reading(NOUN, english_plural, (_i(gender), "pl", True), singular))
+        for infinitive, spec in data["verbs"].items():
+            if isinstance(spec, dict):
+                for person, form in spec["forms"].items():
+                    add(form, Reading(VERB, spec["english"][person], person, infinitive))
+                continue
+            stem, english, english_3sg = spec
+            add(stem, Reading(VERB, english, "1sg", infinitive))
+            second = stem if stem.endswith("t") else stem + "t"
+            add(second, Reading(VERB, english, "2sg", infinitive))
+            add(second, Reading(VERB, english_3sg, "3sg", infinitive))
+            add(infinitive, Reading(VERB, english, "pl", infinitive))
+
+        lexicon = cls({form: tuple(readings) for form, readings in entries.items()})
+        logger.info("[Lexicon] Loaded %s word forms from %s", len(lexicon._entries), path)
+        return lexicon
+
+    def readings(self, word: str) -> tuple[Reading, ...]:
+        """Return every reading of a (lowercased) word form, including learned ones"""
+        found = self._entries.get(word)
+        if found is not None:
+            return found
+        learned = self._learned.get(word)
+        return (learned,) if learned is not None else ()
+
+    def analyze(self, sentence: str) -> Optional[SentenceAnalysis]:
+        """
+        Analyze a sentence locally if every word is confidently covered.
+
+        Args:
+            sentence: Sentence to analyze
+
+        Returns:
+            SentenceAnalysis with components and a word-by-word translation,
+            or None if the sentence needs the LLM
+        """
+        analysis = self._analyze(sentence.strip()) if _SIMPLE_SENTENCE_RE.match(sentence.strip()) else None
+        if analysis is None:
+            self.misses += 1
+            LEXICON_LOOKUPS.inc(result="miss")
+        else:
+            self.hits += 1
+            LEXICON_LOOKUPS.inc(result="hit")
+        return analysis
+
+    def learn(self, analysis: SentenceAnalysis) -> int:
+        """
+        Record the nouns, adjectives and adverbs of an LLM analysis.
+
+        A word is added to the index once it was seen with the same reading
+        LEXICON_LEARN_MIN_OBSERVATIONS times; a word seen with two different
+        readings is never learned. Verbs and function words are not learned,
+        since their translation depends on context the LLM output does not
+        record.
+
+        Args:
+            analysis: Analysis produced by the LLM
+
+        Returns:
+            Number of words that became part of the index
+        """
+        promoted = 0
+        for component in analysis.components:
+            kind = _LEARNABLE.get(component.type.lower())
+            word = component.value.strip()
+            if kind is None or not _TOKEN_RE.fullmatch(word):
+                continue
+            if component.position > 0 and word[0].isupper():
+                continue  # Proper noun
+            word = word.lower()
+            translation = (component.translation or "").strip().lower()
+            if word in self._entries or word in self._conflicting or not _TRANSLATION_RE.fullmatch(translation):
+                continue
+            info = None
+            if kind == NOUN:
+                gender = (component.details or {}).get("de-or-het")
+                if gender not in ("de", "het"):
+                    continue
+                info = (_i(gender), None, None)
+            reading = Reading(_i(kind), _i(translation), info, _i(word))
+
+            learned = self._learned.get(word)
+            if learned is not None:
+                if learned != reading:
+                    del self._learned[word]
+                    self._conflicting.add(word)
+                continue
+            seen = self._observations.get(word)
+            if seen is None:
+                if len(self._observations) < LEXICON_MAX_LEARNED:
+                    self._observations[word] = (reading, 1)
+            elif seen[0] != reading:
+                del self._observations[word]
+                self._conflicting.add(word)
+            elif seen[1] + 1 >= LEXICON_LEARN_MIN_OBSERVATIONS and len(self._learned) < LEXICON_MAX_LEARNED:
+                del self._observations[word]
+                self._learned[word] = reading
+                promoted += 1
+            else:
+                self._observations[word] = (reading, seen[1] + 1)
+        return promoted
+
+    def learn_all(self, analyses: Iterable[SentenceAnalysis]) -> int:
+        """Feed a stream of analyses (e.g. the persistent cache) to learn(); returns words learned"""
+        return sum(self.learn(analysis) for analysis in analyses)
+
+    def stats(self) -> dict:
+        """Return index size, learning progress and hit counters"""
+        lookups = self.hits + self.misses
+        return {
+            "word_forms": len(self._entries),
+            "learned": len(self._learned),
+            "pending": len(self._observations),
+            "conflicting": len(self._conflicting),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _analyze(self, sentence: str) -> Optional[SentenceAnalysis]:
+        matches = list(_TOKEN_RE.finditer(sentence))
+        if any(m.group()[0].isupper() for m in matches[1:]):
+            return None  # Names and other proper nouns are not in the lexicon
+        words = [m.group().lower() for m in matches]
+        positions = [m.start() for m in matches]
+        tokens = list(zip(words, positions, (m.group() for m in matches)))
+
+        parses = []
+        for subject in self._subjects(tokens):
+            clause = self._clause(tokens, subject)
+            if clause is not None:
+                parses.append(clause)
+        if len(parses) != 1:
+            return None
+        components, english = parses[0]
+
+        translation = " ".join(english)
+        translation = translation[0].upper() + translation[1:]
+        if sentence[-1] in ".!":
+            translation += sentence[-1]
+        return SentenceAnalysis(sentence=sentence, sentence_translation=translation, components=components)
+
+    def _subjects(self, tokens: list) -> list[_Phrase]:
+        """Candidate subjects at the start of the sentence: a pronoun or a noun phrase"""
+        candidates = []
+        if not tokens:
+            return candidates
+        word, position, text = tokens[0]
+        for reading in self.readings(word):
+            if reading.kind == SUBJECT:
+                candidates.append(_Phrase(1, [self._component("pronoun", text, position, reading.english,
+                                                              _PERSON_DETAILS[reading.info])],
+                                          [reading.english], reading.info))
+        phrase = self._noun_phrase(tokens, 0)
+        if phrase is not None and phrase.person is not None:
+            candidates.append(phrase)
+        return candidates
+
+    def _clause(self, tokens: list, subject: _Phrase) -> Optional[tuple[list, list]]:
+        if subject.end >= len(tokens):
+            return None
+        word, position, text = tokens[subject.end]
+        verbs = [r for r in self.readings(word) if r.kind == VERB and r.info == subject.person]
+        if len(verbs) != 1:
+            return None
+        verb = verbs[0]
+        components = subject.components + [
+            self._component("verb", text, position, verb.english, {"verb-tense": "present", "infinitive": verb.lemma})
+        ]
+        english = subject.english + [verb.english]
+        # Time and place adverbs, moved to the end of the English gloss
+        trailing: dict[str, list] = {"place": [], "time": []}
+        coordinated = False
+
+        index = subject.end + 1
+        after_verb = True
+        while index < len(tokens):
+            word, position, text = tokens[index]
+            readings = self.readings(word)
+            kinds = {r.kind for r in readings}
+            phrase = None
+
+            if PREPOSITION in kinds:
+                phrase = self._noun_phrase(tokens, index + 1)
+                if phrase is None:
+                    # Probably a separable verb particle ("Ik sta op"); leave it to the LLM
+                    return None
+                reading = self._only(readings, PREPOSITION)
+                components.append(self._component("preposition", text, position, reading.english))
+                english.append(reading.english)
+            elif NEGATION in kinds:
+                # "niet" reads word-for-word only right after "zijn" ("Ik ben niet moe")
+                if not after_verb or verb.lemma != "zijn":
+                    return None
+                reading = self._only(readings, NEGATION)
+                components.append(self._component("adverb", text, position, reading.english, {"adverb-type": "negation"}))
+                english.append(reading.english)
+            elif CONJUNCTION in kinds:
+                if index + 1 >= len(tokens):
+                    return None
+                reading = self._only(readings, CONJUNCTION)
+                components.append(self._component("conjunction", text, position, reading.english))
+                english.append(reading.english)
+                coordinated = True
+            elif (phrase := self._noun_phrase(tokens, index)) is not None:
+                pass
+            elif OBJECT in kinds:
+                reading = self._only(readings, OBJECT)
+                components.append(self._component("pronoun", text, position, reading.english, {"pronoun-type": "object"}))
+                english.append(reading.english)
+            elif ADVERB in kinds:
+                reading = self._only(readings, ADVERB)
+                placement = _ADVERB_PLACEMENT.get(word)
+                if reading is None or placement is None:
+                    return None
+                if placement == "mid":
+                    # "Ik heb ook een hond" -> "I also have a dog", but "Ik ben ook moe" -> "I am also tired"
+                    if not after_verb:
+                        return None
+                    if verb.lemma == "zijn":
+                        english.append(reading.english)
+                    else:
+                        english.insert(len(subject.english), reading.english)
+                elif placement == "degree":
+                    following = tokens[index + 1][0] if index + 1 < len(tokens) else None
+                    if verb.lemma != "zijn" or following is None or self._only(self.readings(following), ADJECTIVE) is None:
+                        return None
+                    english.append(reading.english)
+                else:
+                    trailing[placement].append(reading.english)
+                components.append(self._component("adverb", text, position, reading.english))
+            elif ADJECTIVE in kinds and verb.lemma == "zijn":
+                # Predicate adjectives are uninflected: "Het huis is groot"
+                reading = self._only(readings, ADJECTIVE)
+                if reading is None or reading.info == "inflected":
+                    return None
+                components.append(self._component("adjective", text, position, reading.english))
+                english.append(reading.english)
+            else:
+                return None
+
+            if phrase is not None:
+                components += phrase.components
+                english += phrase.english
+                index = phrase.end
+            else:
+                index += 1
+            after_verb = False
+
+        if trailing["place"] or trailing["time"]:
+            # Which conjunct the adverb belongs to is ambiguous; leave it to the LLM
+            if coordinated:
+                return None
+            english += trailing["place"] + trailing["time"]
+        return components, english
+
+    def _noun_phrase(self, tokens: list, start: int) -> Optional[_Phrase]:
+        """
+        Parse [article|possessive|determiner] adjective* noun starting at tokens[start].
+
+        Returns None unless the words agree (de/het, number, adjective inflection).
+        The phrase's person is "3sg"/"pl" when the noun's number is known.
+        """
+        index = start
+        components: list = []
+        english: list = []
+        determiner = None
+        if index < len(tokens):
+            word, position, text = tokens[index]
+            for kind in (ARTICLE, POSSESSIVE, DETERMINER):
+                reading = self._only(self.readings(word), kind)
+                if reading is not None:
+                    determiner = reading
+                    details = None
+                    if kind == ARTICLE:
+                        details = {"article-type": reading.info}
+                        component_type = "article"
+                    elif kind == POSSESSIVE:
+                        # "haar boek": a possessive determiner, not the object pronoun "haar"
+                        details = {"determiner-type": "possessive"}
+                        component_type = "determiner"
+                    else:
+                        component_type = "numeral" if reading.info == "pl" else "determiner"
+                    components.append(self._component(component_type, text, position, reading.english, details))
+                    english.append(reading.english)
+                    index += 1
+                    break
+
+        adjectives = []
+        while index < len(tokens):
+            word, position, text = tokens[index]
+            reading = self._only(self.readings(word), ADJECTIVE)
+            if reading is None:
+                break
+            adjectives.append(reading)
+            details = {"base-form": reading.lemma} if reading.info == "inflected" else None
+            components.append(self._component("adjective", text, position, reading.english, details))
+            english.append(reading.english)
+            index += 1
+
+        if index >= len(tokens):
+            return None
+        word, position, text = tokens[index]
+        noun = self._only(self.readings(word), NOUN)
+        if noun is None:
+            return None
+        gender, number, countable = noun.info
+
+        if not self._agrees(determiner, gender, number, countable, adjectives):
+            return None
+        # Plurals always take "de", whatever the gender of the singular
+        details = {"de-or-het": "de" if number == "pl" else gender}
+        if number in ("sg", "pl"):
+            details["number"] = "singular" if number == "sg" else "plural"
+        components.append(self._component("noun", text, position, noun.english, details))
+        english.append(noun.english)
+
+        if determiner is not None and determiner.kind == ARTICLE and determiner.info == "indefinite":
+            # "a" -> "an" before a vowel sound (good enough for this vocabulary)
+            next_word = english[1] if len(english) > 1 else ""
+            if next_word[:1].lower() in "aeiou":
+                english[0] = "an"
+
+        person = {"sg": "3sg", "pl": "pl"}.get(number)
+        return _Phrase(index + 1, components, english, person)
+
+    @staticmethod
+    def _agrees(determiner: Optional[Reading], gender: str, number: str, countable: Optional[bool],
+                adjectives: list) -> bool:
+        if determiner is None:
+            # A bare singular count noun ("Ik heb kat") is a learner error the LLM should explain
+            if number != "pl" and countable is not False:
+                return False
+        elif determiner.kind == ARTICLE:
+            if determiner.lemma == "de" and gender != "de" and number != "pl":
+                return False
+            if determiner.lemma == "het" and (gender != "het" or number == "pl"):
+                return False
+            if determiner.lemma == "een" and number == "pl":
+                return False
+        elif determiner.kind == DETERMINER and determiner.info == "pl" and number != "pl":
+            return False
+
+        # Adjectives stay uninflected only before a singular het-noun without a definite determiner
+        uninflected = gender == "het" and number == "sg" and (
+            determiner is None or determiner.lemma in ("een", "geen")
+        )
+        for adjective in adjectives:
+            if adjective.info == "inflected" and uninflected:
+                return False
+            if adjective.info == "base" and not uninflected:
+                return False
+        return True
+
+    @staticmethod
+    def _only(readings: tuple, kind: str) -> Optional[Reading]:
+        matching = [r for r in readings if r.kind == kind]
+        return matching[0] if len(matching) == 1 else None
+
+    @staticmethod
+    def _component(component_type: str, word: str, position: int, translation: str,
+                   details: Optional[dict] = None) -> SentenceComponent:
+        return SentenceComponent(type=component_type, value=word, position=position,
+                                 translation=translation, details=details)
+
+
+sentence_lexicon: Optional[Lexicon] = Lexicon.load(LEXICON_PATH) if LEXICON_ENABLED else None
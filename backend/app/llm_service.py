@@ -1,21 +1,185 @@
 """LLM service for OpenRouter integration"""
+import asyncio
+import functools
+import hashlib
 import logging
 import os
 import httpx
 import json
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
 from app.models import SentenceComponent, SentenceAnalysis
-from app.exceptions import ProcessingError
+from app.exceptions import ProcessingError, UpstreamError
+from app.cache import analysis_cache, make_cache_key
+from app.lexicon import sentence_lexicon, LEXICON_LEARN
+from app.http_client import create_http_client
+from app.singleflight import SingleFlight
+from app.json_stream import ComponentStreamParser, recover_analysis, recover_array
+from app import segmenter
+from app.logging_config import sentence_id_var
+from app.scheduler import upstream_scheduler, parse_retry_after
+from app.model_router import model_router, OPENROUTER_MODEL
+from app.metrics import STAGE_SECONDS, UPSTREAM_REQUESTS, UPSTREAM_IN_FLIGHT, LLM_TOKENS, LLM_PARSE_RESULTS, ERRORS
 
 logger = logging.getLogger(__name__)
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
-MODEL = "mistralai/mistral-nemo"
+# Point at bench/fake_openrouter.py to load-test without calling the real API
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1/chat/completions")
+# Primary model; cache keys use it even when a fallback model produced the analysis
+MODEL = OPENROUTER_MODEL
+# Bump when the expected response format changes without the prompt text changing.
+# Edits to the prompt template itself are picked up automatically via its fingerprint.
+PROMPT_VERSION = "1"
+# "full": instructions and a worked example in every user message (the original prompt);
+# "compact": a short schema in a stable system message that provider-side prompt caching can reuse
+PROMPT_MODE = os.getenv("PROMPT_MODE", "full").lower()
+# Mark the system prefix with cache_control; Anthropic and Gemini models need it, others cache automatically
+PROMPT_CACHE_CONTROL = os.getenv("PROMPT_CACHE_CONTROL", "False").lower() == "true"
+# "json_object" or "json_schema" to request structured output from models that support it
+RESPONSE_FORMAT = os.getenv("RESPONSE_FORMAT", "").lower()
+# Completion-token budget of a single-sentence analysis
+ANALYSIS_MAX_TOKENS = int(os.getenv("ANALYSIS_MAX_TOKENS", "2000"))
+# Size max_tokens from the sentence length instead of always asking for ANALYSIS_MAX_TOKENS
+ADAPTIVE_MAX_TOKENS = os.getenv("ADAPTIVE_MAX_TOKENS", str(PROMPT_MODE == "compact")).lower() == "true"
+ADAPTIVE_MAX_TOKENS_FACTOR = float(os.getenv("ADAPTIVE_MAX_TOKENS_FACTOR", "1.5"))
+_ADAPTIVE_MIN_TOKENS = 256
+# When an answer is cut off after some components, ask for the missing tail only instead of starting over
+ANALYSIS_TAIL_REQUESTS = os.getenv("ANALYSIS_TAIL_REQUESTS", "True").lower() == "true"
+# Sentences analyzed at once for a single /api/analyze request
+ANALYZE_MAX_CONCURRENCY_PER_REQUEST = int(os.getenv("ANALYZE_MAX_CONCURRENCY_PER_REQUEST", "8"))
+# Upstream calls in flight across all requests handled by this worker
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "32"))
+
+# Pack several sentences into one prompt for /api/analyze (see _analyze_sentences_batched)
+ANALYSIS_BATCH_MODE = os.getenv("ANALYSIS_BATCH_MODE", "False").lower() == "true"
+# Completion-token budget of one batched request; also sent as its max_tokens
+BATCH_MAX_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", "4000"))
+BATCH_MAX_SENTENCES = int(os.getenv("BATCH_MAX_SENTENCES", "12"))
+# Rough completion cost of a sentence: one component object per word plus translation overhead
+_BATCH_TOKENS_PER_WORD = 45
+_BATCH_TOKENS_PER_SENTENCE = 40
+
+_COMPACT_RULES = """Fields:
+- "word": the word or fixed phrase, components in sentence order
+- "type": subject, verb, object, noun, article, adjective, adverb, pronoun, preposition, conjunction, particle, etc.
+- "position": 0-based character offset of the word in the sentence
+- "translation": English translation of the word or phrase
+- "details": a few short grammatical facts, e.g. {"infinitive": "zitten", "verb-tense": "present"} for verbs \
+and {"de-or-het": "de"} for nouns; mark separable verbs and multi-word expressions
+Output JSON only, no other text."""
+
+_COMPACT_ANALYSIS_INSTRUCTIONS = f"""You analyze Dutch sentences for English-speaking learners.
+Reply with one JSON object: {{"sentence_translation": string, "components": [{{"word", "type", "position", "translation", "details"}}]}}
+{_COMPACT_RULES}
+Example for "De kat zit.": {{"sentence_translation":"The cat sits.","components":[\
+{{"word":"De","type":"article","position":0,"translation":"The","details":{{"article-type":"definite"}}}},\
+{{"word":"kat","type":"noun","position":3,"translation":"cat","details":{{"de-or-het":"de"}}}},\
+{{"word":"zit","type":"verb","position":7,"translation":"sits","details":{{"infinitive":"zitten","verb-tense":"present"}}}}]}}"""
+
+_COMPACT_BATCH_INSTRUCTIONS = f"""You analyze Dutch sentences for English-speaking learners.
+Reply with one JSON array holding an object per sentence: \
+{{"index": the number shown in brackets, "sentence_translation": string, "components": [{{"word", "type", "position", "translation", "details"}}]}}
+{_COMPACT_RULES}"""
+
+_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentence_translation": {"type": "string"},
+        "components": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "word": {"type": "string"},
+                    "type": {"type": "string"},
+                    "position": {"type": "integer"},
+                    "translation": {"type": "string"},
+                    "details": {"type": "object"},
+                },
+                "required": ["word", "type", "position", "translation"],
+            },
+        },
+    },
+    "required": ["sentence_translation", "components"],
+}
+
+_upstream_semaphore: Optional[asyncio.Semaphore] = None
+# Identical sentences being analyzed at the same time share one upstream call
+sentence_flights = SingleFlight()
+
+
+def _upstream_slots() -> asyncio.Semaphore:
+    """Return the worker-wide upstream semaphore, creating it inside the running loop"""
+    global _upstream_semaphore
+    if _upstream_semaphore is None:
+        _upstream_semaphore = asyncio.Semaphore(UPSTREAM_MAX_CONCURRENCY)
+    return _upstream_semaphore
+
+
+@asynccontextmanager
+async def _upstream_call():
+    """
+    Hold a worker-wide upstream slot for the duration of one upstream request.
+    
+    Records time spent queueing for the slot and waiting on the upstream
+    separately, and counts transport-level failures.
+    """
+    slots = _upstream_slots()
+    with STAGE_SECONDS.time(stage="upstream_queue"):
+        await slots.acquire()
+    try:
+        with UPSTREAM_IN_FLIGHT.track(), STAGE_SECONDS.time(stage="upstream_wait"):
+            yield
+    except httpx.HTTPError:
+        ERRORS.inc(type="upstream_transport")
+        raise
+    finally:
+        slots.release()
+
 
 class OpenRouterService:
     """Service for interacting with OpenRouter LLM"""
     
+    # Shared pooled client, injected by the app lifespan (see app.main)
+    http_client: Optional[httpx.AsyncClient] = None
+    
+    @staticmethod
+    def set_http_client(client: Optional[httpx.AsyncClient]) -> None:
+        """
+        Inject the pooled HTTP client used for all upstream calls.
+        
+        Args:
+            client: Long-lived client, or None to detach it on shutdown
+        """
+        OpenRouterService.http_client = client
+    
+    @staticmethod
+    def get_http_client() -> httpx.AsyncClient:
+        """
+        Return the shared HTTP client, creating one if none was injected.
+        
+        The fallback keeps scripts that use the service outside the FastAPI
+        app working; they still get connection reuse across calls.
+        
+        Returns:
+            Pooled httpx.AsyncClient
+        """
+        if OpenRouterService.http_client is None:
+            OpenRouterService.http_client = create_http_client()
+        return OpenRouterService.http_client
+    
+    @staticmethod
+    def ensure_configured() -> None:
+        """
+        Check that upstream calls can be made.
+        
+        Raises:
+            ProcessingError: If the OpenRouter API key is missing
+        """
+        if not OPENROUTER_API_KEY:
+            raise ProcessingError("OPENROUTER_API_KEY environment variable not set")
+    
     @staticmethod
     async def analyze_dutch_text(text: str) -> list[SentenceAnalysis]:
         """
@@ -30,32 +194,331 @@ class OpenRouterService:
         Raises:
             ProcessingError: If LLM call fails
         """
-        if not OPENROUTER_API_KEY:
-            raise ProcessingError("OPENROUTER_API_KEY environment variable not set")
+        OpenRouterService.ensure_configured()
         
         try:
-            logger.info(f"[OpenRouter] Starting analysis of text: {text[:100]}...")
+            logger.info("[OpenRouter] Starting analysis of text: %s...", text[:100])
             
             # Split text into sentences first
             sentences = OpenRouterService._split_sentences(text)
-            logger.info(f"[OpenRouter] Split text into {len(sentences)} sentence(s)")
+            logger.info("[OpenRouter] Split text into %s sentence(s)", len(sentences))
             
-            analyzed_sentences = []
+            analyzed_sentences = await OpenRouterService.analyze_sentences(sentences)
             
-            for idx, sentence in enumerate(sentences, 1):
-                logger.info(f"[OpenRouter] Processing sentence {idx}/{len(sentences)}")
-                analysis = await OpenRouterService._analyze_sentence(sentence)
-                analyzed_sentences.append(analysis)
+            failed = [a for a in analyzed_sentences if a.error]
+            if failed and len(failed) == len(analyzed_sentences):
+                raise ProcessingError(failed[0].error)
             
-            logger.info(f"[OpenRouter] Analysis complete. Processed {len(analyzed_sentences)} sentences")
+            logger.info("[OpenRouter] Analysis complete. Processed %s sentences (%s failed)", len(analyzed_sentences), len(failed))
             return analyzed_sentences
             
         except Exception as e:
-            logger.error(f"[OpenRouter] Error analyzing text with OpenRouter: {str(e)}", exc_info=True)
+            logger.error("[OpenRouter] Error analyzing text with OpenRouter: %s", e, exc_info=True)
             raise ProcessingError(f"Failed to analyze text: {str(e)}")
     
+    @staticmethod
+    async def analyze_sentences(sentences: list[str], batch: Optional[bool] = None) -> list[SentenceAnalysis]:
+        """
+        Analyze several sentences concurrently.
+        
+        At most ANALYZE_MAX_CONCURRENCY_PER_REQUEST sentences (or batches) of this
+        call are in progress at once, on top of the worker-wide
+        UPSTREAM_MAX_CONCURRENCY limit. A sentence that fails yields an entry with
+        `error` set instead of failing the others.
+        
+        Args:
+            sentences: Sentences to analyze
+            batch: Pack several sentences per prompt (defaults to ANALYSIS_BATCH_MODE)
+            
+        Returns:
+            List of SentenceAnalysis in the same order as the input
+        """
+        if batch is None:
+            batch = ANALYSIS_BATCH_MODE
+        if batch and len(sentences) > 1:
+            return await OpenRouterService._analyze_sentences_batched(sentences)
+        
+        semaphore = asyncio.Semaphore(ANALYZE_MAX_CONCURRENCY_PER_REQUEST)
+        return await asyncio.gather(
+            *(OpenRouterService._analyze_sentence_guarded(sentence, semaphore) for sentence in sentences)
+        )
+    
+    @staticmethod
+    async def _analyze_sentences_batched(sentences: list[str]) -> list[SentenceAnalysis]:
+        """
+        Analyze sentences by packing several of them into each LLM request.
+        
+        Cached sentences are served directly and duplicates are analyzed once.
+        The remaining sentences are grouped by _plan_batches and the batches run
+        concurrently under the usual per-request limit.
+        
+        Args:
+            sentences: Sentences to analyze
+            
+        Returns:
+            List of SentenceAnalysis in the same order as the input
+        """
+        prompt_version = OpenRouterService.prompt_version()
+        results: list[Optional[SentenceAnalysis]] = [None] * len(sentences)
+        pending: dict[str, list[int]] = {}
+        
+        for index, sentence in enumerate(sentences):
+            key = make_cache_key(sentence, MODEL, prompt_version)
+            if analysis_cache is not None:
+                cached = await analysis_cache.get(key)
+                if cached is not None:
+                    results[index] = OpenRouterService._for_sentence(cached, sentence)
+                    continue
+            local = OpenRouterService._analyze_locally(sentence)
+            if local is not None:
+                results[index] = local
+                continue
+            pending.setdefault(key, []).append(index)
+        
+        unique = [(key, sentences[indices[0]]) for key, indices in pending.items()]
+        batches = OpenRouterService._plan_batches([sentence for _, sentence in unique])
+        logger.info("[OpenRouter] Batched %s uncached sentence(s) into %s request(s)", len(unique), len(batches))
+        semaphore = asyncio.Semaphore(ANALYZE_MAX_CONCURRENCY_PER_REQUEST)
+        
+        async def run(items: list[tuple[str, str]]) -> None:
+            batch_sentences = [sentence for _, sentence in items]
+            async with semaphore:
+                try:
+                    analyses = await OpenRouterService._analyze_batch(batch_sentences)
+                except Exception as e:
+                    detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+                    logger.warning("[OpenRouter] Failed to analyze batch of %s: %s", len(items), detail)
+                    ERRORS.inc(type="sentence_failed", amount=len(items))
+                    analyses = [SentenceAnalysis(sentence=sentence, error=detail) for sentence in batch_sentences]
+            
+            for (key, _), analysis in zip(items, analyses):
+                if analysis.components and not analysis.error:
+                    OpenRouterService._learn(analysis)
+                    if analysis_cache is not None:
+                        await analysis_cache.set(key, analysis, prompt_version, MODEL)
+                for index in pending[key]:
+                    results[index] = OpenRouterService._for_sentence(analysis, sentences[index])
+        
+        await asyncio.gather(*(run([unique[i] for i in batch]) for batch in batches))
+        return results
+    
+    @staticmethod
+    def _estimate_completion_tokens(sentence: str) -> int:
+        """Estimate how many completion tokens the analysis of a sentence will take"""
+        return _BATCH_TOKENS_PER_SENTENCE + _BATCH_TOKENS_PER_WORD * len(sentence.split())
+    
+    @staticmethod
+    def _plan_batches(sentences: list[str]) -> list[list[int]]:
+        """
+        Group sentences into batches that fit the completion-token budget.
+        
+        Sentences are taken in order and a new batch is started once the
+        estimated completion tokens would exceed BATCH_MAX_TOKENS or the batch
+        holds BATCH_MAX_SENTENCES. A sentence larger than the budget gets a
+        batch of its own.
+        
+        Args:
+            sentences: Sentences to group
+            
+        Returns:
+            List of batches, each a list of indices into sentences
+        """
+        batches: list[list[int]] = []
+        current: list[int] = []
+        budget = 0
+        for index, sentence in enumerate(sentences):
+            cost = OpenRouterService._estimate_completion_tokens(sentence)
+            if current and (budget + cost > BATCH_MAX_TOKENS or len(current) >= BATCH_MAX_SENTENCES):
+                batches.append(current)
+                current, budget = [], 0
+            current.append(index)
+            budget += cost
+        if current:
+            batches.append(current)
+        return batches
+    
+    @staticmethod
+    async def _analyze_batch(sentences: list[str]) -> list[SentenceAnalysis]:
+        """
+        Analyze a batch of sentences with a single LLM request.
+        
+        If the response cannot be parsed the batch is split in half and both
+        halves are retried; sentences missing from an otherwise valid response
+        are retried as a smaller batch. A batch of one uses the regular
+        single-sentence prompt.
+        
+        Args:
+            sentences: Sentences to analyze together
+            
+        Returns:
+            List of SentenceAnalysis in the same order as the input
+        """
+        if len(sentences) == 1:
+            return [await OpenRouterService._request_analysis(sentences[0])]
+        
+        with STAGE_SECONDS.time(stage="prompt_build"):
+            messages = OpenRouterService._build_batch_messages(sentences)
+        # Batches are too expensive to hedge; the router only fails over between models
+        content = await model_router.run(
+            lambda model: OpenRouterService._complete(messages, max_tokens=BATCH_MAX_TOKENS, model=model),
+            hedge=False,
+        )
+        parsed = OpenRouterService._parse_batch_response(content, sentences)
+        
+        if parsed is None:
+            parsed = [None] * len(sentences)
+        missing = [i for i, analysis in enumerate(parsed) if analysis is None]
+        if not missing:
+            return parsed
+        
+        if len(missing) == len(sentences):
+            logger.warning("[OpenRouter] Malformed batch response for %s sentences, splitting", len(sentences))
+            middle = len(sentences) // 2
+            first, second = await asyncio.gather(
+                OpenRouterService._analyze_batch(sentences[:middle]),
+                OpenRouterService._analyze_batch(sentences[middle:]),
+            )
+            return first + second
+        
+        logger.warning("[OpenRouter] Batch response missed %s/%s sentences, retrying those", len(missing), len(sentences))
+        retried = await OpenRouterService._analyze_batch([sentences[i] for i in missing])
+        for i, analysis in zip(missing, retried):
+            parsed[i] = analysis
+        return parsed
+    
+    @staticmethod
+    async def iter_analyses(sentences: list[str]) -> AsyncIterator[tuple[int, SentenceAnalysis]]:
+        """
+        Analyze several sentences concurrently, yielding each result as soon as it completes.
+        
+        Uses the same limits and per-sentence error handling as analyze_sentences.
+        If the consumer stops iterating (e.g. the client disconnected), the
+        remaining sentence tasks are cancelled.
+        
+        Args:
+            sentences: Sentences to analyze
+            
+        Yields:
+            Tuples of (index into sentences, SentenceAnalysis) in completion order
+        """
+        semaphore = asyncio.Semaphore(ANALYZE_MAX_CONCURRENCY_PER_REQUEST)
+        
+        async def run(index: int, sentence: str) -> tuple[int, SentenceAnalysis]:
+            return index, await OpenRouterService._analyze_sentence_guarded(sentence, semaphore)
+        
+        tasks = [asyncio.create_task(run(index, sentence)) for index, sentence in enumerate(sentences)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    @staticmethod
+    async def _analyze_sentence_guarded(sentence: str, semaphore: asyncio.Semaphore) -> SentenceAnalysis:
+        """
+        Analyze one sentence under a concurrency limit, converting failures into an error entry.
+        
+        Args:
+            sentence: Sentence to analyze
+            semaphore: Per-request concurrency limit
+            
+        Returns:
+            SentenceAnalysis, with `error` set if the analysis failed
+        """
+        async with semaphore:
+            try:
+                return await OpenRouterService._analyze_sentence(sentence)
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+                logger.warning("[OpenRouter] Failed to analyze sentence '%s': %s", sentence, detail)
+                ERRORS.inc(type="sentence_failed")
+                return SentenceAnalysis(sentence=sentence, error=detail)
+    
     @staticmethod
     async def _analyze_sentence(sentence: str) -> SentenceAnalysis:
+        """
+        Analyze a single sentence, serving repeated sentences from the analysis cache.
+        
+        On a cache miss, simple sentences are answered by the local lexicon;
+        otherwise concurrent calls for the same normalized sentence are
+        coalesced into one upstream request that all callers await.
+        
+        Args:
+            sentence: Sentence to analyze
+            
+        Returns:
+            SentenceAnalysis with extracted components
+        """
+        prompt_version = OpenRouterService.prompt_version()
+        key = make_cache_key(sentence, MODEL, prompt_version)
+        # Correlates log lines of this sentence; tasks get their own context copy
+        sentence_id_var.set(key[:10])
+        
+        if analysis_cache is not None:
+            cached = await analysis_cache.get(key)
+            if cached is not None:
+                logger.info("[OpenRouter] Cache hit for sentence: %s", sentence)
+                return OpenRouterService._for_sentence(cached, sentence)
+        
+        local = OpenRouterService._analyze_locally(sentence)
+        if local is not None:
+            return local
+        
+        analysis = await sentence_flights.do(
+            key, lambda: OpenRouterService._request_and_cache(sentence, key, prompt_version)
+        )
+        return OpenRouterService._for_sentence(analysis, sentence)
+    
+    @staticmethod
+    async def _request_and_cache(sentence: str, key: str, prompt_version: str) -> SentenceAnalysis:
+        """
+        Request an analysis upstream and store it in the analysis cache.
+        
+        Args:
+            sentence: Sentence to analyze
+            key: Cache key for the sentence
+            prompt_version: Prompt version the key was built with
+            
+        Returns:
+            SentenceAnalysis with extracted components
+        """
+        analysis = await OpenRouterService._request_analysis(sentence)
+        # Empty or partial results mean the response could not be fully parsed; don't pin those in the cache
+        if analysis.components and not analysis.partial:
+            OpenRouterService._learn(analysis)
+            if analysis_cache is not None:
+                await analysis_cache.set(key, analysis, prompt_version, MODEL)
+        return analysis
+    
+    @staticmethod
+    def _analyze_locally(sentence: str) -> Optional[SentenceAnalysis]:
+        """Answer a sentence from the local lexicon, if it is simple enough"""
+        if sentence_lexicon is None:
+            return None
+        analysis = sentence_lexicon.analyze(sentence)
+        if analysis is not None:
+            logger.info("[OpenRouter] Lexicon answered sentence: %s", sentence)
+            return OpenRouterService._for_sentence(analysis, sentence)
+        return None
+    
+    @staticmethod
+    def _learn(analysis: SentenceAnalysis) -> None:
+        """Let the local lexicon learn vocabulary from an LLM analysis"""
+        if sentence_lexicon is not None and LEXICON_LEARN:
+            learned = sentence_lexicon.learn(analysis)
+            if learned:
+                logger.debug("[OpenRouter] Lexicon learned %s word(s)", learned)
+    
+    @staticmethod
+    def _for_sentence(analysis: SentenceAnalysis, sentence: str) -> SentenceAnalysis:
+        """Return a shared analysis labelled with the caller's exact sentence text"""
+        if analysis.sentence != sentence:
+            return analysis.model_copy(update={"sentence": sentence})
+        return analysis
+    
+    @staticmethod
+    async def _request_analysis(sentence: str) -> SentenceAnalysis:
         """
         Analyze a single sentence for grammatical components using OpenRouter.
         
@@ -65,12 +528,127 @@ class OpenRouterService:
         Returns:
             SentenceAnalysis with extracted components
         """
-        logger.info(f"[OpenRouter] Analyzing sentence: {sentence}")
-        prompt = OpenRouterService._build_analysis_prompt(sentence)
-        logger.debug(f"[OpenRouter] Prompt: {prompt[:200]}...")  # First 200 chars
+        logger.info("[OpenRouter] Analyzing sentence: %s", sentence)
+        with STAGE_SECONDS.time(stage="prompt_build"):
+            messages = OpenRouterService._build_messages(sentence)
+        logger.debug("[OpenRouter] Prompt: %s...", messages[-1]["content"][:200])  # First 200 chars
+        max_tokens = OpenRouterService._max_tokens_for(sentence)
+        response_format = OpenRouterService._response_format()
+        
+        async def attempt(model: str) -> SentenceAnalysis:
+            content = await OpenRouterService._complete(messages, max_tokens, model, response_format)
+            
+            # Parse the LLM response
+            components, sentence_translation, truncated = OpenRouterService._parse_llm_response(content, sentence)
+            if truncated and (components or sentence_translation) and ANALYSIS_TAIL_REQUESTS:
+                # Cut off after some output: keep it and ask only for what is missing
+                components, sentence_translation, truncated = await OpenRouterService._complete_tail(
+                    sentence, components, sentence_translation, model
+                )
+            elif not components and max_tokens < ANALYSIS_MAX_TOKENS:
+                # Possibly cut off by the adaptive budget: ask once more with the full one
+                logger.warning("[OpenRouter] Unparseable response with max_tokens=%s, retrying with %s",
+                               max_tokens, ANALYSIS_MAX_TOKENS)
+                content = await OpenRouterService._complete(messages, ANALYSIS_MAX_TOKENS, model, response_format)
+                components, sentence_translation, truncated = OpenRouterService._parse_llm_response(content, sentence)
+            
+            logger.info("[OpenRouter] Extracted %s components from sentence (%s)", len(components), model)
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, component in enumerate(components, 1):
+                    logger.debug("  [%s] %s: '%s'", i, component.type, component.value)
+            
+            return SentenceAnalysis(
+                sentence=sentence,
+                sentence_translation=sentence_translation,
+                components=components,
+                partial=truncated and bool(components)
+            )
+        
+        # A slow model is hedged against the next one; the first response that parses wins
+        return await model_router.run(attempt, usable=lambda analysis: bool(analysis.components))
+    
+    @staticmethod
+    async def _complete_tail(sentence: str, components: list[SentenceComponent], sentence_translation: Optional[str],
+                             model: str = MODEL) -> tuple[list[SentenceComponent], Optional[str], bool]:
+        """
+        Complete an analysis that was cut off by asking only for its missing tail.
+        
+        The components salvaged so far are kept; the follow-up request names
+        the words already covered and asks for the components of the rest of
+        the sentence (and the translation, if it was lost too).
+        
+        Args:
+            sentence: Sentence being analyzed
+            components: Components salvaged from the truncated answer (may be empty)
+            sentence_translation: Translation salvaged from it, if any
+            model: Model that produced the truncated answer
+            
+        Returns:
+            Tuple of (merged components, sentence translation, whether the result is still incomplete)
+        """
+        tail_start = max((component.position + len(component.value) for component in components), default=0)
+        remainder = sentence[tail_start:]
+        if components and not remainder.strip(" .,;:!?\"'"):
+            # Only punctuation was lost
+            return components, sentence_translation, sentence_translation is None
+        
+        logger.info("[OpenRouter] Answer cut off after %s components, requesting the tail from position %s",
+                    len(components), tail_start)
+        messages = OpenRouterService._build_tail_messages(sentence, components, sentence_translation, tail_start)
+        content = await OpenRouterService._complete(messages, ANALYSIS_MAX_TOKENS, model)
+        tail, tail_translation, truncated = OpenRouterService._parse_llm_response(content, sentence, kind="tail")
+        
+        seen = {(component.position, component.value) for component in components}
+        merged = components + [
+            component for component in tail
+            if component.position >= tail_start and (component.position, component.value) not in seen
+        ]
+        logger.info("[OpenRouter] Tail request added %s components", len(merged) - len(components))
+        return merged, sentence_translation or tail_translation, truncated or not tail
+    
+    @staticmethod
+    async def _complete(messages: list[dict], max_tokens: int = ANALYSIS_MAX_TOKENS, model: str = MODEL,
+                        response_format: Optional[dict] = None) -> str:
+        """
+        Send chat messages to OpenRouter and return the completion text.
+        
+        The call goes through the upstream scheduler, which rate-limits it in
+        the current priority lane and retries 429/5xx responses with backoff.
+        
+        Args:
+            messages: Chat messages (see _build_messages)
+            max_tokens: Upper bound on completion tokens
+            model: Model to ask (callers routing across models pass the model_router's choice)
+            response_format: Structured-output request, if any (see _response_format)
+            
+        Returns:
+            Content of the first choice's message
+            
+        Raises:
+            UpstreamError: If the API keeps returning a non-200 status
+            DeadlineExceededError: If the request deadline passes first
+        """
+        body = OpenRouterService._completion_body(messages, max_tokens, model, response_format)
+        return await upstream_scheduler.run(lambda: OpenRouterService._post_completion(body))
+    
+    @staticmethod
+    async def _post_completion(body: dict) -> str:
+        """
+        Make a single chat completion request (one scheduler attempt).
         
-        async with httpx.AsyncClient() as client:
-            logger.info(f"[OpenRouter] Sending request to {OPENROUTER_BASE_URL} with model: {MODEL}")
+        Args:
+            body: Request body built by _completion_body
+            
+        Returns:
+            Content of the first choice's message
+            
+        Raises:
+            UpstreamError: If the API returns a non-200 status
+        """
+        client = OpenRouterService.get_http_client()
+        model = body["model"]
+        logger.info("[OpenRouter] Sending request to %s with model: %s", OPENROUTER_BASE_URL, model)
+        async with _upstream_call():
             response = await client.post(
                 OPENROUTER_BASE_URL,
                 headers={
@@ -78,42 +656,352 @@ class OpenRouterService:
                     "HTTP-Referer": "https://dutchhelper.ai",
                     "X-Title": "DutchHelper",
                 },
-                json={
-                    "model": MODEL,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
-                    "temperature": 0.3,  # Low temperature for consistent results
-                    "max_tokens": 2000,
-                },
+                json=body,
             )
+        
+        logger.info("[OpenRouter] Response status: %s", response.status_code)
+        UPSTREAM_REQUESTS.inc(model=model, status=response.status_code)
+        
+        if response.status_code != 200:
+            logger.error("[OpenRouter] API error: %s - %s", response.status_code, response.text)
+            ERRORS.inc(type=f"upstream_status_{response.status_code}")
+            raise UpstreamError(response.status_code, parse_retry_after(response.headers.get("retry-after")))
+        
+        result = response.json()
+        OpenRouterService._record_usage(result.get("usage"), model)
+        content = result["choices"][0]["message"]["content"]
+        
+        logger.debug("[OpenRouter] LLM response sample: %s", content[:100])  # Sample content
+        return content
+    
+    @staticmethod
+    def _completion_body(messages: list[dict], max_tokens: int, model: str,
+                         response_format: Optional[dict] = None, stream: bool = False) -> dict:
+        """Build the JSON body of a chat completion request"""
+        body = {
+            "model": model,
+            "messages": messages,
+            "temperature": 0.3,  # Low temperature for consistent results
+            "max_tokens": max_tokens,
+        }
+        if response_format is not None:
+            body["response_format"] = response_format
+        if stream:
+            body["stream"] = True
+        return body
+    
+    @staticmethod
+    def _record_usage(usage: Optional[dict], model: str) -> None:
+        """Count the prompt/completion tokens reported by OpenRouter"""
+        if not usage:
+            return
+        for kind in ("prompt", "completion"):
+            tokens = usage.get(f"{kind}_tokens")
+            if isinstance(tokens, int):
+                LLM_TOKENS.inc(tokens, model=model, kind=kind)
+    
+    @staticmethod
+    async def _stream_complete(messages: list[dict], max_tokens: int = ANALYSIS_MAX_TOKENS,
+                               response_format: Optional[dict] = None) -> AsyncIterator[str]:
+        """
+        Send a prompt to OpenRouter with stream=true and yield content deltas.
+        
+        OpenRouter streams server-sent events; each "data:" line carries a chat
+        completion chunk, comment lines keep the connection alive and
+        "data: [DONE]" ends the stream.
+        
+        Args:
+            messages: Chat messages (see _build_messages)
+            max_tokens: Upper bound on completion tokens
+            response_format: Structured-output request, if any
             
-            logger.info(f"[OpenRouter] Response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"[OpenRouter] API error: {response.status_code} - {response.text}")
-                raise ProcessingError(f"OpenRouter API error: {response.status_code}")
+        Yields:
+            Content text as it is generated
             
-            result = response.json()
-            content = result["choices"][0]["message"]["content"]
+        Raises:
+            UpstreamError: If the API returns a non-200 status
+            DeadlineExceededError: If no rate-limit token is granted before the deadline
+        """
+        # Rate-limited like any other call, but not retried or hedged: deltas may already be forwarded
+        await upstream_scheduler.admit()
+        model = model_router.select() or MODEL
+        succeeded = None
+        try:
+            body = OpenRouterService._completion_body(messages, max_tokens, model, response_format, stream=True)
+            async for delta in OpenRouterService._stream_deltas(body):
+                yield delta
+            succeeded = True
+        except (UpstreamError, httpx.HTTPError):
+            succeeded = False
+            raise
+        finally:
+            # The breaker only learns from streams that ran to an end, not ones the client abandoned
+            if succeeded is None:
+                model_router.release(model)
+            else:
+                model_router.record(model, succeeded)
+    
+    @staticmethod
+    async def _stream_deltas(body: dict) -> AsyncIterator[str]:
+        """Stream one chat completion (body built with stream=True) and yield its content deltas"""
+        client = OpenRouterService.get_http_client()
+        model = body["model"]
+        logger.info("[OpenRouter] Streaming request to %s with model: %s", OPENROUTER_BASE_URL, model)
+        async with _upstream_call():
+            async with client.stream(
+                "POST",
+                OPENROUTER_BASE_URL,
+                headers={
+                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                    "HTTP-Referer": "https://dutchhelper.ai",
+                    "X-Title": "DutchHelper",
+                },
+                json=body,
+            ) as response:
+                logger.info("[OpenRouter] Response status: %s", response.status_code)
+                UPSTREAM_REQUESTS.inc(model=model, status=response.status_code)
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error("[OpenRouter] API error: %s - %r", response.status_code, body[:500])
+                    ERRORS.inc(type=f"upstream_status_{response.status_code}")
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+                    if response.status_code == 429:
+                        upstream_scheduler.pause(retry_after or upstream_scheduler.backoff_base)
+                    raise UpstreamError(response.status_code, retry_after)
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        logger.debug("[OpenRouter] Skipping malformed stream chunk: %s", data[:100])
+                        continue
+                    # The final chunk carries the usage block
+                    OpenRouterService._record_usage(chunk.get("usage"), model)
+                    choices = chunk.get("choices") or []
+                    delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if delta:
+                        yield delta
+    
+    @staticmethod
+    async def stream_sentence_analysis(sentence: str) -> AsyncIterator[dict]:
+        """
+        Analyze a sentence while streaming components as the LLM produces them.
+        
+        Frames are plain dicts:
+        - {"type": "translation", "sentence_translation"} once the translation is complete
+        - {"type": "component", "index", "component"} as each component object closes
+        - {"type": "done", "analysis"} with the full SentenceAnalysis at the end
+        
+        A cached or lexicon analysis is replayed as the same frames without an
+        upstream call.
+        
+        Args:
+            sentence: Sentence to analyze
             
-            logger.debug(f"[OpenRouter] LLM response sample: {content[:100]}")  # Sample content
+        Yields:
+            Frame dictionaries ready to be JSON-encoded
+        """
+        prompt_version = OpenRouterService.prompt_version()
+        key = make_cache_key(sentence, MODEL, prompt_version)
+        sentence_id_var.set(key[:10])
+        
+        cached = await analysis_cache.get(key) if analysis_cache is not None else None
+        analysis = OpenRouterService._for_sentence(cached, sentence) if cached is not None else None
+        if analysis is None:
+            analysis = OpenRouterService._analyze_locally(sentence)
+        if analysis is not None:
+            if analysis.sentence_translation:
+                yield {"type": "translation", "sentence_translation": analysis.sentence_translation}
+            for index, component in enumerate(analysis.components):
+                yield {"type": "component", "index": index, "component": component.model_dump()}
+            yield {"type": "done", "analysis": analysis.model_dump()}
+            return
+        
+        parser = ComponentStreamParser()
+        components: list[SentenceComponent] = []
+        with STAGE_SECONDS.time(stage="prompt_build"):
+            messages = OpenRouterService._build_messages(sentence)
+        # Full token budget: a stream cut short only gets its missing tail, which is not streamed
+        async for delta in OpenRouterService._stream_complete(messages, response_format=OpenRouterService._response_format()):
+            for kind, value in parser.feed(delta):
+                if kind == "translation":
+                    yield {"type": "translation", "sentence_translation": value}
+                    continue
+                for component in OpenRouterService._build_components([value]):
+                    yield {"type": "component", "index": len(components), "component": component.model_dump()}
+                    components.append(component)
+        
+        sentence_translation = parser.sentence_translation
+        truncated = False
+        if not parser.complete:
+            # Fall back to parsing the whole text in case the stream didn't match the expected shape
+            parsed_components, parsed_translation, truncated = OpenRouterService._parse_llm_response(parser.buffer, sentence)
+            if len(parsed_components) > len(components):
+                for component in parsed_components[len(components):]:
+                    yield {"type": "component", "index": len(components), "component": component.model_dump()}
+                    components.append(component)
+            sentence_translation = sentence_translation or parsed_translation
+        
+        if truncated and (components or sentence_translation) and ANALYSIS_TAIL_REQUESTS:
+            try:
+                tail_components, tail_translation, truncated = await model_router.run(
+                    lambda model: OpenRouterService._complete_tail(sentence, components, sentence_translation, model),
+                    hedge=False,
+                )
+            except Exception as e:
+                # The streamed components stand on their own; the analysis stays partial
+                logger.warning("[OpenRouter] Tail request failed: %s", getattr(e, "detail", None) or e)
+            else:
+                if tail_translation and not sentence_translation:
+                    sentence_translation = tail_translation
+                    yield {"type": "translation", "sentence_translation": tail_translation}
+                for component in tail_components[len(components):]:
+                    yield {"type": "component", "index": len(components), "component": component.model_dump()}
+                    components.append(component)
+        
+        analysis = SentenceAnalysis(
+            sentence=sentence,
+            sentence_translation=sentence_translation,
+            components=components,
+            partial=truncated and bool(components)
+        )
+        logger.info("[OpenRouter] Streamed %s components for sentence", len(components))
+        if components and not analysis.partial:
+            OpenRouterService._learn(analysis)
+            if analysis_cache is not None:
+                await analysis_cache.set(key, analysis, prompt_version, MODEL)
+        yield {"type": "done", "analysis": analysis.model_dump()}
+    
+    @staticmethod
+    @functools.cache
+    def prompt_version() -> str:
+        """
+        Return the version tag that cached analyses are keyed on.
+        
+        Combines PROMPT_VERSION with a fingerprint of the prompt templates, so
+        editing _build_analysis_prompt or _build_batch_prompt invalidates
+        previously cached results. Other prompt modes and structured output
+        are tagged and fingerprinted separately, since they produce
+        differently worded analyses.
+        
+        Returns:
+            Prompt version string, e.g. "1-3f2a9c0d81be" or "1-compact-07c1d9e2a4f3"
+        """
+        if PROMPT_MODE == "full" and not RESPONSE_FORMAT:
+            template = OpenRouterService._build_analysis_prompt("") + OpenRouterService._build_batch_prompt([""])
+            fingerprint = hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+            return f"{PROMPT_VERSION}-{fingerprint}"
+        template = json.dumps([
+            OpenRouterService._build_messages(""),
+            OpenRouterService._build_batch_messages([""]),
+            OpenRouterService._response_format(),
+        ], sort_keys=True)
+        fingerprint = hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+        return f"{PROMPT_VERSION}-{PROMPT_MODE}-{fingerprint}"
+    
+    @staticmethod
+    def _build_messages(sentence: str, mode: Optional[str] = None) -> list[dict]:
+        """
+        Build the chat messages for analyzing a Dutch sentence.
+        
+        Args:
+            sentence: The sentence to analyze
+            mode: Prompt mode ("full" or "compact"; defaults to PROMPT_MODE)
             
-            # Parse the LLM response
-            components, sentence_translation = OpenRouterService._parse_llm_response(content, sentence)
+        Returns:
+            Messages for the chat completions API
+        """
+        if (mode or PROMPT_MODE) == "compact":
+            return [
+                OpenRouterService._system_message(_COMPACT_ANALYSIS_INSTRUCTIONS),
+                {"role": "user", "content": f'Sentence: "{sentence}"'},
+            ]
+        return [{"role": "user", "content": OpenRouterService._build_analysis_prompt(sentence)}]
+    
+    @staticmethod
+    def _build_batch_messages(sentences: list[str], mode: Optional[str] = None) -> list[dict]:
+        """
+        Build the chat messages for analyzing several Dutch sentences in one request.
+        
+        Args:
+            sentences: The sentences to analyze
+            mode: Prompt mode ("full" or "compact"; defaults to PROMPT_MODE)
             
-            logger.info(f"[OpenRouter] Extracted {len(components)} components from sentence")
-            for i, component in enumerate(components, 1):
-                logger.debug(f"  [{i}] {component.type}: '{component.value}'")
+        Returns:
+            Messages for the chat completions API
+        """
+        if (mode or PROMPT_MODE) == "compact":
+            numbered = "\n".join(f'[{index}] "{sentence}"' for index, sentence in enumerate(sentences))
+            return [
+                OpenRouterService._system_message(_COMPACT_BATCH_INSTRUCTIONS),
+                {"role": "user", "content": f"Sentences:\n{numbered}"},
+            ]
+        return [{"role": "user", "content": OpenRouterService._build_batch_prompt(sentences)}]
+    
+    @staticmethod
+    def _build_tail_messages(sentence: str, components: list[SentenceComponent],
+                             sentence_translation: Optional[str], tail_start: int) -> list[dict]:
+        """
+        Build the follow-up messages asking for the rest of a cut-off analysis.
+        
+        Args:
+            sentence: The sentence being analyzed
+            components: Components already received
+            sentence_translation: Translation already received, if any
+            tail_start: Position in the sentence where the missing words start
             
-            return SentenceAnalysis(
-                sentence=sentence,
-                sentence_translation=sentence_translation,
-                components=components
-            )
+        Returns:
+            The original analysis messages plus a follow-up user message
+        """
+        done = ", ".join(f'"{component.value}" ({component.position})' for component in components) or "none"
+        wanted = '{"components": [...]}' if sentence_translation else '{"sentence_translation": "...", "components": [...]}'
+        follow_up = f"""Your previous answer was cut off. Components already received: {done}.
+Remaining from position {tail_start}: "{sentence[tail_start:]}"
+
+Return only a JSON object {wanted} with the components of the remaining words, in the same format as before. Positions are counted from the start of the full sentence."""
+        return OpenRouterService._build_messages(sentence) + [{"role": "user", "content": follow_up}]
+    
+    @staticmethod
+    def _system_message(text: str) -> dict:
+        """System message holding the static instructions, the prefix shared by every call"""
+        if PROMPT_CACHE_CONTROL:
+            return {"role": "system", "content": [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]}
+        return {"role": "system", "content": text}
+    
+    @staticmethod
+    def _response_format() -> Optional[dict]:
+        """Structured-output request for single-sentence analyses, per RESPONSE_FORMAT"""
+        if RESPONSE_FORMAT == "json_object":
+            return {"type": "json_object"}
+        if RESPONSE_FORMAT == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "sentence_analysis", "strict": False, "schema": _ANALYSIS_SCHEMA},
+            }
+        return None
+    
+    @staticmethod
+    def _max_tokens_for(sentence: str, adaptive: Optional[bool] = None) -> int:
+        """
+        Completion-token budget for analyzing a sentence.
+        
+        With ADAPTIVE_MAX_TOKENS the budget is the estimated analysis size
+        times ADAPTIVE_MAX_TOKENS_FACTOR, between 256 and ANALYSIS_MAX_TOKENS.
+        Otherwise it is ANALYSIS_MAX_TOKENS.
+        
+        Args:
+            sentence: Sentence to analyze
+            adaptive: Override ADAPTIVE_MAX_TOKENS
+        """
+        if not (ADAPTIVE_MAX_TOKENS if adaptive is None else adaptive):
+            return ANALYSIS_MAX_TOKENS
+        estimate = ADAPTIVE_MAX_TOKENS_FACTOR * OpenRouterService._estimate_completion_tokens(sentence)
+        return max(_ADAPTIVE_MIN_TOKENS, min(ANALYSIS_MAX_TOKENS, int(estimate)))
     
     @staticmethod
     def _build_analysis_prompt(sentence: str) -> str:
@@ -156,60 +1044,176 @@ Format expected:
 Return only the JSON object, no other text. Make sure JSON is properly formatted."""
 
     @staticmethod
-    def _parse_llm_response(content: str, sentence: str) -> tuple[list[SentenceComponent], str]:
+    def _build_batch_prompt(sentences: list[str]) -> str:
+        """
+        Build the prompt for analyzing several Dutch sentences in one request.
+        
+        Args:
+            sentences: The sentences to analyze
+            
+        Returns:
+            Prompt string for the LLM
+        """
+        numbered = "\n".join(f'[{index}] "{sentence}"' for index, sentence in enumerate(sentences))
+        return f"""Analyze each of these Dutch sentences and extract grammatical components in JSON format.
+
+Sentences:
+{numbered}
+
+For each sentence, identify the grammatical role of each word or phrase. Return a JSON array with one object per sentence containing:
+- "index": the number of the sentence shown in brackets
+- "sentence_translation": the English translation of the entire sentence
+- "components": JSON array with objects containing:
+  - "word": the word or phrase
+  - "type": the grammatical type (subject, verb, object, adjective, article, noun, adverb, preposition, conjunction, etc.)
+  - "position": the starting character position in the sentence
+  - "translation": the English translation of the word or phrase
+  - "details": additional relevant grammatical information, for example verb infinitive form and verb tense used, make sure to check separable verbs and multi-word expressions.
+
+
+Format expected:
+[
+  {{
+    "index": 0,
+    "sentence_translation": "The cat sits on the table.",
+    "components": [
+      {{"word": "De", "type": "article", "position": 0, "translation": "The", "details": {{"article-type": "definite"}}}},
+      {{"word": "kat", "type": "noun", "position": 3, "translation": "cat", "details": {{"noun-gender": "feminine", "de-or-het": "de"}}}},
+      {{"word": "zit", "type": "verb", "position": 7, "translation": "sits", "details": {{"verb-tense": "present", "infinitive": "zitten"}}}},
+      {{"word": "op", "type": "preposition", "position": 11, "translation": "on", "details": {{"preposition-type": "directional"}}}},
+      {{"word": "de", "type": "article", "position": 14, "translation": "the", "details": {{"article-type": "definite"}}}},
+      {{"word": "tafel", "type": "noun", "position": 17, "translation": "table", "details": {{"noun-gender": "feminine", "de-or-het": "de"}}}}
+    ]
+  }}
+]
+
+Return only the JSON array with one object for every sentence, no other text. Make sure JSON is properly formatted."""
+
+    @staticmethod
+    def _parse_batch_response(content: str, sentences: list[str]) -> Optional[list[Optional[SentenceAnalysis]]]:
+        """
+        Parse a batched LLM response and map its entries back to the input sentences.
+        
+        Args:
+            content: The LLM response content
+            sentences: The sentences that were sent, in prompt order
+            
+        Returns:
+            List aligned with sentences holding a SentenceAnalysis, or None for
+            sentences missing from the response; None if no JSON array could be parsed
+        """
+        with STAGE_SECONDS.time(stage="json_parse"):
+            recovered = recover_array(content)
+        if recovered.value is None:
+            logger.warning("[OpenRouter] Could not find a JSON array in batch response")
+            ERRORS.inc(type="parse_failure")
+            LLM_PARSE_RESULTS.inc(kind="batch", outcome="failed")
+            return None
+        if recovered.complete:
+            LLM_PARSE_RESULTS.inc(kind="batch", outcome="ok")
+        else:
+            # Entries after the cut are missing and get retried as a smaller batch
+            logger.warning("[OpenRouter] Salvaged %s entries from a %s batch response", len(recovered.value),
+                           "truncated" if recovered.truncated else "malformed")
+            LLM_PARSE_RESULTS.inc(kind="batch", outcome="salvaged")
+        response_data = recovered.value
+        
+        results: list[Optional[SentenceAnalysis]] = [None] * len(sentences)
+        for item in response_data:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            if not isinstance(index, int) or not 0 <= index < len(sentences):
+                continue
+            with STAGE_SECONDS.time(stage="model_build"):
+                components = OpenRouterService._build_components(item.get("components", []))
+            if components:
+                results[index] = SentenceAnalysis(
+                    sentence=sentences[index],
+                    sentence_translation=item.get("sentence_translation"),
+                    components=components
+                )
+        
+        logger.debug("[OpenRouter] Mapped %s/%s sentences from batch response", sum(1 for r in results if r), len(sentences))
+        return results
+    
+    @staticmethod
+    def _parse_llm_response(content: str, sentence: str,
+                            kind: str = "sentence") -> tuple[list[SentenceComponent], Optional[str], bool]:
         """
         Parse the LLM response and extract grammatical components and sentence translation.
         
+        Prose and code fences around the JSON are ignored. When the JSON is
+        cut off (max_tokens) or malformed, the translation and every complete
+        component are salvaged instead of discarding the whole answer.
+        
         Args:
             content: The LLM response content
             sentence: The original sentence (for validation)
+            kind: Response kind for the parse metric ("sentence" or "tail")
             
         Returns:
-            Tuple of (List of SentenceComponent objects, sentence translation)
+            Tuple of (List of SentenceComponent objects, sentence translation,
+            whether the answer was cut off before its end)
         """
-        try:
-            # Extract JSON from response (handle cases where LLM adds extra text)
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
-            
-            if json_start == -1 or json_end == 0:
-                logger.warning(f"[OpenRouter] Could not find JSON in LLM response: {content}")
-                return [], None
-            
-            json_str = content[json_start:json_end]
-            logger.debug(f"[OpenRouter] Extracted JSON sample: {json_str[:15]}...")
-            
-            response_data = json.loads(json_str)
-            logger.debug(f"[OpenRouter] Parsed response data")
-            
-            # Extract sentence translation
-            sentence_translation = response_data.get("sentence_translation")
-            logger.info(f"[OpenRouter] Sentence translation: {sentence_translation}")
-            
-            # Extract components
-            components_data = response_data.get("components", [])
-            logger.debug(f"[OpenRouter] Parsed {len(components_data)} components from JSON")
-            
-            components = []
-            for item in components_data:
-                if isinstance(item, dict) and "word" in item and "type" in item:
-                    components.append(
-                        SentenceComponent(
-                            type=item["type"],
-                            value=item["word"],
-                            position=item.get("position", 0),
-                            translation=item.get("translation"),
-                            details=item.get("details")
-                        )
-                    )
-            
-            logger.debug(f"[OpenRouter] Successfully created {len(components)} SentenceComponent objects")
-            return components, sentence_translation
+        with STAGE_SECONDS.time(stage="json_parse"):
+            recovered = recover_analysis(content)
+        response_data = recovered.value
+        if response_data is None:
+            logger.warning("[OpenRouter] Could not find JSON in LLM response: %s", content[:200])
+            logger.debug("[OpenRouter] Content that failed to parse: %s", content)
+            ERRORS.inc(type="parse_failure")
+            LLM_PARSE_RESULTS.inc(kind=kind, outcome="failed")
+            return [], None, recovered.truncated
+        
+        # Extract sentence translation
+        sentence_translation = response_data.get("sentence_translation")
+        logger.info("[OpenRouter] Sentence translation: %s", sentence_translation)
+        
+        # Extract components
+        components_data = response_data.get("components")
+        if not isinstance(components_data, list):
+            components_data = []
+        logger.debug("[OpenRouter] Parsed %s components from JSON", len(components_data))
+        
+        with STAGE_SECONDS.time(stage="model_build"):
+            components = OpenRouterService._build_components(components_data)
+        
+        if recovered.complete:
+            LLM_PARSE_RESULTS.inc(kind=kind, outcome="ok")
+        else:
+            logger.warning("[OpenRouter] Salvaged %s components from a %s response", len(components),
+                           "truncated" if recovered.truncated else "malformed")
+            LLM_PARSE_RESULTS.inc(kind=kind, outcome="salvaged" if components else "failed")
+        logger.debug("[OpenRouter] Successfully created %s SentenceComponent objects", len(components))
+        return components, sentence_translation, recovered.truncated
+    
+    @staticmethod
+    def _build_components(components_data: list) -> list[SentenceComponent]:
+        """
+        Convert the "components" array of an LLM response into SentenceComponent objects.
+        
+        Entries that are not objects or lack "word" or "type" are skipped.
+        
+        Args:
+            components_data: Parsed "components" array
             
-        except json.JSONDecodeError as e:
-            logger.warning(f"[OpenRouter] Failed to parse JSON from LLM response: {e}")
-            logger.debug(f"[OpenRouter] Content that failed to parse: {content}")
-            return [], None
+        Returns:
+            List of SentenceComponent objects
+        """
+        components = []
+        for item in components_data:
+            if isinstance(item, dict) and "word" in item and "type" in item:
+                components.append(
+                    SentenceComponent(
+                        type=item["type"],
+                        value=item["word"],
+                        position=item.get("position", 0),
+                        translation=item.get("translation"),
+                        details=item.get("details")
+                    )
+                )
+        return components
     
     @staticmethod
     def _is_valid_sentence(sentence: str) -> bool:
@@ -226,16 +1230,14 @@ Return only the JSON object, no other text. Make sure JSON is properly formatted
         Returns:
             True if sentence is valid, False otherwise
         """
-        import re
-        # Check if sentence contains at least one word (sequence of letters)
-        # This pattern matches any word character sequence (including accents for Dutch)
-        has_word = re.search(r'[a-zA-Z\u00C0-\u00FF]+', sentence)
+        # Check if sentence contains at least one word (any Unicode letter, so accents are covered)
+        has_word = segmenter.has_word(sentence)
         
         if has_word:
-            logger.debug(f"[OpenRouter] Valid sentence: '{sentence}'")
+            logger.debug("[OpenRouter] Valid sentence: '%s'", sentence)
             return True
         else:
-            logger.debug(f"[OpenRouter] Filtered out invalid sentence: '{sentence}'")
+            logger.debug("[OpenRouter] Filtered out invalid sentence: '%s'", sentence)
             return False
     
     @staticmethod
@@ -243,22 +1245,33 @@ Return only the JSON object, no other text. Make sure JSON is properly formatted
         """
         Split text into sentences and filter for valid ones.
         
+        Uses the Dutch-aware segmenter, so abbreviations ("bijv.", "d.w.z."),
+        decimals and initials no longer produce fragments that would each cost
+        an LLM call. Sentences keep their closing punctuation.
+        
         Args:
             text: Text to split
             
         Returns:
             List of valid sentences (containing at least one word)
         """
-        import re
-        # Split by common sentence-ending punctuation
-        sentences = re.split(r'[.!?]+', text)
+        with STAGE_SECONDS.time(stage="split"):
+            sentences = segmenter.split_sentences(text)
         
-        # Clean and filter sentences
-        valid_sentences = [
-            s.strip() 
-            for s in sentences 
-            if s.strip() and OpenRouterService._is_valid_sentence(s.strip())
-        ]
+        logger.debug("[OpenRouter] Split text into %s sentence(s)", len(sentences))
+        return sentences
+    
+    @staticmethod
+    def _segment_sentences(text: str) -> list[segmenter.Segment]:
+        """
+        Split text like _split_sentences, keeping each sentence's offsets.
         
-        logger.debug(f"[OpenRouter] Split text into {len(valid_sentences)} valid sentence(s) from {len([s.strip() for s in sentences if s.strip()])} total")
-        return valid_sentences
+        Args:
+            text: Text to split
+            
+        Returns:
+            Segments whose text is the sentence as _split_sentences returns it
+            and whose start/end point into the original text
+        """
+        with STAGE_SECONDS.time(stage="split"):
+            return [s._replace(text=segmenter.collapse_whitespace(s.text)) for s in segmenter.segment(text)]
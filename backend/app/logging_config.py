@@ -0,0 +1,159 @@
+"""Logging setup: queue-based handler, JSON records and request correlation IDs"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+# DEBUG logs every sentence and upstream call; opt in with LOG_LEVEL=DEBUG when needed
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for human-readable lines, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Hand records to a background thread so log I/O never blocks the event loop
+LOG_ASYNC = os.getenv("LOG_ASYNC", "True").lower() == "true"
+# Fraction of DEBUG records that are kept; INFO and above are never sampled
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+# Level for chatty third-party loggers (httpx, httpcore)
+LOG_LIBRARY_LEVEL = os.getenv("LOG_LIBRARY_LEVEL", "WARNING").upper()
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s %(sentence_id)s] %(message)s'
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+sentence_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("sentence_id", default="-")
+
+_listener: logging.handlers.QueueListener = None
+
+
+class ContextFilter(logging.Filter):
+    """Attach the current request and sentence correlation IDs to every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.sentence_id = sentence_id_var.get()
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keep only a random fraction of DEBUG records"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves all formatting to the listener thread.
+
+    The stock prepare() formats the record on the calling thread, folding
+    the traceback into msg and dropping exc_info, which both costs event
+    loop time and hides exc_info from JSONFormatter. The queue never leaves
+    the process, so the record is passed on as is; only mutable container
+    arguments are copied, so a later change to them cannot alter the message.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.args, dict):
+            record.args = dict(record.args)
+        elif record.args:
+            record.args = tuple(
+                arg.copy() if isinstance(arg, (list, dict, set, bytearray)) else arg for arg in record.args
+            )
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """Render records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "sentence_id": getattr(record, "sentence_id", "-"),
+        }
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def configure_logging() -> None:
+    """
+    Configure the root logger from the environment.
+
+    Records are filtered (level, debug sampling) and enriched with correlation
+    IDs on the calling thread; with LOG_ASYNC they are then put on an
+    unbounded queue and formatted and written by a QueueListener thread.
+    """
+    global _listener
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    if LOG_ASYNC:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        handler = DeferredQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+    else:
+        handler = stream_handler
+
+    handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+    handler.addFilter(ContextFilter())
+    root.addHandler(handler)
+
+    for name in ("httpx", "httpcore", "hpack"):
+        logging.getLogger(name).setLevel(LOG_LIBRARY_LEVEL)
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that assigns each HTTP request a correlation ID.
+
+    An incoming X-Request-ID header is reused, otherwise a new ID is
+    generated. The ID is stored in a context variable for log records and
+    echoed back in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:12]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
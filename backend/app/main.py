@@ -1,34 +1,170 @@
 """Main FastAPI application"""
+import asyncio
 import logging
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes import router
+from app.cache import analysis_cache, ANALYSIS_SNAPSHOT_PATH
+from app.llm_service import OpenRouterService, sentence_flights
+from app.http_client import create_http_client, pool_stats
+from app.scheduler import upstream_scheduler
+from app.model_router import model_router
+from app.jobs import job_manager
+from app.admission import admission, ALLOWED_ORIGINS
+from app.lexicon import sentence_lexicon, LEXICON_LEARN, LEXICON_BOOTSTRAP_ROWS
+from app.metrics import REGISTRY, MetricsMiddleware
+from app.responses import FastJSONResponse, CompressionMiddleware, RESPONSE_COMPRESSION
+from app.logging_config import configure_logging, RequestContextMiddleware
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (level, format, sampling and queueing come from the environment)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up shared resources on startup and release them on shutdown"""
+    if analysis_cache is not None:
+        # Entries from older prompt versions can never be hit again
+        await analysis_cache.purge_other_versions(OpenRouterService.prompt_version())
+        # Pre-warmed analyses (python prewarm.py), shared with other workers through the page cache
+        analysis_cache.open_snapshot(ANALYSIS_SNAPSHOT_PATH, OpenRouterService.prompt_version())
+    if sentence_lexicon is not None and LEXICON_LEARN and analysis_cache is not None and analysis_cache.disk is not None:
+        # Grow the lexicon from analyses the LLM already produced in earlier runs
+        store = analysis_cache.disk
+        learned = await asyncio.to_thread(
+            lambda: sentence_lexicon.learn_all(store.iter_analyses(OpenRouterService.prompt_version(), LEXICON_BOOTSTRAP_ROWS))
+        )
+        logger.info("[Lexicon] Learned %s word(s) from the analysis cache", learned)
+    # One pooled client for all upstream calls, so connections are reused across requests
+    client = create_http_client()
+    OpenRouterService.set_http_client(client)
+    # Background job workers; unfinished jobs resume from their last checkpoint
+    await job_manager.start()
+    try:
+        yield
+    finally:
+        await job_manager.stop()
+        OpenRouterService.set_http_client(None)
+        await client.aclose()
+        if analysis_cache is not None:
+            analysis_cache.close_snapshot()
+
 app = FastAPI(
     title="DutchHelper API",
     description="API for Dutch language learning assistance with grammatical analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Configure CORS to allow frontend requests
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://localhost:3000"],  # Vite and fallback ports
+    allow_origins=ALLOWED_ORIGINS,  # Vite and fallback ports by default
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# gzip/brotli for large JSON bodies such as whole-text analyses; NDJSON streams are left alone
+if RESPONSE_COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
 # Include routes
 app.include_router(router)
 
+def collect_runtime_metrics() -> list:
+    """Expose cache, single-flight, connection pool, scheduler, admission, model router and job counters at scrape time"""
+    families = []
+    if analysis_cache is not None:
+        cache = analysis_cache.stats()
+        families += [
+            ("dutchhelper_cache_lookups_total", "counter", "Analysis cache lookups by result", [
+                ({"result": "memory_hit"}, cache["memory_hits"]),
+                ({"result": "snapshot_hit"}, cache["snapshot_hits"]),
+                ({"result": "disk_hit"}, cache["disk_hits"]),
+                ({"result": "miss"}, cache["misses"]),
+            ]),
+            ("dutchhelper_cache_evictions_total", "counter", "Analysis cache entries evicted or expired", [
+                ({"tier": "memory", "reason": "lru"}, cache["memory_evictions"]),
+                ({"tier": "memory", "reason": "ttl"}, cache["memory_expirations"]),
+                ({"tier": "disk", "reason": "ttl"}, cache["disk_expirations"]),
+            ]),
+            ("dutchhelper_cache_memory_entries", "gauge", "Entries in the in-memory cache tier", [
+                ({}, cache["memory_entries"]),
+            ]),
+            ("dutchhelper_cache_snapshot_entries", "gauge", "Entries in the pre-warmed snapshot tier", [
+                ({}, cache["snapshot_entries"]),
+            ]),
+        ]
+    flights = sentence_flights.stats()
+    families += [
+        ("dutchhelper_singleflight_calls_total", "counter", "Upstream analyses started vs. joined by identical requests", [
+            ({"role": "leader"}, flights["leaders"]),
+            ({"role": "coalesced"}, flights["coalesced"]),
+        ]),
+        ("dutchhelper_singleflight_in_flight", "gauge", "Distinct sentences currently being analyzed upstream", [
+            ({}, flights["in_flight"]),
+        ]),
+        ("dutchhelper_singleflight_abandoned_total", "counter", "Shared upstream analyses cancelled because every waiter left", [
+            ({}, flights["abandoned"]),
+        ]),
+    ]
+    scheduler = upstream_scheduler.stats()
+    families += [
+        ("dutchhelper_scheduler_queued", "gauge", "Upstream calls waiting for a rate-limit token, by lane", [
+            ({"lane": lane}, count) for lane, count in scheduler["queued"].items()
+        ]),
+        ("dutchhelper_scheduler_deadline_exceeded_total", "counter", "Upstream calls abandoned at their deadline", [
+            ({}, scheduler["deadline_exceeded"]),
+        ]),
+    ]
+    if admission is not None:
+        slots = admission.stats()
+        families += [
+            ("dutchhelper_admission_in_flight", "gauge", "Analysis requests holding an admission slot", [
+                ({}, slots["in_flight"]),
+            ]),
+            ("dutchhelper_admission_queued", "gauge", "Analysis requests waiting for an admission slot", [
+                ({}, slots["queued"]),
+            ]),
+        ]
+    models = model_router.stats()["models"]
+    families += [
+        ("dutchhelper_model_circuit_open", "gauge", "1 while a model's circuit breaker keeps calls away from it", [
+            ({"model": model}, 0 if state["state"] == "closed" else 1) for model, state in models.items()
+        ]),
+        ("dutchhelper_model_hedge_delay_seconds", "gauge", "Latency after which a call to a model is hedged", [
+            ({"model": model}, state["hedge_delay"]) for model, state in models.items()
+        ]),
+    ]
+    jobs = job_manager.stats()
+    families += [
+        ("dutchhelper_jobs", "gauge", "Background analysis jobs by state", [
+            ({"state": "queued"}, jobs["queued"]),
+            ({"state": "running"}, len(jobs["running"])),
+        ]),
+    ]
+    client = OpenRouterService.http_client
+    if client is not None:
+        pool = pool_stats(client)
+        families += [
+            ("dutchhelper_http_pool_connections", "gauge", "Upstream pool connections by state", [
+                ({"state": "idle"}, pool["idle_connections"]),
+                ({"state": "active"}, pool["connections"] - pool["idle_connections"]),
+            ]),
+            ("dutchhelper_http_pool_connections_opened_total", "counter", "Upstream connections opened", [
+                ({}, pool["connections_opened"]),
+            ]),
+        ]
+    return families
+
+REGISTRY.register_collector(collect_runtime_metrics)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -43,3 +179,8 @@ async def root():
 async def health():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4")
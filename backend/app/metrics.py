@@ -0,0 +1,305 @@
+"""Minimal Prometheus-compatible metrics (counters, gauges, histograms)"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Seconds; covers cache hits (sub-millisecond) up to slow LLM completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class for a metric family with a fixed set of label names"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Increment for the duration of the block"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state["counts"][i] += 1
+                break
+        state["sum"] += value
+        state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> Iterator[tuple[str, dict, float]]:
+        for key, state in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, state["sum"]
+            yield f"{self.name}_count", labels, state["count"]
+
+
+class Registry:
+    """
+    Collection of metrics rendered together in the Prometheus text format.
+
+    Besides metrics owned by the registry, collectors can be registered to
+    report values that live elsewhere (cache counters, pool state) at scrape
+    time. A collector returns a list of (name, type, help, samples) tuples,
+    where samples is a list of (labels, value).
+    """
+
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        self._collectors: list[Callable[[], list]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], list]) -> None:
+        self._collectors.append(collector)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "dutchhelper_stage_duration_seconds",
+    "Time spent in each stage of the analysis pipeline",
+    ("stage",),
+)
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "dutchhelper_upstream_requests_total",
+    "Chat completion requests sent upstream, by model and HTTP status",
+    ("model", "status"),
+)
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    "dutchhelper_upstream_requests_in_flight",
+    "Chat completion requests currently awaiting an upstream response",
+)
+LLM_TOKENS = REGISTRY.counter(
+    "dutchhelper_llm_tokens_total",
+    "Tokens reported in the upstream usage block, by model and kind (prompt/completion)",
+    ("model", "kind"),
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "dutchhelper_upstream_retries_total",
+    "Upstream calls retried after a retryable failure, by reason",
+    ("reason",),
+)
+SCHEDULER_WAIT = REGISTRY.histogram(
+    "dutchhelper_scheduler_wait_seconds",
+    "Time upstream calls waited for a rate-limit token, by lane",
+    ("lane",),
+)
+LEXICON_LOOKUPS = REGISTRY.counter(
+    "dutchhelper_lexicon_lookups_total",
+    "Sentences offered to the local lexicon fast path, by result (hit/miss)",
+    ("result",),
+)
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "dutchhelper_upstream_hedges_total",
+    "Hedged upstream calls sent because the current model was slower than its latency percentile, by hedge model",
+    ("model",),
+)
+MODEL_FAILOVERS = REGISTRY.counter(
+    "dutchhelper_model_failovers_total",
+    "Upstream calls moved to a fallback model after the previous model failed, by fallback model",
+    ("model",),
+)
+LLM_PARSE_RESULTS = REGISTRY.counter(
+    "dutchhelper_llm_parse_results_total",
+    "LLM answers by response kind (sentence/batch/tail) and parse outcome (ok/salvaged/failed)",
+    ("kind", "outcome"),
+)
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "dutchhelper_admission_decisions_total",
+    "Analysis requests by lane and admission result (admitted/queue_full/client_limit/deadline)",
+    ("lane", "result"),
+)
+REQUESTS_CANCELLED = REGISTRY.counter(
+    "dutchhelper_requests_cancelled_total",
+    "Analysis requests whose work was cancelled, by reason (disconnect/deadline)",
+    ("reason",),
+)
+WS_CONNECTIONS = REGISTRY.gauge(
+    "dutchhelper_websocket_connections",
+    "Open WebSocket analysis sessions",
+)
+WS_JOBS = REGISTRY.counter(
+    "dutchhelper_websocket_jobs_total",
+    "Sentence jobs sent over WebSocket sessions, by outcome (ok/error/cancelled/disconnect/rejected)",
+    ("outcome",),
+)
+ERRORS = REGISTRY.counter(
+    "dutchhelper_errors_total",
+    "Errors in the analysis pipeline, by type",
+    ("type",),
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    "dutchhelper_http_requests_total",
+    "API requests handled, by method, route and status",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "dutchhelper_http_requests_in_flight",
+    "API requests currently being handled",
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "dutchhelper_http_request_duration_seconds",
+    "API request latency until the response starts, by route",
+    ("route",),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts, latency and in-flight requests.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so streaming responses
+    and client disconnects pass through untouched. Latency is measured until
+    the response starts, which for streaming endpoints is the time to first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        elapsed = None
+
+        async def send_with_metrics(message):
+            nonlocal status, elapsed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+            await send(message)
+
+        with HTTP_IN_FLIGHT.track():
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            finally:
+                # FastAPI stores the matched route in the scope; use its template to bound cardinality
+                route = getattr(scope.get("route"), "path", "unmatched")
+                HTTP_REQUESTS.inc(method=scope["method"], route=route, status=status)
+                HTTP_SECONDS.observe(elapsed if elapsed is not None else time.perf_counter() - started, route=route)
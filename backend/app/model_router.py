@@ -0,0 +1,319 @@
+"""Multi-model routing with hedged requests and per-model circuit breakers"""
+import asyncio
+import collections
+import logging
+import math
+import os
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+from app.metrics import UPSTREAM_HEDGES, MODEL_FAILOVERS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "mistralai/mistral-nemo")
+# Comma-separated models tried after the primary, in order
+OPENROUTER_FALLBACK_MODELS = [m.strip() for m in os.getenv("OPENROUTER_FALLBACK_MODELS", "").split(",") if m.strip()]
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "True").lower() == "true"
+# A hedge is sent once the primary has been slower than this latency percentile
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "1.0"))
+# Hedge delay used until a model has HEDGE_MIN_SAMPLES latency samples
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("HEDGE_DEFAULT_DELAY_SECONDS", "10"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Upper bound on hedges as a fraction of routed calls, so a global slowdown does not double the load
+HEDGE_MAX_FRACTION = float(os.getenv("HEDGE_MAX_FRACTION", "0.1"))
+LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "200"))
+
+# A model's breaker opens when at least BREAKER_ERROR_RATE of its last
+# BREAKER_WINDOW_SECONDS of calls failed (with at least BREAKER_MIN_CALLS calls)
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies"""
+
+    def __init__(self, size: int):
+        self.samples: collections.deque[float] = collections.deque(maxlen=max(1, size))
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency at quantile q (0..1) of the window, or None without samples"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one model.
+
+    Closed: calls flow and outcomes are recorded over a time window. Open:
+    the model is skipped until the cooldown has passed. Half-open: a single
+    probe call is let through; its success closes the breaker, its failure
+    opens it for another cooldown.
+    """
+
+    def __init__(self, error_rate: float, min_calls: int, window: float, cooldown: float):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.opens = 0
+        self._outcomes: collections.deque[tuple[float, bool]] = collections.deque()
+        self._probing = False
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def available(self) -> bool:
+        """Whether allow() would currently let a call through, without claiming the probe"""
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown
+        return not (self.state == HALF_OPEN and self._probing)
+
+    def allow(self) -> bool:
+        """Whether a call may be routed to the model now; claims the probe when half-open"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record(self, ok: bool) -> None:
+        now = time.monotonic()
+        if self.state == OPEN:
+            # A call forced through while every model was open
+            return
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self._outcomes.clear()
+            else:
+                self._open(now)
+            return
+        self._outcomes.append((now, ok))
+        self._trim(now)
+        failures = sum(1 for _, success in self._outcomes if not success)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._open(now)
+
+    def release(self) -> None:
+        """Give back a probe whose call was cancelled before it finished"""
+        if self.state == HALF_OPEN:
+            self._probing = False
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self.opens += 1
+        self._outcomes.clear()
+
+    def error_ratio(self) -> float:
+        self._trim(time.monotonic())
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for _, success in self._outcomes if not success) / len(self._outcomes)
+
+
+class ModelRouter:
+    """
+    Routes upstream calls across a primary model and ordered fallbacks.
+
+    Each call goes to the first model whose circuit breaker is closed. If
+    it has not answered within that model's HEDGE_PERCENTILE latency, the
+    same call is also sent to the next model. The first usable answer wins
+    and the other attempt is cancelled. A model that fails outright is
+    replaced by the next one right away. Every model tracks its own
+    latencies and error rate.
+    """
+
+    def __init__(self, models: list[str]):
+        self.models = list(dict.fromkeys(models))
+        self.latency = {model: LatencyTracker(LATENCY_WINDOW) for model in self.models}
+        self.breakers = {
+            model: CircuitBreaker(BREAKER_ERROR_RATE, BREAKER_MIN_CALLS, BREAKER_WINDOW_SECONDS, BREAKER_COOLDOWN_SECONDS)
+            for model in self.models
+        }
+        self.calls = 0
+        self.hedges = 0
+        self.wins = {model: 0 for model in self.models}
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def select(self, exclude: tuple = (), claim: bool = True) -> Optional[str]:
+        """
+        Pick the first model whose breaker lets a call through.
+
+        Args:
+            exclude: Models already tried for this call
+            claim: Take the half-open probe of the chosen model; pass False
+                to only look, and call breakers[model].allow() before sending
+
+        Returns:
+            Model name, or None if every remaining model is open
+        """
+        for model in self.models:
+            if model in exclude:
+                continue
+            breaker = self.breakers[model]
+            if breaker.allow() if claim else breaker.available():
+                return model
+        return None
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait for a model before hedging to the next one"""
+        tracker = self.latency[model]
+        if len(tracker.samples) < HEDGE_MIN_SAMPLES:
+            return max(HEDGE_MIN_DELAY_SECONDS, HEDGE_DEFAULT_DELAY_SECONDS)
+        return max(HEDGE_MIN_DELAY_SECONDS, tracker.percentile(HEDGE_PERCENTILE))
+
+    def record(self, model: str, ok: bool, seconds: Optional[float] = None) -> None:
+        """Record the outcome (and latency, on success) of a call to a model"""
+        self.breakers[model].record(ok)
+        if ok and seconds is not None:
+            self.latency[model].observe(seconds)
+        if not ok and self.breakers[model].state == OPEN:
+            logger.warning("[Router] Circuit for %s is open (error rate over %.0f%%)", model, BREAKER_ERROR_RATE * 100)
+
+    def release(self, model: str) -> None:
+        """Forget a call to a model that was abandoned before it finished"""
+        self.breakers[model].release()
+
+    def _may_hedge(self) -> bool:
+        return HEDGE_ENABLED and self.hedges < HEDGE_MAX_FRACTION * self.calls + 1
+
+    async def run(self, call: Callable[[str], Awaitable[T]],
+                  usable: Optional[Callable[[T], bool]] = None, hedge: bool = True) -> T:
+        """
+        Run a call against the routed models.
+
+        Args:
+            call: Coroutine factory taking the model name and performing the call
+            usable: Predicate telling whether a result can be used (e.g. it
+                parsed). An unusable result counts as a failure of its model;
+                it is returned only if no model produces a usable one.
+            hedge: Send a hedged call to the next model when the current one is slow
+
+        Returns:
+            Result of the first attempt that succeeded with a usable result
+
+        Raises:
+            Exception: The first attempt's error if every model failed
+        """
+        self.calls += 1
+        model = self.select() or self.primary
+        tried = [model]
+        attempts = {asyncio.create_task(self._attempt(model, call, usable)): model}
+        first_error: Optional[BaseException] = None
+        fallback_result = None
+        has_fallback_result = False
+
+        try:
+            while attempts:
+                timeout = None
+                hedge_model = None
+                if hedge and len(attempts) == 1 and self._may_hedge():
+                    hedge_model = self.select(exclude=tuple(tried), claim=False)
+                    if hedge_model is not None:
+                        timeout = self.hedge_delay(next(iter(attempts.values())))
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Current attempt is slower than its usual tail: race it against the next model
+                    tried.append(hedge_model)
+                    if self.breakers[hedge_model].allow():
+                        self.hedges += 1
+                        UPSTREAM_HEDGES.inc(model=hedge_model)
+                        logger.info("[Router] %s slower than %.2fs, hedging to %s",
+                                    tried[-2], timeout, hedge_model)
+                        attempts[asyncio.create_task(self._attempt(hedge_model, call, usable))] = hedge_model
+                    continue
+
+                for task in done:
+                    winner = attempts.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        ok, result = task.result()
+                        if ok:
+                            self.wins[winner] += 1
+                            return result
+                        fallback_result, has_fallback_result = result, True
+                    elif first_error is None:
+                        first_error = error
+
+                if not attempts:
+                    # Everything in flight failed: fail over to the next model right away
+                    next_model = self.select(exclude=tuple(tried))
+                    if next_model is not None:
+                        MODEL_FAILOVERS.inc(model=next_model)
+                        logger.warning("[Router] %s failed, failing over to %s", tried[-1], next_model)
+                        tried.append(next_model)
+                        attempts[asyncio.create_task(self._attempt(next_model, call, usable))] = next_model
+        finally:
+            for task in attempts:
+                task.cancel()
+
+        if has_fallback_result:
+            return fallback_result
+        raise first_error
+
+    async def _attempt(self, model: str, call: Callable[[str], Awaitable[T]],
+                       usable: Optional[Callable[[T], bool]]) -> tuple[bool, T]:
+        started = time.perf_counter()
+        try:
+            result = await call(model)
+        except asyncio.CancelledError:
+            # The other attempt won; this says nothing about the model's health
+            self.release(model)
+            raise
+        except Exception:
+            self.record(model, ok=False)
+            raise
+        ok = usable is None or usable(result)
+        self.record(model, ok, time.perf_counter() - started)
+        return ok, result
+
+    def stats(self) -> dict:
+        """Return per-model breaker state, hedge delay and win counts"""
+        return {
+            "primary": self.primary,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "models": {
+                model: {
+                    "state": self.breakers[model].state,
+                    "error_rate": round(self.breakers[model].error_ratio(), 3),
+                    "opens": self.breakers[model].opens,
+                    "hedge_delay": round(self.hedge_delay(model), 3),
+                    "wins": self.wins[model],
+                }
+                for model in self.models
+            },
+        }
+
+
+model_router = ModelRouter([OPENROUTER_MODEL] + OPENROUTER_FALLBACK_MODELS)
@@ -20,6 +20,8 @@ class SentenceAnalysis(BaseModel):
     sentence: str
     sentence_translation: Optional[str] = None  # English translation of the whole sentence
     components: List[SentenceComponent] = []
+    error: Optional[str] = None  # Set when this sentence could not be analyzed
+    partial: bool = False  # The LLM answer was cut off; components after the cut may be missing
 
 class TextAnalysisRequest(BaseModel):
     """Request to analyze Dutch text"""
@@ -34,3 +36,54 @@ class TextAnalysisResponse(BaseModel):
     original_text: str
     sentences: List[SentenceAnalysis] = []
     summary: Optional[dict] = None  # For future use with additional stats
+
+class IncrementalAnalysisRequest(BaseModel):
+    """Request to re-analyze edited text, reusing the sentences the client already has"""
+    text: str
+    known_hashes: List[str] = []  # Hashes of the client's current sentences, in order
+
+class SentenceChange(BaseModel):
+    """How one sentence of the new text relates to the client's previous sentences"""
+    op: str  # "keep", "insert" or "replace"
+    index: int  # Position in the new list of sentences
+    old_index: Optional[int] = None  # Client sentence that is kept ("keep") or superseded ("replace")
+    hash: str
+    start: int  # Character offsets of the sentence in the new text
+    end: int
+    analysis: Optional[SentenceAnalysis] = None  # Fresh analysis for "insert" and "replace"
+
+class IncrementalAnalysisResponse(BaseModel):
+    """Sentence-level diff between the client's sentences and the new text"""
+    changes: List[SentenceChange] = []  # One entry per sentence of the new text, in order
+    deleted: List[int] = []  # Client sentence indices with no counterpart in the new text
+    summary: Optional[dict] = None
+
+class JobCreateRequest(BaseModel):
+    """Request to analyze a large text as a background job"""
+    text: str
+    name: Optional[str] = None  # Label shown when listing jobs, e.g. the uploaded file name
+
+class JobStatus(BaseModel):
+    """Progress of a background analysis job"""
+    id: str
+    name: Optional[str] = None
+    status: str  # "queued", "running", "completed" or "failed"
+    created_at: float
+    updated_at: float
+    total_sentences: int
+    processed_sentences: int = 0
+    failed_sentences: int = 0
+    error: Optional[str] = None
+
+class JobResult(BaseModel):
+    """One analyzed sentence of a job, as stored in its results file"""
+    index: int
+    analysis: SentenceAnalysis
+
+class JobResultsPage(BaseModel):
+    """A page of job results"""
+    job_id: str
+    status: str
+    offset: int
+    total: int  # Number of sentences analyzed so far
+    items: List[JobResult] = []
@@ -0,0 +1,183 @@
+"""Fast JSON responses and compression for large analysis payloads"""
+import asyncio
+import gzip
+import json
+import os
+from typing import Any, Optional
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_COMPRESSION = os.getenv("RESPONSE_COMPRESSION", "True").lower() == "true"
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Bodies above this size are compressed in a worker thread instead of on the event loop
+_THREAD_COMPRESS_BYTES = 256 * 1024
+_COMPRESSIBLE_TYPES = (b"application/json",)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(content: Any) -> bytes:
+    """
+    Encode a response body as compact UTF-8 JSON.
+
+    Pydantic models go straight through pydantic-core's JSON serializer, which
+    is faster than dumping them to dicts first. Other content is encoded with
+    orjson when installed and the standard library otherwise; models nested in
+    dicts or lists are supported either way.
+
+    Args:
+        content: Pydantic model or JSON-compatible value
+
+    Returns:
+        Encoded JSON bytes
+    """
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for content that is already validated.
+
+    Returning a Response from a route bypasses FastAPI's response_model round
+    trip (validate, dump to dicts, jsonable_encoder, json.dumps), so a model
+    built once by the service layer is serialized exactly once. Routes keep
+    declaring response_model for the OpenAPI schema.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _choose_encoding(header: str) -> Optional[str]:
+    accepted = _accepted_encodings(header)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with the given content coding ("br" or "gzip")"""
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses large non-streaming JSON responses.
+
+    Brotli is preferred when the optional ``brotli`` package is installed and
+    the client accepts it, gzip otherwise. Only complete bodies (a single
+    http.response.body message) are compressed: NDJSON streams and other
+    chunked responses pass through untouched so their frames are not held
+    back in a compressor buffer.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                encoding = _choose_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            # First body message decides: compress a complete body, pass streams through
+            passthrough = True
+            body = message.get("body", b"")
+            headers = start_message.get("headers", [])
+            if message.get("more_body", False) or not self._should_compress(headers, body):
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) > _THREAD_COMPRESS_BYTES:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            vary = b", ".join([v for k, v in headers if k == b"vary"] + [b"Accept-Encoding"])
+            headers = [(k, v) for k, v in headers if k not in (b"content-length", b"vary")]
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", vary),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _should_compress(self, headers: list, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.startswith(_COMPRESSIBLE_TYPES)
@@ -1,9 +1,28 @@
 """API routes for DutchHelper"""
 import logging
-from fastapi import APIRouter, HTTPException
-from app.models import Message, TextAnalysisRequest, AnalyzeSentenceRequest, TextAnalysisResponse, SentenceAnalysis
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket
+from app.models import (
+    Message, TextAnalysisRequest, AnalyzeSentenceRequest, TextAnalysisResponse, SentenceAnalysis,
+    JobCreateRequest, JobStatus, JobResultsPage, IncrementalAnalysisRequest, IncrementalAnalysisResponse,
+)
 from app.services import SentenceAnalyzerService
-from app.exceptions import ValidationError, ProcessingError
+from app.exceptions import (
+    ValidationError, ForbiddenError, ProcessingError, OverloadedError, ClientClosedRequestError, DeadlineExceededError,
+)
+from app.cache import analysis_cache
+from app.llm_service import OpenRouterService, sentence_flights
+from app.http_client import pool_stats
+from app.scheduler import Priority, upstream_scheduler, INTERACTIVE_MAX_SENTENCES
+from app.admission import (
+    admission, start_request, admit, run_request, cancel_on_disconnect, AdmittedStreamingResponse, origin_allowed,
+    admin_allowed,
+)
+from app.model_router import model_router
+from app.jobs import job_manager, JOBS_MAX_TEXT_BYTES
+from app.lexicon import sentence_lexicon
+from app.responses import FastJSONResponse, encode_json
+from app.ws_session import AnalysisSession
 
 logger = logging.getLogger(__name__)
 
@@ -20,44 +39,126 @@ async def send_message(message: Message):
     Returns:
         Echo response with received status
     """
-    logger.info(f"Message received: {message.text}")
+    logger.info("Message received: %s", message.text)
     return {"text": f"You said: {message.text}", "status": "received"}
 
 @router.post("/analyze", response_model=TextAnalysisResponse)
-async def analyze_text(request: TextAnalysisRequest):
+async def analyze_text(request: TextAnalysisRequest, http_request: Request):
     """
     Analyze Dutch text and break it down into grammatical components.
     
     Args:
         request: TextAnalysisRequest containing the Dutch text to analyze
+        http_request: Incoming request, watched for client disconnects
         
     Returns:
         TextAnalysisResponse with sentences and their grammatical components
         
     Raises:
         ValidationError: If text is empty or invalid
+        OverloadedError: If the server is at capacity (503/429 with Retry-After)
         ProcessingError: If analysis fails
     """
     try:
         if not request.text or not request.text.strip():
             raise ValidationError("Text cannot be empty")
         
-        logger.info(f"Analyzing text: {request.text[:100]}...")
+        logger.info("Analyzing text: %s...", request.text[:100])
         
-        analysis = await SentenceAnalyzerService.analyze_text(request.text)
+        # Whole-text analysis yields to single-sentence requests at the upstream scheduler
+        start_request(http_request, Priority.BULK)
+        analysis = await run_request(http_request, lambda: SentenceAnalyzerService.analyze_text(request.text))
         
-        logger.info(f"Analysis complete: {len(analysis.sentences)} sentences found")
+        logger.info("Analysis complete: %s sentences found", len(analysis.sentences))
         
-        return analysis
+        # Already validated by the service layer; serialize once instead of re-running response_model
+        return FastJSONResponse(analysis)
         
-    except ValidationError:
+    except (ValidationError, OverloadedError, ClientClosedRequestError, DeadlineExceededError):
         raise
     except Exception as e:
-        logger.error(f"Error analyzing text: {str(e)}")
+        logger.error("Error analyzing text: %s", e)
         raise ProcessingError(f"Failed to analyze text: {str(e)}")
 
+@router.post("/analyze/stream")
+async def analyze_text_stream(request: TextAnalysisRequest, http_request: Request):
+    """
+    Analyze Dutch text and stream each sentence's analysis as soon as it completes.
+    
+    The response is newline-delimited JSON (application/x-ndjson). The first line
+    is a "start" frame listing the sentences, then one "sentence" frame per sentence
+    in completion order (each carrying its index), and finally a "summary" frame.
+    Time to first result is roughly one LLM call, regardless of text length.
+    Texts longer than INTERACTIVE_MAX_SENTENCES run in the bulk lane, like
+    /api/analyze, so they do not hold up single-sentence requests.
+    
+    Args:
+        request: TextAnalysisRequest containing the Dutch text to analyze
+        http_request: Incoming request; the stream stops when the client disconnects
+        
+    Returns:
+        StreamingResponse of NDJSON frames
+        
+    Raises:
+        ValidationError: If text is empty or invalid
+        OverloadedError: If the server is at capacity (503/429 with Retry-After)
+        ProcessingError: If the LLM backend is not configured
+    """
+    if not request.text or not request.text.strip():
+        raise ValidationError("Text cannot be empty")
+    
+    OpenRouterService.ensure_configured()
+    sentences = SentenceAnalyzerService.split_text(request.text)
+    start_request(http_request, Priority.INTERACTIVE if len(sentences) <= INTERACTIVE_MAX_SENTENCES else Priority.BULK)
+    release = await cancel_on_disconnect(http_request, admit(http_request))
+    logger.info("[Stream] Streaming analysis of %s sentences", len(sentences))
+    
+    async def ndjson_frames():
+        async for frame in SentenceAnalyzerService.stream_text_analysis(sentences):
+            yield encode_json(frame) + b"\n"
+    
+    return AdmittedStreamingResponse(
+        ndjson_frames(),
+        release,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/analyze/incremental", response_model=IncrementalAnalysisResponse)
+async def analyze_text_incremental(request: IncrementalAnalysisRequest, http_request: Request):
+    """
+    Re-analyze edited text, sending only new or changed sentences upstream.
+    
+    Meant for edit-as-you-type clients. The client sends the full new text
+    and the hashes of the sentences it already shows, as returned in earlier
+    responses, and gets back one change per sentence of the new text:
+    - "keep" with the old index
+    - "replace" or "insert" with a fresh analysis
+    Each change carries the sentence's offsets in the text. Client sentences
+    that no longer exist are listed in `deleted`.
+    
+    Args:
+        request: IncrementalAnalysisRequest with the new text and known sentence hashes
+        http_request: Incoming request, watched for client disconnects
+        
+    Returns:
+        IncrementalAnalysisResponse describing the sentence-level diff
+        
+    Raises:
+        OverloadedError: If the server is at capacity (503/429 with Retry-After)
+        ProcessingError: If the LLM backend is not configured
+    """
+    OpenRouterService.ensure_configured()
+    start_request(http_request, Priority.INTERACTIVE)
+    result = await run_request(
+        http_request, lambda: SentenceAnalyzerService.analyze_incremental(request.text, request.known_hashes)
+    )
+    logger.info("[Incremental] %s sentences, %s analyzed, %s deleted",
+                result.summary["total_sentences"], result.summary["analyzed_sentences"], len(result.deleted))
+    return FastJSONResponse(result)
+
 @router.post("/analyze-sentence", response_model=SentenceAnalysis)
-async def analyze_sentence(request: AnalyzeSentenceRequest):
+async def analyze_sentence(request: AnalyzeSentenceRequest, http_request: Request):
     """
     Analyze a single sentence for grammatical components.
     
@@ -67,12 +168,13 @@ async def analyze_sentence(request: AnalyzeSentenceRequest):
     
     Args:
         request: AnalyzeSentenceRequest containing a single sentence to analyze
+        http_request: Incoming request, watched for client disconnects
         
     Returns:
         SentenceAnalysis with sentence translation and grammatical components
         
     Raises:
-        HTTPException: If sentence is empty or analysis fails
+        HTTPException: If sentence is empty, the server is at capacity or analysis fails
     """
     try:
         sentence = request.sentence.strip()
@@ -80,20 +182,225 @@ async def analyze_sentence(request: AnalyzeSentenceRequest):
         if not sentence:
             raise HTTPException(status_code=400, detail="Sentence cannot be empty")
         
-        logger.info(f"[Parallel] Analyzing sentence: {sentence[:50]}...")
+        logger.info("[Parallel] Analyzing sentence: %s...", sentence[:50])
         
-        # Use service to analyze single sentence
-        result = await SentenceAnalyzerService.analyze_single_sentence(sentence)
+        start_request(http_request, Priority.INTERACTIVE)
+        # Use service to analyze single sentence; abandoned if the client goes away
+        result = await run_request(http_request, lambda: SentenceAnalyzerService.analyze_single_sentence(sentence))
         
-        logger.info(f"[Parallel] Analysis complete for: {sentence[:50]}...")
+        logger.info("[Parallel] Analysis complete for: %s...", sentence[:50])
         
-        return result
+        return FastJSONResponse(result)
         
     except ProcessingError as e:
-        logger.error(f"[Parallel] Processing error: {str(e)}")
+        logger.error("[Parallel] Processing error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"[Parallel] Unexpected error: {str(e)}", exc_info=True)
+        logger.error("[Parallel] Unexpected error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/stats")
+async def get_stats():
+    """
+    Report runtime statistics for the analysis pipeline.
+    
+    Returns:
+        Dictionary with cache counters, coalesced-call counters, upstream
+        connection pool state, scheduler queues, admission control, model
+        routing, background jobs and the local lexicon
+    """
+    client = OpenRouterService.http_client
+    return {
+        "prompt_version": OpenRouterService.prompt_version(),
+        "cache": analysis_cache.stats() if analysis_cache is not None else None,
+        "single_flight": sentence_flights.stats(),
+        "http_pool": pool_stats(client) if client is not None else None,
+        "scheduler": upstream_scheduler.stats(),
+        "admission": admission.stats() if admission is not None else None,
+        "models": model_router.stats(),
+        "jobs": job_manager.stats(),
+        "lexicon": sentence_lexicon.stats() if sentence_lexicon is not None else None,
+    }
+
+@router.post("/cache/invalidate")
+async def invalidate_cache(http_request: Request, prompt_version: Optional[str] = None):
+    """
+    Drop cached sentence analyses.
+    
+    Flushing the cache makes every sentence cost an upstream call again, so
+    the request must carry the ADMIN_TOKEN in X-Admin-Token and must not come
+    from a browser page outside the allowed origins. Without ADMIN_TOKEN set
+    the endpoint is disabled.
+    
+    Args:
+        http_request: Incoming request, checked for the admin token and Origin
+        prompt_version: Only drop entries produced by this prompt version (all entries if omitted)
+        
+    Returns:
+        Number of entries removed
+        
+    Raises:
+        ForbiddenError: If the token is missing or wrong, or the origin is not allowed
+    """
+    if not origin_allowed(http_request):
+        raise ForbiddenError("Origin not allowed")
+    if not admin_allowed(http_request):
+        logger.warning("[Cache] Refused invalidation without a valid admin token")
+        raise ForbiddenError("A valid X-Admin-Token is required")
+    if analysis_cache is None:
+        return {"invalidated": 0}
+    removed = await analysis_cache.invalidate(prompt_version)
+    return {"invalidated": removed}
+
+@router.post("/analyze-sentence/stream")
+async def analyze_sentence_stream(request: AnalyzeSentenceRequest, http_request: Request):
+    """
+    Analyze a single sentence, streaming each component as soon as the LLM produces it.
+    
+    The upstream completion is requested with stream=true and parsed incrementally,
+    so the first words are annotated long before the full completion arrives. The
+    response is newline-delimited JSON: "translation" and "component" frames as
+    they become available, then a "done" frame with the complete SentenceAnalysis
+    (or an "error" frame).
+    
+    Args:
+        request: AnalyzeSentenceRequest containing a single sentence to analyze
+        http_request: Incoming request; the stream stops when the client disconnects
+        
+    Returns:
+        StreamingResponse of NDJSON frames
+        
+    Raises:
+        HTTPException: If sentence is empty, the server is at capacity or the LLM backend is not configured
+    """
+    sentence = request.sentence.strip()
+    if not sentence:
+        raise HTTPException(status_code=400, detail="Sentence cannot be empty")
+    
+    OpenRouterService.ensure_configured()
+    start_request(http_request, Priority.INTERACTIVE)
+    release = await cancel_on_disconnect(http_request, admit(http_request))
+    logger.info("[Stream] Streaming analysis of sentence: %s...", sentence[:50])
+    
+    async def ndjson_frames():
+        async for frame in SentenceAnalyzerService.stream_sentence_analysis(sentence):
+            yield encode_json(frame) + b"\n"
+    
+    return AdmittedStreamingResponse(
+        ndjson_frames(),
+        release,
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws")
+async def analysis_session(websocket: WebSocket):
+    """
+    Analyze many sentences over one WebSocket connection.
+    
+    The client sends "analyze" messages with an ID per sentence and may send
+    "cancel" messages for IDs it no longer needs; results come back under
+    their ID in completion order. This avoids a separate HTTP request, with
+    its headers and CORS checks, per sentence and the browser's cap on
+    connections per origin. See AnalysisSession for the message format.
+    
+    Args:
+        websocket: Incoming WebSocket connection
+    """
+    await AnalysisSession(websocket).run()
+
+async def _read_body(request: Request, limit: int) -> bytes:
+    """Read a request body, giving up as soon as it is known to exceed limit bytes"""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise ValidationError(f"Text exceeds the {limit} byte limit")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise ValidationError(f"Text exceeds the {limit} byte limit")
+    return bytes(body)
+
+@router.post("/jobs", response_model=JobStatus, status_code=202)
+async def create_job(request: Request, name: Optional[str] = None):
+    """
+    Queue a large text (a chapter, a whole document) for background analysis.
+    
+    The body is either JSON ({"text", "name"}) or the raw text of a file, e.g.
+    `curl --data-binary @chapter.txt -H "Content-Type: text/plain" /api/jobs?name=chapter.txt`.
+    The job is analyzed by a background worker; poll GET /api/jobs/{job_id}
+    for progress and page through GET /api/jobs/{job_id}/results.
+    
+    A raw text/plain POST needs no CORS preflight, so uploads from browser
+    pages outside the allowed origins are refused here.
+    
+    Args:
+        request: Incoming request carrying the text
+        name: Optional label for a raw-text upload
+        
+    Returns:
+        JobStatus of the queued job
+        
+    Raises:
+        ForbiddenError: If the request comes from a page outside the allowed origins
+        ValidationError: If the text is empty, too large or not UTF-8
+        ProcessingError: If the LLM backend is not configured
+    """
+    if not origin_allowed(request):
+        raise ForbiddenError("Origin not allowed")
+    # Stop reading once the limit is passed instead of buffering the whole upload
+    body = await _read_body(request, JOBS_MAX_TEXT_BYTES)
+    
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = JobCreateRequest.model_validate_json(body)
+        except ValueError:
+            raise ValidationError("Expected a JSON body with a 'text' field")
+        text, name = payload.text, payload.name or name
+    else:
+        try:
+            text = body.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise ValidationError("Uploaded text must be UTF-8 encoded")
+    
+    if not text.strip():
+        raise ValidationError("Text cannot be empty")
+    
+    OpenRouterService.ensure_configured()
+    return FastJSONResponse(await job_manager.submit(text, name), status_code=202)
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Report the progress of a background analysis job.
+    
+    Args:
+        job_id: Job identifier returned by POST /api/jobs
+        
+    Returns:
+        JobStatus with processed and failed sentence counts
+        
+    Raises:
+        NotFoundError: If the job does not exist
+    """
+    return FastJSONResponse(await job_manager.status(job_id))
+
+@router.get("/jobs/{job_id}/results", response_model=JobResultsPage)
+async def get_job_results(job_id: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """
+    Page through the sentences a job has analyzed so far, in sentence order.
+    
+    Args:
+        job_id: Job identifier returned by POST /api/jobs
+        offset: Index of the first sentence to return
+        limit: Maximum number of sentences to return
+        
+    Returns:
+        JobResultsPage with the requested results
+        
+    Raises:
+        NotFoundError: If the job does not exist
+    """
+    return FastJSONResponse(await job_manager.results(job_id, offset, limit))
@@ -0,0 +1,377 @@
+"""Rate-limit-aware scheduler for upstream LLM calls"""
+import asyncio
+import contextvars
+import email.utils
+import enum
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+import httpx
+from app.exceptions import UpstreamError, DeadlineExceededError
+from app.metrics import SCHEDULER_WAIT, UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Token bucket sized to the provider quota: sustained requests/second and burst size
+UPSTREAM_RATE_PER_SECOND = float(os.getenv("UPSTREAM_RATE_PER_SECOND", "20"))
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "40"))
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", "0.5"))
+UPSTREAM_BACKOFF_MAX_SECONDS = float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", "20"))
+# Default time budget for one analysis, when the request does not set its own
+UPSTREAM_DEADLINE_INTERACTIVE_SECONDS = float(os.getenv("UPSTREAM_DEADLINE_INTERACTIVE_SECONDS", "90"))
+UPSTREAM_DEADLINE_BULK_SECONDS = float(os.getenv("UPSTREAM_DEADLINE_BULK_SECONDS", "600"))
+# Streamed texts with more sentences than this use the bulk lane, so one long document
+# cannot queue hundreds of calls ahead of single-sentence requests
+INTERACTIVE_MAX_SENTENCES = int(os.getenv("INTERACTIVE_MAX_SENTENCES", "8"))
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class Priority(enum.IntEnum):
+    """Scheduler lanes; lower values are served first"""
+    INTERACTIVE = 0
+    BULK = 1
+
+
+# Lane and absolute deadline (event loop time) of the work being done in this context
+upstream_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "upstream_priority", default=Priority.INTERACTIVE
+)
+upstream_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "upstream_deadline", default=None
+)
+
+
+
+class SharedLane:
+    """
+    Lane of an upstream call made on behalf of several requests (see SingleFlight).
+
+    The call starts in the lane of the request that made it and moves up when
+    a more urgent request starts waiting for it, including rate-limit waits it
+    already has queued.
+    """
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self.queued: set[asyncio.Future] = set()
+
+    def raise_to(self, priority: Priority) -> None:
+        """Move the call to a more urgent lane (no-op if it is already there)"""
+        if priority >= self.priority:
+            return
+        self.priority = priority
+        for future in self.queued:
+            upstream_scheduler.requeue(future, priority)
+
+
+# Set inside calls shared by several requests; overrides upstream_priority
+upstream_shared_lane: contextvars.ContextVar[Optional[SharedLane]] = contextvars.ContextVar(
+    "upstream_shared_lane", default=None
+)
+
+
+def current_priority() -> Priority:
+    """Lane for upstream calls made in this context"""
+    lane = upstream_shared_lane.get()
+    return upstream_priority.get() if lane is None else lane.priority
+
+
+def enter_shared_lane(lane: SharedLane) -> None:
+    """
+    Prepare the current context for a call shared by several requests.
+
+    Call inside a fresh context copy. The lane replaces the request's own,
+    and the deadline is the widest any request can have: each waiter applies
+    its own deadline while waiting, so the call is not cut short by the
+    deadline of whichever request happened to start it.
+
+    Args:
+        lane: Lane shared with the requests waiting for the call
+    """
+    upstream_shared_lane.set(lane)
+    upstream_priority.set(lane.priority)
+    budget = max(UPSTREAM_DEADLINE_INTERACTIVE_SECONDS, UPSTREAM_DEADLINE_BULK_SECONDS)
+    upstream_deadline.set(asyncio.get_running_loop().time() + budget)
+
+
+def set_request_priority(priority: Priority, timeout: Optional[float] = None) -> None:
+    """
+    Put the current request in a scheduler lane and start its deadline clock.
+
+    Call at the start of a request handler; tasks spawned afterwards inherit
+    both context variables.
+
+    Args:
+        priority: Lane for all upstream calls made on behalf of this request
+        timeout: Seconds the client is willing to wait (e.g. its own request
+            timeout); shortens the lane's default budget
+    """
+    budget = UPSTREAM_DEADLINE_INTERACTIVE_SECONDS if priority == Priority.INTERACTIVE else UPSTREAM_DEADLINE_BULK_SECONDS
+    if timeout is not None:
+        budget = min(budget, timeout)
+    upstream_priority.set(priority)
+    upstream_deadline.set(asyncio.get_running_loop().time() + budget)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header given either in seconds or as an HTTP date.
+
+    Args:
+        value: Raw header value
+
+    Returns:
+        Delay in seconds, or None if absent or unparseable
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if one is available now)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self.tokens -= 1
+
+
+class UpstreamScheduler:
+    """
+    Central gate for every upstream call.
+
+    Calls wait for a token from a bucket sized to the provider quota. Waiters
+    are served strictly by lane (interactive before bulk) and FIFO within a
+    lane. Retryable failures (429, 5xx, transport errors) are retried with
+    jittered exponential backoff, honoring Retry-After; a 429 also pauses
+    dispatch for every lane so a burst does not turn into a retry storm.
+    Nothing is retried past the caller's deadline.
+    """
+
+    def __init__(self, rate: float, burst: int, max_retries: int, backoff_base: float, backoff_max: float):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused_until = 0.0
+        self.dispatched = {lane.name.lower(): 0 for lane in Priority}
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    def _deadline(self, priority: Priority) -> float:
+        deadline = upstream_deadline.get()
+        if deadline is not None:
+            return deadline
+        budget = UPSTREAM_DEADLINE_INTERACTIVE_SECONDS if priority == Priority.INTERACTIVE else UPSTREAM_DEADLINE_BULK_SECONDS
+        return asyncio.get_running_loop().time() + budget
+
+    async def acquire(self, priority: Priority, deadline: float) -> None:
+        """
+        Wait for a rate-limit token in the given lane.
+
+        Args:
+            priority: Lane to wait in
+            deadline: Event loop time after which waiting is abandoned
+
+        Raises:
+            DeadlineExceededError: If no token was granted before the deadline
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        lane = upstream_shared_lane.get()
+        if lane is not None:
+            lane.queued.add(future)
+        started = time.perf_counter()
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise DeadlineExceededError("Deadline exceeded while waiting for upstream capacity")
+        finally:
+            if lane is not None:
+                lane.queued.discard(future)
+            # A cancelled or timed-out waiter is skipped by _dispatch; make sure the next one is served
+            if not future.done() or future.cancelled():
+                self._dispatch()
+        if lane is not None:
+            # Count a promoted wait in the lane that served it
+            priority = min(priority, lane.priority)
+        SCHEDULER_WAIT.observe(time.perf_counter() - started, lane=priority.name.lower())
+        self.dispatched[priority.name.lower()] += 1
+
+    def requeue(self, future: asyncio.Future, priority: Priority) -> None:
+        """
+        Queue a waiting acquire() again in a more urgent lane.
+
+        The old heap entry stays behind and is skipped once the future is done.
+        """
+        if future.done():
+            return
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            _, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            wait = max(self.bucket.wait_time(now), self._paused_until - now)
+            if wait > 0:
+                self._schedule(loop, wait)
+                return
+            self.bucket.take(now)
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop, delay: float) -> None:
+        when = loop.time() + delay
+        if self._timer is not None and not self._timer.cancelled() and self._timer.when() <= when:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Stop dispatching to every lane for the given time (e.g. after a 429)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def admit(self, priority: Optional[Priority] = None) -> None:
+        """
+        Wait for a rate-limit token without the retry handling of run().
+
+        Used for streaming calls, which cannot be retried transparently once
+        output has been forwarded.
+
+        Args:
+            priority: Lane to use (defaults to the lane of the current context)
+        """
+        priority = current_priority() if priority is None else priority
+        await self.acquire(priority, self._deadline(priority))
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        # Full jitter: spread retries uniformly over the exponential window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: Optional[Priority] = None) -> T:
+        """
+        Run an upstream call under the rate limit, retrying retryable failures.
+
+        Args:
+            call: Zero-argument coroutine factory performing one upstream attempt
+            priority: Lane to use (defaults to the lane of the current context)
+
+        Returns:
+            Result of the first successful attempt
+
+        Raises:
+            UpstreamError: If the call failed with a non-retryable status or retries ran out
+            DeadlineExceededError: If the deadline passed before the call succeeded
+        """
+        deadline = self._deadline(current_priority() if priority is None else priority)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            # Re-read per attempt: a shared call may have moved to a more urgent lane
+            await self.acquire(current_priority() if priority is None else priority, deadline)
+            remaining = deadline - loop.time()
+            try:
+                return await asyncio.wait_for(call(), timeout=max(0.0, remaining))
+            except asyncio.TimeoutError:
+                self.deadline_exceeded += 1
+                raise DeadlineExceededError("Deadline exceeded while waiting for the upstream response")
+            except UpstreamError as e:
+                if e.upstream_status not in RETRYABLE_STATUSES:
+                    raise
+                error, reason, retry_after = e, f"status_{e.upstream_status}", e.retry_after
+            except httpx.TransportError as e:
+                error, reason, retry_after = e, "transport", None
+
+            delay = self._backoff(attempt, retry_after)
+            if reason == "status_429":
+                self.pause(delay)
+            if attempt >= self.max_retries or loop.time() + delay >= deadline:
+                raise error
+            attempt += 1
+            self.retries += 1
+            UPSTREAM_RETRIES.inc(reason=reason)
+            logger.warning("[Scheduler] Upstream %s, retry %s/%s in %.2fs", reason, attempt, self.max_retries, delay)
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        """Return queue depth per lane and dispatch/retry counters"""
+        queued = {lane.name.lower(): 0 for lane in Priority}
+        counted = set()
+        # Sorted so a requeued waiter counts in its most urgent lane only
+        for priority, _, future in sorted(self._waiters, key=lambda entry: entry[:2]):
+            if not future.done() and future not in counted:
+                counted.add(future)
+                queued[Priority(priority).name.lower()] += 1
+        return {
+            "rate_per_second": self.bucket.rate,
+            "burst": self.bucket.capacity,
+            "queued": queued,
+            "dispatched": dict(self.dispatched),
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+upstream_scheduler = UpstreamScheduler(
+    rate=UPSTREAM_RATE_PER_SECOND,
+    burst=UPSTREAM_BURST,
+    max_retries=UPSTREAM_MAX_RETRIES,
+    backoff_base=UPSTREAM_BACKOFF_BASE_SECONDS,
+    backoff_max=UPSTREAM_BACKOFF_MAX_SECONDS,
+)
@@ -0,0 +1,184 @@
+"""Dutch sentence segmentation with character offsets"""
+import re
+from typing import NamedTuple
+
+# Abbreviations (lowercase, without the final period) that never end a sentence:
+# titles, "for example"-style connectives and units
+ABBREVIATIONS = frozenset({
+    "dhr", "mevr", "mw", "mr", "dr", "drs", "ir", "ing", "prof", "st", "sr", "jr",
+    "bijv", "bv", "o.a", "d.w.z", "m.a.w", "i.p.v", "m.b.t", "t.a.v", "t.o.v", "m.u.v",
+    "o.b.v", "i.v.m", "n.a.v", "vgl", "zgn", "z.g", "resp", "evt", "ong", "vs",
+    "nr", "blz", "hfst", "fig", "afd", "mln", "mrd",
+})
+
+# Abbreviations that are also ordinary words ("Ik tel.", "Dat is art."); they only
+# continue the sentence before a number ("ca. 20", "art. 5", "tel. 020")
+NUMBER_ABBREVIATIONS = frozenset({"ca", "art", "tel", "gem"})
+
+# Month abbreviations that are also names or words ("Jan.", "Dec."); they only count
+# as abbreviations right after a day number ("3 jan.")
+MONTH_ABBREVIATIONS = frozenset({
+    "jan", "feb", "mrt", "apr", "jun", "jul", "aug", "sep", "sept", "okt", "nov", "dec",
+})
+
+# Abbreviations that often close a sentence; they end one when the next word is capitalized
+FINAL_ABBREVIATIONS = frozenset({
+    "enz", "etc", "e.d", "e.a", "e.v", "a.u.b", "z.s.m", "jl", "v.chr", "n.chr", "incl", "excl",
+    "max", "min",
+})
+
+_CLOSERS = "\"'”’»)]"
+_OPENERS = "\"'“‘„«(["
+
+# A run of terminators plus closing quotes/brackets, followed by whitespace or the end;
+# a blank line; or a single line break
+_CANDIDATE_RE = re.compile(
+    rf"(?P<term>[.!?…]+)(?P<close>[{re.escape(_CLOSERS)}]*)(?=\s|$)"
+    r"|(?P<para>\n[ \t\r\f\v]*\n)"
+    r"|(?P<line>\n)"
+)
+# First character of the next word, after whitespace and opening quotes
+_NEXT_RE = re.compile(rf"\s*[{re.escape(_OPENERS)}]*(\S?)")
+# "'s avonds", "'t huis", "'k weet": clitics that start a sentence in lowercase
+_CLITIC_RE = re.compile(r"\s*'[stk]\b")
+# Word (letters and internal periods) right before a period
+_TOKEN_BEFORE_RE = re.compile(r"([^\W\d_](?:[\w.]*[^\W_])?)$")
+_INITIALS_RE = re.compile(r"(?:[A-Z]\.)*[A-Z]")
+# Day number right before a month abbreviation
+_DAY_BEFORE_RE = re.compile(r"\d[ \t]*$")
+_WORD_RE = re.compile(r"[^\W\d_]")
+_WHITESPACE_RE = re.compile(r"\s+")
+_CONTINUATION_CHARS = ",;-–("
+
+
+class Segment(NamedTuple):
+    """A sentence and its position in the original text (text == original[start:end])"""
+    text: str
+    start: int
+    end: int
+
+
+def _next_char(text: str, pos: int) -> str:
+    return _NEXT_RE.match(text, pos).group(1)
+
+
+def _starts_sentence(text: str, pos: int) -> bool:
+    """Whether the word at pos could start a new sentence"""
+    nxt = _next_char(text, pos)
+    if not nxt:
+        return True
+    if nxt.islower():
+        return bool(_CLITIC_RE.match(text, pos))
+    return True
+
+
+def _is_period_boundary(text: str, start: int, dot: int, end: int) -> bool:
+    """Decide whether a single period at text[dot] ends a sentence"""
+    token_match = _TOKEN_BEFORE_RE.search(text, max(start, dot - 24), dot)
+    if token_match is None:
+        return True
+    token = token_match.group(1)
+    lowered = token.lower()
+    if lowered in ABBREVIATIONS:
+        return False
+    if lowered in NUMBER_ABBREVIATIONS:
+        return not _next_char(text, end).isdigit()
+    if lowered in MONTH_ABBREVIATIONS:
+        token_start = token_match.start(1)
+        return _DAY_BEFORE_RE.search(text, max(start, token_start - 4), token_start) is None
+    if _INITIALS_RE.fullmatch(token):
+        # "J. de Vries", "A.B. Jansen"
+        return False
+    if lowered in FINAL_ABBREVIATIONS:
+        nxt = _next_char(text, end)
+        return not nxt or nxt.isupper()
+    return True
+
+
+def _is_boundary(text: str, start: int, match: re.Match) -> bool:
+    if match.group("para") is not None:
+        return True
+    if match.group("line") is not None:
+        # A single line break ends a sentence unless the text is hard-wrapped mid-sentence
+        before = text[start:match.start()].rstrip()
+        if before and before[-1] in _CONTINUATION_CHARS:
+            return False
+        nxt = _next_char(text, match.end())
+        return not nxt.islower()
+
+    end = match.end()
+    if not _starts_sentence(text, end):
+        # '"Kom je?" vroeg hij.' and "Ik dacht... misschien niet."
+        return False
+    term = match.group("term")
+    if term == ".":
+        return _is_period_boundary(text, start, match.start("term"), end)
+    if term.startswith("..") or term.startswith("…"):
+        # An ellipsis only ends a sentence before a capitalized word or at the end
+        nxt = _next_char(text, end)
+        return not nxt or nxt.isupper() or not nxt.isalpha()
+    return True
+
+
+def segment(text: str) -> list[Segment]:
+    """
+    Split Dutch text into sentences with their character offsets.
+
+    Sentences end at ".", "!", "?" and ellipses (keeping trailing closing
+    quotes), at blank lines, and at single line breaks unless the next line
+    continues in lowercase. A period does not end a sentence after a known
+    abbreviation ("bijv.", "d.w.z.", "ca. 20", "3 jan."), after initials
+    ("J. de Vries"), inside a number ("3.5") or before a lowercase word.
+    Fragments without a single letter ("!!!", "123") are dropped.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        List of Segments in text order; whitespace around sentences is excluded
+    """
+    segments = []
+    start = 0
+    for match in _CANDIDATE_RE.finditer(text):
+        if not _is_boundary(text, start, match):
+            continue
+        end = match.end() if match.group("term") is not None else match.start()
+        _append(segments, text, start, end)
+        start = match.end()
+    _append(segments, text, start, len(text))
+    return segments
+
+
+def _append(segments: list[Segment], text: str, start: int, end: int) -> None:
+    chunk = text[start:end]
+    stripped = chunk.strip()
+    if not stripped or not _WORD_RE.search(stripped):
+        return
+    offset = start + (len(chunk) - len(chunk.lstrip()))
+    segments.append(Segment(stripped, offset, offset + len(stripped)))
+
+
+def collapse_whitespace(sentence: str) -> str:
+    """Replace line breaks and runs of whitespace inside a sentence with single spaces"""
+    return _WHITESPACE_RE.sub(" ", sentence)
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Split text into sentences ready for analysis.
+
+    Line breaks and runs of whitespace inside a sentence are collapsed into
+    single spaces; use segment() to get the exact spans.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        List of sentences
+    """
+    return [collapse_whitespace(s.text) for s in segment(text)]
+
+
+def has_word(sentence: str) -> bool:
+    """Whether a sentence contains at least one letter"""
+    return _WORD_RE.search(sentence) is not None
@@ -1,7 +1,13 @@
 """Text analysis service using OpenRouter LLM"""
-from app.models import TextAnalysisResponse, SentenceAnalysis
+from app.models import (
+    TextAnalysisResponse, SentenceAnalysis, IncrementalAnalysisResponse, SentenceChange,
+)
 from app.llm_service import OpenRouterService
-from typing import List
+from app.exceptions import ProcessingError
+from app.cache import sentence_hash
+from typing import AsyncIterator, List, Optional
+import difflib
+import time
 
 class SentenceAnalyzerService:
     """Service for analyzing Dutch sentences using LLM"""
@@ -10,10 +16,13 @@ class SentenceAnalyzerService:
     async def analyze_text(text: str) -> TextAnalysisResponse:
         """
         Analyze Dutch text and break it down into sentences with grammatical components.
-        
+
+        Sentences are analyzed concurrently; a sentence that fails is returned
+        with its `error` field set rather than failing the whole response.
+
         Args:
             text: Dutch text to analyze
-            
+
         Returns:
             TextAnalysisResponse with sentences and their components
         """
@@ -25,7 +34,12 @@ class SentenceAnalyzerService:
         
         return TextAnalysisResponse(
             original_text=text,
-            sentences=analyzed_sentences
+            sentences=analyzed_sentences,
+            summary={
+                "total_sentences": len(analyzed_sentences),
+                "failed_sentences": sum(1 for s in analyzed_sentences if s.error),
+                "partial_sentences": sum(1 for s in analyzed_sentences if s.partial),
+            }
         )
     
     @staticmethod
@@ -47,7 +61,6 @@ class SentenceAnalyzerService:
             ProcessingError: If the sentence cannot be analyzed
         """
         if not sentence or not sentence.strip():
-            from app.exceptions import ProcessingError
             raise ProcessingError("Empty sentence")
         
         # Use OpenRouter to analyze the single sentence
@@ -58,6 +71,145 @@ class SentenceAnalyzerService:
         if analyzed:
             return analyzed[0]
         
-        from app.exceptions import ProcessingError
         raise ProcessingError("Failed to analyze sentence")
-
+    
+    @staticmethod
+    async def analyze_incremental(text: str, known_hashes: List[str]) -> IncrementalAnalysisResponse:
+        """
+        Re-analyze edited text, analyzing only sentences the client does not have yet.
+        
+        The new text is segmented and each sentence hashed (see
+        app.cache.sentence_hash). The new hashes are aligned with the client's
+        hashes using difflib, and each new sentence becomes one change:
+        - "keep": the client already has this sentence at old_index. This
+          includes sentences that only moved.
+        - "replace": the sentence stands where the client had old_index, and
+          its text changed.
+        - "insert": the sentence has no counterpart.
+        Only "replace" and "insert" sentences are analyzed, so editing one word
+        of a long paragraph costs one analysis.
+        
+        Args:
+            text: Full new text
+            known_hashes: Hashes of the client's current sentences, in order
+            
+        Returns:
+            IncrementalAnalysisResponse with one change per new sentence and the
+            client indices that were dropped
+        """
+        started = time.perf_counter()
+        segments = OpenRouterService._segment_sentences(text)
+        hashes = [sentence_hash(s.text) for s in segments]
+        known_at: dict[str, int] = {}
+        for index, value in enumerate(known_hashes):
+            known_at.setdefault(value, index)
+        
+        # (op, old_index) per new sentence
+        plan: list[tuple[str, Optional[int]]] = []
+        matcher = difflib.SequenceMatcher(None, known_hashes, hashes, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            for offset, j in enumerate(range(j1, j2)):
+                if tag == "equal":
+                    plan.append(("keep", i1 + offset))
+                elif hashes[j] in known_at:
+                    # Moved rather than edited: the client can reuse its analysis
+                    plan.append(("keep", known_at[hashes[j]]))
+                elif tag == "replace" and i1 + offset < i2:
+                    plan.append(("replace", i1 + offset))
+                else:
+                    plan.append(("insert", None))
+        
+        to_analyze = [j for j, (op, _) in enumerate(plan) if op != "keep"]
+        analyses = await OpenRouterService.analyze_sentences([segments[j].text for j in to_analyze])
+        analysis_of = dict(zip(to_analyze, analyses))
+        
+        changes = [
+            SentenceChange(
+                op=op,
+                index=j,
+                old_index=old_index,
+                hash=hashes[j],
+                start=segments[j].start,
+                end=segments[j].end,
+                analysis=analysis_of.get(j),
+            )
+            for j, (op, old_index) in enumerate(plan)
+        ]
+        referenced = {old_index for _, old_index in plan if old_index is not None}
+        deleted = [i for i in range(len(known_hashes)) if i not in referenced]
+        
+        return IncrementalAnalysisResponse(
+            changes=changes,
+            deleted=deleted,
+            summary={
+                "total_sentences": len(segments),
+                "analyzed_sentences": len(to_analyze),
+                "failed_sentences": sum(1 for a in analyses if a.error),
+                "partial_sentences": sum(1 for a in analyses if a.partial),
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            },
+        )
+    
+    @staticmethod
+    def split_text(text: str) -> List[str]:
+        """
+        Split text into the sentences that will be analyzed.
+        
+        Args:
+            text: Dutch text to split
+            
+        Returns:
+            List of valid sentences
+        """
+        return OpenRouterService._split_sentences(text)
+    
+    @staticmethod
+    async def stream_text_analysis(sentences: List[str]) -> AsyncIterator[dict]:
+        """
+        Analyze sentences concurrently and yield progress frames as results complete.
+        
+        Frames are plain dicts, in this order:
+        - {"type": "start", "total_sentences", "sentences"} once, before any analysis
+        - {"type": "sentence", "index", "analysis"} per sentence, in completion order
+        - {"type": "summary", "total_sentences", "failed_sentences", "elapsed_ms"} at the end
+        
+        Args:
+            sentences: Sentences to analyze (see split_text)
+            
+        Yields:
+            Frame dictionaries ready to be JSON-encoded
+        """
+        started = time.perf_counter()
+        yield {"type": "start", "total_sentences": len(sentences), "sentences": sentences}
+        
+        failed = 0
+        async for index, analysis in OpenRouterService.iter_analyses(sentences):
+            if analysis.error:
+                failed += 1
+            yield {"type": "sentence", "index": index, "analysis": analysis.model_dump()}
+        
+        yield {
+            "type": "summary",
+            "total_sentences": len(sentences),
+            "failed_sentences": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    
+    @staticmethod
+    async def stream_sentence_analysis(sentence: str) -> AsyncIterator[dict]:
+        """
+        Analyze a single sentence, yielding components as the LLM streams them.
+        
+        Args:
+            sentence: A single sentence to analyze
+            
+        Yields:
+            Frame dictionaries (see OpenRouterService.stream_sentence_analysis),
+            or a single {"type": "error", "detail"} frame if the analysis fails
+        """
+        try:
+            async for frame in OpenRouterService.stream_sentence_analysis(sentence):
+                yield frame
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e) or type(e).__name__
+            yield {"type": "error", "detail": detail}
@@ -0,0 +1,106 @@
+"""Single-flight coalescing of identical concurrent upstream calls"""
+import asyncio
+import contextvars
+from typing import Awaitable, Callable, TypeVar
+from app.exceptions import DeadlineExceededError
+from app.scheduler import SharedLane, current_priority, enter_shared_lane, upstream_deadline
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Registry of in-flight calls keyed by content.
+
+    The first caller for a key starts the call; callers arriving while it is
+    still running await the same task instead of starting their own. The
+    shared task is shielded, so one waiter being cancelled does not cancel it
+    for the others; once every waiter has been cancelled (e.g. all their
+    clients disconnected) nobody needs the result and the call itself is
+    cancelled. Exceptions are delivered to every waiter.
+
+    The call does not run under the deadline and lane of the request that
+    started it: it gets the widest deadline, each waiter gives up at its own
+    deadline instead, and the call moves to the most urgent lane among its
+    waiters.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self._lanes: dict[asyncio.Task, SharedLane] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn for key, or join the call already running for key.
+
+        Args:
+            key: Identity of the call (e.g. an analysis cache key)
+            fn: Zero-argument coroutine factory that performs the call
+
+        Returns:
+            Result of the shared call
+
+        Raises:
+            DeadlineExceededError: If this caller's deadline passes before the call finishes
+        """
+        priority = current_priority()
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            lane = SharedLane(priority)
+
+            def start() -> asyncio.Task:
+                enter_shared_lane(lane)
+                return asyncio.create_task(fn())
+
+            # A copy, so the leader's own deadline and lane stay as they are
+            task = contextvars.copy_context().run(start)
+            self._calls[key] = task
+            self._lanes[task] = lane
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+            self._lanes[task].raise_to(priority)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        deadline = upstream_deadline.get()
+        try:
+            if deadline is None:
+                return await asyncio.shield(task)
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                return await asyncio.wait_for(asyncio.shield(task), max(0.0, remaining))
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError("Deadline exceeded while waiting for the upstream response")
+        finally:
+            remaining = self._waiters.get(task, 1) - 1
+            if remaining > 0:
+                self._waiters[task] = remaining
+            else:
+                self._waiters.pop(task, None)
+                if not task.done():
+                    # The last waiter was cancelled; later callers start afresh
+                    self.abandoned += 1
+                    if self._calls.get(key) is task:
+                        del self._calls[key]
+                    task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        self._lanes.pop(task, None)
+        # Mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Return counters for started, coalesced and abandoned calls"""
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
@@ -0,0 +1,140 @@
+"""Read-only, memory-mapped snapshot of sentence analyses built offline (see prewarm.py)"""
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Iterable, Optional
+from app.models import SentenceAnalysis
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DHSNAP01"
+# Magic, length of the JSON metadata that follows
+_HEADER = struct.Struct("<8sI")
+# Leading bytes of the cache key, payload offset, payload length
+_ENTRY = struct.Struct("<16sQI")
+_DIGEST_BYTES = 16
+
+
+def write_snapshot(path: str, entries: Iterable[tuple[str, bytes]], metadata: dict) -> int:
+    """
+    Write analyses to a snapshot file.
+
+    Layout: header, JSON metadata, an index of fixed-size entries sorted by
+    key, then the SentenceAnalysis JSON payloads. The file is written next to
+    its destination and renamed into place, so servers that have the old
+    snapshot mapped keep reading it undisturbed.
+
+    Args:
+        path: Destination file
+        entries: (cache key from make_cache_key, SentenceAnalysis JSON) pairs;
+            a repeated key keeps its last payload
+        metadata: Information stored in the header, e.g. prompt version and model
+
+    Returns:
+        Number of entries written
+    """
+    payloads = {bytes.fromhex(key)[:_DIGEST_BYTES]: payload for key, payload in entries}
+    digests = sorted(payloads)
+    meta = json.dumps({**metadata, "entries": len(digests)}, ensure_ascii=False).encode("utf-8")
+
+    offset = _HEADER.size + len(meta) + _ENTRY.size * len(digests)
+    index = bytearray()
+    for digest in digests:
+        index += _ENTRY.pack(digest, offset, len(payloads[digest]))
+        offset += len(payloads[digest])
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(meta)))
+        f.write(meta)
+        f.write(index)
+        for digest in digests:
+            f.write(payloads[digest])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(digests)
+
+
+class AnalysisSnapshot:
+    """
+    Cache tier serving analyses from a snapshot file mapped into memory.
+
+    Lookups binary-search the sorted index in place, so opening a snapshot
+    costs nothing up front regardless of its size, and worker processes on
+    one host share its pages through the OS page cache. Only the payload of a
+    hit is decoded. Entries never expire; keys include the model and prompt
+    version, so a snapshot from an older prompt simply stops matching.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, meta_length = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an analysis snapshot")
+            self.metadata = json.loads(self._map[_HEADER.size:_HEADER.size + meta_length])
+            self.count = int(self.metadata["entries"])
+            self._index_start = _HEADER.size + meta_length
+            if self._index_start + _ENTRY.size * self.count > len(self._map):
+                raise ValueError(f"{path} is truncated")
+        except (struct.error, ValueError, KeyError):
+            self._map.close()
+            raise
+
+    @classmethod
+    def open(cls, path: str) -> Optional["AnalysisSnapshot"]:
+        """
+        Map a snapshot file if there is one.
+
+        Args:
+            path: Snapshot file written by write_snapshot
+
+        Returns:
+            AnalysisSnapshot, or None if the file is missing or unreadable
+        """
+        if not path or not os.path.isfile(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            logger.warning("[Snapshot] Ignoring %s: %s", path, e)
+            return None
+
+    def get(self, key: str) -> Optional[SentenceAnalysis]:
+        """
+        Look up an analysis.
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            SentenceAnalysis, or None if the snapshot has no entry for the key
+        """
+        digest = bytes.fromhex(key)[:_DIGEST_BYTES]
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = self._index_start + middle * _ENTRY.size
+            candidate = self._map[position:position + _DIGEST_BYTES]
+            if candidate < digest:
+                low = middle + 1
+            elif candidate > digest:
+                high = middle
+            else:
+                _, offset, length = _ENTRY.unpack_from(self._map, position)
+                return SentenceAnalysis.model_validate_json(self._map[offset:offset + length])
+        return None
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,209 @@
+"""WebSocket sessions multiplexing many sentence analyses over one connection"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from app.admission import admission, client_key, origin_allowed
+from app.exceptions import DeadlineExceededError
+from app.metrics import WS_CONNECTIONS, WS_JOBS
+from app.responses import encode_json
+from app.scheduler import Priority, set_request_priority, upstream_deadline
+from app.services import SentenceAnalyzerService
+
+logger = logging.getLogger(__name__)
+
+# Sentences of one socket analyzed at once; later ones wait for a free slot
+WS_MAX_CONCURRENCY = int(os.getenv("WS_MAX_CONCURRENCY", "8"))
+# Jobs one socket may have running or waiting; more are answered with a 429 error frame
+WS_MAX_PENDING = int(os.getenv("WS_MAX_PENDING", "1000"))
+# Longest client message accepted, in characters
+WS_MAX_MESSAGE_CHARS = int(os.getenv("WS_MAX_MESSAGE_CHARS", "16384"))
+
+
+class AnalysisSession:
+    """
+    One WebSocket connection carrying many sentence analyses.
+
+    The client tags each sentence with an ID of its choosing and gets the
+    SentenceAnalysis back under that ID as soon as it is ready, so results
+    arrive in completion order rather than submission order. All messages
+    are JSON text frames.
+
+    Client to server:
+        {"type": "analyze", "id": "s1", "sentence": "...", "timeout": 30}
+            ("timeout" is optional, like the X-Request-Timeout header)
+        {"type": "cancel", "id": "s1"}
+
+    Server to client:
+        {"type": "ready", "max_concurrency": 8, "max_pending": 1000}
+        {"type": "result", "id": "s1", "analysis": {...SentenceAnalysis...}}
+        {"type": "error", "id": "s1", "status": 503, "detail": "...", "retry_after": 2}
+        {"type": "cancelled", "id": "s1"}
+
+    Connections from browser pages outside ALLOWED_ORIGINS are closed with
+    1008 (policy violation) before they are accepted.
+
+    At most WS_MAX_CONCURRENCY jobs of a socket run at once, and each one
+    also takes an admission slot in the interactive lane, so a socket is
+    subject to the same load shedding as separate HTTP requests. A cancelled
+    job, and every job of a socket that closes, stops its upstream call
+    unless another request is still waiting for the same sentence.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.client = client_key(websocket)
+        self.jobs: dict[str, asyncio.Task] = {}
+        self._slots = asyncio.Semaphore(max(1, WS_MAX_CONCURRENCY))
+        self._send_lock = asyncio.Lock()
+
+    async def run(self) -> None:
+        """Serve the connection until the client closes it"""
+        # CORS does not apply to WebSockets; without this any page could spend the upstream quota
+        if not origin_allowed(self.websocket):
+            logger.warning("[WebSocket] Rejected connection from origin %s", self.websocket.headers.get("origin"))
+            await self.websocket.close(code=1008)
+            return
+        await self.websocket.accept()
+        with WS_CONNECTIONS.track():
+            try:
+                await self._send({"type": "ready", "max_concurrency": WS_MAX_CONCURRENCY, "max_pending": WS_MAX_PENDING})
+                while True:
+                    message = await self.websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        break
+                    text = message.get("text")
+                    if text is None:
+                        text = (message.get("bytes") or b"").decode("utf-8", errors="replace")
+                    await self._handle(text)
+            except WebSocketDisconnect:
+                pass
+            finally:
+                await self._cancel_all()
+
+    async def _handle(self, text: str) -> None:
+        if len(text) > WS_MAX_MESSAGE_CHARS:
+            await self._error(None, 413, f"Message longer than {WS_MAX_MESSAGE_CHARS} characters")
+            return
+        try:
+            message = json.loads(text)
+        except ValueError:
+            await self._error(None, 400, "Message is not valid JSON")
+            return
+        if not isinstance(message, dict):
+            await self._error(None, 400, "Message must be a JSON object")
+            return
+
+        kind = message.get("type")
+        job_id = message.get("id")
+        if not isinstance(job_id, (str, int)) or isinstance(job_id, bool):
+            await self._error(None, 400, "Message needs a string or integer id")
+            return
+        job_id = str(job_id)
+
+        if kind == "analyze":
+            await self._start(job_id, message)
+        elif kind == "cancel":
+            await self._cancel(job_id)
+        else:
+            await self._error(job_id, 400, f"Unknown message type: {kind}")
+
+    async def _start(self, job_id: str, message: dict) -> None:
+        sentence = message.get("sentence")
+        if not isinstance(sentence, str) or not sentence.strip():
+            await self._error(job_id, 400, "Sentence cannot be empty")
+            return
+        if job_id in self.jobs:
+            await self._error(job_id, 409, "A job with this id is already in progress")
+            return
+        if len(self.jobs) >= WS_MAX_PENDING:
+            WS_JOBS.inc(outcome="rejected")
+            await self._error(job_id, 429, f"At most {WS_MAX_PENDING} jobs per connection", retry_after=1.0)
+            return
+        timeout = message.get("timeout")
+        if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or timeout <= 0:
+            timeout = None
+
+        task = asyncio.create_task(self._analyze(job_id, sentence.strip(), timeout))
+        self.jobs[job_id] = task
+        task.add_done_callback(lambda done: self._forget(job_id, done))
+
+    def _forget(self, job_id: str, task: asyncio.Task) -> None:
+        # The id may already belong to a newer job if this one was cancelled
+        if self.jobs.get(job_id) is task:
+            del self.jobs[job_id]
+
+    async def _cancel(self, job_id: str) -> None:
+        task = self.jobs.pop(job_id, None)
+        if task is None:
+            # Already finished (its result is on the way) or never started
+            return
+        task.cancel()
+        WS_JOBS.inc(outcome="cancelled")
+        await self._send({"type": "cancelled", "id": job_id})
+
+    async def _cancel_all(self) -> None:
+        tasks = list(self.jobs.values())
+        self.jobs.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            logger.info("[WebSocket] Connection closed, cancelled %s job(s)", len(tasks))
+            WS_JOBS.inc(len(tasks), outcome="disconnect")
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _analyze(self, job_id: str, sentence: str, timeout: Optional[float]) -> None:
+        async with self._slots:
+            # Each job is its own request: own lane deadline and admission slot
+            set_request_priority(Priority.INTERACTIVE, timeout)
+            loop = asyncio.get_running_loop()
+            deadline = upstream_deadline.get()
+            try:
+                if admission is not None:
+                    await admission.acquire(self.client, Priority.INTERACTIVE, deadline)
+                started = time.monotonic()
+                completed = False
+                try:
+                    analysis = await asyncio.wait_for(
+                        SentenceAnalyzerService.analyze_single_sentence(sentence),
+                        max(0.0, deadline - loop.time()),
+                    )
+                    completed = True
+                finally:
+                    if admission is not None:
+                        admission.release(self.client, Priority.INTERACTIVE, time.monotonic() - started if completed else None)
+            except asyncio.TimeoutError:
+                WS_JOBS.inc(outcome="error")
+                error = DeadlineExceededError()
+                await self._error(job_id, error.status_code, error.detail)
+                return
+            except HTTPException as e:
+                WS_JOBS.inc(outcome="error")
+                await self._error(job_id, e.status_code, str(e.detail), getattr(e, "retry_after", None))
+                return
+            except Exception as e:
+                logger.error("[WebSocket] Unexpected error for job %s: %s", job_id, e, exc_info=True)
+                WS_JOBS.inc(outcome="error")
+                await self._error(job_id, 500, "Internal server error")
+                return
+
+        WS_JOBS.inc(outcome="ok")
+        await self._send({"type": "result", "id": job_id, "analysis": analysis})
+
+    async def _error(self, job_id: Optional[str], status: int, detail: str, retry_after: Optional[float] = None) -> None:
+        frame = {"type": "error", "id": job_id, "status": status, "detail": detail}
+        if retry_after is not None:
+            frame["retry_after"] = retry_after
+        await self._send(frame)
+
+    async def _send(self, frame: dict) -> None:
+        # Jobs finish concurrently; one frame goes out at a time
+        async with self._send_lock:
+            try:
+                await self.websocket.send_text(encode_json(frame).decode("utf-8"))
+            except (WebSocketDisconnect, RuntimeError):
+                # The receive loop notices the closed connection and cancels the rest
+                pass
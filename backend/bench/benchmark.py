@@ -0,0 +1,291 @@
+"""
+Load and latency benchmark for the DutchHelper API.
+
+Drives /api/analyze and /api/analyze-sentence at fixed concurrency levels and
+reports p50/p95/p99 latency, requests per second and backend memory. Results
+can be saved as a baseline and later runs compared against it; a regression
+beyond the tolerance makes the script exit with status 1.
+
+Usage (from the backend directory):
+    # Start the fake upstream and the backend, benchmark, then stop both
+    python -m bench.benchmark --spawn --concurrency 1 8 32 --requests 200 --save-baseline bench/baseline.json
+
+    # Later: compare against the stored baseline
+    python -m bench.benchmark --spawn --concurrency 1 8 32 --requests 200 --compare bench/baseline.json
+
+    # Against an already running backend
+    python -m bench.benchmark --base-url http://127.0.0.1:8000 --endpoint analyze-sentence
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Optional
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SENTENCES = [
+    "Ik heb een kat",
+    "De kat zit op de tafel",
+    "Wij gaan morgen naar de markt",
+    "Het weer is vandaag erg mooi",
+    "Kun je mij helpen met mijn huiswerk",
+    "Zij woont al tien jaar in Amsterdam",
+    "Mijn broer werkt bij een groot bedrijf",
+    "We hebben gisteren een film gekeken",
+    "Het boek ligt op de stoel naast het raam",
+    "Ik sta elke ochtend om zeven uur op",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Return the pct-th percentile using linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Resident memory of a process in MB (Linux only)"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class RequestFactory:
+    """Produces request bodies, optionally repeating sentences to exercise the cache"""
+
+    def __init__(self, repeat_ratio: float, sentences_per_text: int):
+        self.repeat_ratio = repeat_ratio
+        self.sentences_per_text = sentences_per_text
+        self.counter = 0
+
+    def sentence(self) -> str:
+        base = random.choice(SENTENCES)
+        if random.random() < self.repeat_ratio:
+            return base
+        # A unique suffix defeats the analysis cache so the full request path is measured
+        self.counter += 1
+        return f"{base} nummer {self.counter}"
+
+    def body(self, endpoint: str) -> dict:
+        if endpoint == "analyze":
+            return {"text": ". ".join(self.sentence() for _ in range(self.sentences_per_text)) + "."}
+        return {"sentence": self.sentence()}
+
+
+async def run_level(client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int,
+                    factory: RequestFactory, backend_pid: Optional[int]) -> dict:
+    """Send total requests to one endpoint with a fixed number of workers"""
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+    peak_rss = rss_mb(backend_pid)
+
+    async def worker():
+        nonlocal remaining, errors, peak_rss
+        while remaining > 0:
+            remaining -= 1
+            body = factory.body(endpoint)
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"/api/{endpoint}", json=body)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+            current = rss_mb(backend_pid)
+            if current is not None and (peak_rss is None or current > peak_rss):
+                peak_rss = current
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+    }
+
+
+def wait_for(url: str, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def spawn(args: argparse.Namespace) -> list[subprocess.Popen]:
+    """Start the fake upstream and a backend pointed at it"""
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "bench.fake_openrouter", "--port", str(args.fake_port),
+         "--latency-dist", args.latency_dist, "--latency-ms", str(args.latency_ms),
+         "--error-rate", str(args.error_rate), "--rate-429", str(args.rate_429), "--seed", "1"],
+        cwd=BACKEND_DIR,
+    )
+    wait_for(f"http://127.0.0.1:{args.fake_port}/stats")
+
+    env = dict(os.environ)
+    env.update({
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{args.fake_port}/api/v1/chat/completions",
+        "OPENROUTER_API_KEY": env.get("OPENROUTER_API_KEY") or "bench",
+        "ANALYSIS_CACHE_PATH": "",
+    })
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+    wait_for(f"http://127.0.0.1:{args.port}/health")
+    return [fake, backend]
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """List regressions of p95 latency or throughput beyond the tolerance"""
+    previous = {(r["endpoint"], r["concurrency"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        label = f"{result['endpoint']} @ c={result['concurrency']}"
+        if before["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if before["rps"] and result["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: rps {before['rps']} -> {result['rps']}")
+    return regressions
+
+
+def print_table(results: list[dict]) -> None:
+    header = f"{'endpoint':<18}{'conc':>6}{'reqs':>7}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{r['endpoint']:<18}{r['concurrency']:>6}{r['requests']:>7}{r['errors']:>6}{r['rps']:>9.2f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{rss:>9}")
+
+
+async def run(args: argparse.Namespace, backend_pid: Optional[int]) -> list[dict]:
+    endpoints = ["analyze", "analyze-sentence"] if args.endpoint == "both" else [args.endpoint]
+    factory = RequestFactory(args.repeat_ratio, args.sentences_per_text)
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    results = []
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for endpoint in endpoints:
+            for concurrency in args.concurrency:
+                result = await run_level(client, endpoint, concurrency, args.requests, factory, backend_pid)
+                results.append(result)
+                print(f"  {endpoint} c={concurrency}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                      f"rps={result['rps']} errors={result['errors']}", file=sys.stderr)
+    return results
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the DutchHelper API")
+    parser.add_argument("--base-url", default=None, help="Backend to benchmark (default: the spawned one)")
+    parser.add_argument("--endpoint", choices=["analyze", "analyze-sentence", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--sentences-per-text", type=int, default=5, help="Sentences per /api/analyze request")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0,
+                        help="Fraction of sentences drawn from a small fixed set (cache hits)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--backend-pid", type=int, default=None, help="PID to sample memory from")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake upstream and a backend")
+    parser.add_argument("--port", type=int, default=8100, help="Port for the spawned backend")
+    parser.add_argument("--fake-port", type=int, default=9100, help="Port for the spawned fake upstream")
+    parser.add_argument("--latency-dist", default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--save-baseline", default=None, help="Store results as the new baseline")
+    parser.add_argument("--compare", default=None, help="Baseline file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    random.seed(1)
+    processes = []
+    backend_pid = args.backend_pid
+    if args.spawn:
+        processes = spawn(args)
+        backend_pid = processes[1].pid
+        args.base_url = args.base_url or f"http://127.0.0.1:{args.port}"
+    args.base_url = args.base_url or "http://127.0.0.1:8000"
+
+    try:
+        results = asyncio.run(run(args, backend_pid))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_table(results)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {
+            "requests": args.requests,
+            "sentences_per_text": args.sentences_per_text,
+            "repeat_ratio": args.repeat_ratio,
+            "latency_dist": args.latency_dist,
+            "latency_ms": args.latency_ms,
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
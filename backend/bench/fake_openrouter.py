@@ -0,0 +1,293 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Answers the prompts built by OpenRouterService with canned analyses in the
+requested JSON format, after a latency drawn from a configurable distribution.
+Error and 429 rates can be injected, and stream=true is answered with
+server-sent events like the real API. Latency can grow with uncached prompt
+tokens and with generated tokens; repeated system prompts count as cached,
+and output beyond max_tokens is cut off with finish_reason "length". Answers
+can also be cut off at random (--truncate-rate) or wrapped in prose and code
+fences (--chatter-rate); follow-ups asking for the tail of a cut-off answer
+are answered with the remaining components only.
+
+Usage (from the backend directory):
+    python -m bench.fake_openrouter --port 9100 --latency-dist lognormal --latency-ms 800
+
+Then start the backend against it:
+    OPENROUTER_BASE_URL=http://127.0.0.1:9100/api/v1/chat/completions OPENROUTER_API_KEY=bench \\
+        python -m uvicorn app.main:app --port 8000
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SENTENCE_RE = re.compile(r'^Sentence: "(.*)"$', re.MULTILINE)
+BATCH_SENTENCE_RE = re.compile(r'^\[(\d+)\] "(.*)"$', re.MULTILINE)
+TAIL_RE = re.compile(r'^Remaining from position (\d+): "(.*)"$', re.MULTILINE)
+WORD_RE = re.compile(r"[A-Za-zÀ-ÿ']+")
+
+ARTICLES = {"de", "het", "een"}
+PRONOUNS = {"ik", "jij", "je", "hij", "zij", "ze", "wij", "we", "jullie", "u", "het"}
+
+
+class FakeConfig:
+    """Behaviour of the fake upstream, set from the command line"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency_dist = args.latency_dist
+        self.latency_ms = args.latency_ms
+        self.latency_spread = args.latency_spread
+        self.error_rate = args.error_rate
+        self.rate_429 = args.rate_429
+        self.retry_after = args.retry_after
+        self.stream_chunk_chars = args.stream_chunk_chars
+        self.seed = args.seed
+        self.model_latency_ms = parse_model_overrides(args.model_latency_ms)
+        self.model_error_rate = parse_model_overrides(args.model_error_rate)
+        self.ms_per_prompt_token = args.ms_per_prompt_token
+        self.ms_per_completion_token = args.ms_per_completion_token
+        self.truncate_rate = args.truncate_rate
+        self.chatter_rate = args.chatter_rate
+
+
+def parse_model_overrides(values: list[str]) -> dict[str, float]:
+    """Parse repeated MODEL=VALUE options"""
+    overrides = {}
+    for value in values:
+        model, _, number = value.rpartition("=")
+        overrides[model] = float(number)
+    return overrides
+
+
+config: FakeConfig = None
+stats = {"requests": 0, "streamed": 0, "errors": 0, "rate_limited": 0, "truncated": 0, "chatty": 0, "tails": 0,
+         "models": {}}
+# System prompts seen before; like provider-side prompt caching, their tokens are not processed again
+seen_prefixes: set[str] = set()
+app = FastAPI(title="Fake OpenRouter")
+
+
+def sample_latency(model: str = "") -> float:
+    """Draw one response latency in seconds from the configured distribution"""
+    mean = config.model_latency_ms.get(model, config.latency_ms) / 1000
+    if config.latency_dist == "fixed":
+        value = mean
+    elif config.latency_dist == "uniform":
+        spread = mean * config.latency_spread
+        value = random.uniform(mean - spread, mean + spread)
+    elif config.latency_dist == "exponential":
+        value = random.expovariate(1 / mean)
+    else:
+        # Lognormal with the given mean; spread is sigma of the underlying normal
+        sigma = config.latency_spread
+        value = random.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+    return max(0.0, value)
+
+
+def analyze(sentence: str, offset: int = 0) -> dict:
+    """Build a plausible analysis in the format requested by _build_analysis_prompt"""
+    components = []
+    for match in WORD_RE.finditer(sentence):
+        word = match.group(0)
+        lower = word.lower()
+        if lower in ARTICLES:
+            component = {"type": "article", "details": {"article-type": "indefinite" if lower == "een" else "definite"}}
+        elif lower in PRONOUNS:
+            component = {"type": "pronoun", "details": {"person": "personal"}}
+        elif len(components) == 1:
+            component = {"type": "verb", "details": {"verb-tense": "present", "infinitive": lower + "en"}}
+        else:
+            component = {"type": "noun", "details": {"de-or-het": "de"}}
+        components.append({
+            "word": word,
+            "type": component["type"],
+            "position": match.start() + offset,
+            "translation": f"<{lower}>",
+            "details": component["details"],
+        })
+    return {"sentence_translation": f"<translation of: {sentence}>", "components": components}
+
+
+def build_content(prompt: str) -> str:
+    """Answer a single-sentence, batched or tail follow-up analysis prompt"""
+    tail = TAIL_RE.search(prompt)
+    if tail:
+        stats["tails"] += 1
+        analysis = analyze(tail.group(2), int(tail.group(1)))
+        if '{"sentence_translation"' not in prompt[tail.end():]:
+            del analysis["sentence_translation"]
+        return json.dumps(analysis, ensure_ascii=False)
+    batch = BATCH_SENTENCE_RE.findall(prompt)
+    if batch:
+        return json.dumps([dict(index=int(index), **analyze(sentence)) for index, sentence in batch], ensure_ascii=False)
+    match = SENTENCE_RE.search(prompt)
+    if match:
+        sentence = match.group(1)
+    else:
+        # Prompts without a "Sentence:" line carry the bare sentence as the last line
+        lines = prompt.strip().splitlines()
+        sentence = lines[-1] if lines else ""
+    return json.dumps(analyze(sentence), ensure_ascii=False)
+
+
+def add_chatter(content: str) -> str:
+    """Wrap an answer in prose and a code fence, with stray braces, like chatty models do"""
+    return ("Sure! Here is the analysis {as requested}:\n```json\n" + content
+            + "\n```\nLet me know if you want more details on any {word}.")
+
+
+def cached_prefix_tokens(body: dict) -> int:
+    """Tokens of leading system messages already seen, remembering new ones"""
+    cached = 0
+    for message in body.get("messages", []):
+        if message.get("role") != "system":
+            break
+        text = prompt_text({"messages": [message]})
+        if text in seen_prefixes:
+            cached += len(text) // 4
+        else:
+            seen_prefixes.add(text)
+    return cached
+
+
+def prompt_text(body: dict) -> str:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            parts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+        elif isinstance(content, str):
+            parts.append(content)
+    return "\n".join(parts)
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    model = body.get("model", "fake/model")
+    stats["models"][model] = stats["models"].get(model, 0) + 1
+    error_rate = config.model_error_rate.get(model, config.error_rate)
+    roll = random.random()
+    if roll < config.rate_429:
+        stats["rate_limited"] += 1
+        await asyncio.sleep(0.01)
+        return JSONResponse(
+            {"error": {"code": 429, "message": "Rate limit exceeded"}},
+            status_code=429,
+            headers={"Retry-After": str(config.retry_after)},
+        )
+    if roll < config.rate_429 + error_rate:
+        stats["errors"] += 1
+        await asyncio.sleep(sample_latency(model) / 2)
+        return JSONResponse({"error": {"code": 502, "message": "Upstream provider error"}}, status_code=502)
+
+    prompt = prompt_text(body)
+    content = build_content(prompt)
+    finish_reason = "stop"
+    max_tokens = body.get("max_tokens")
+    if isinstance(max_tokens, int) and len(content) // 4 > max_tokens:
+        stats["truncated"] += 1
+        content = content[:max_tokens * 4]
+        finish_reason = "length"
+    elif not TAIL_RE.search(prompt) and random.random() < config.truncate_rate:
+        stats["truncated"] += 1
+        content = content[:int(len(content) * random.uniform(0.2, 0.9))]
+        finish_reason = "length"
+    if random.random() < config.chatter_rate:
+        stats["chatty"] += 1
+        content = add_chatter(content) if finish_reason == "stop" else "```json\n" + content
+    cached = cached_prefix_tokens(body)
+    usage = {
+        "prompt_tokens": len(prompt) // 4,
+        "completion_tokens": len(content) // 4,
+        "total_tokens": len(prompt) // 4 + len(content) // 4,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+    latency = sample_latency(model) + (
+        (usage["prompt_tokens"] - cached) * config.ms_per_prompt_token
+        + usage["completion_tokens"] * config.ms_per_completion_token
+    ) / 1000
+
+    if body.get("stream"):
+        stats["streamed"] += 1
+        chunks = [content[i:i + config.stream_chunk_chars] for i in range(0, len(content), config.stream_chunk_chars)]
+        # Time to first token is a fifth of the total; the rest is spread over the chunks
+        first_delay = latency * 0.2
+        chunk_delay = latency * 0.8 / max(len(chunks), 1)
+
+        async def events():
+            await asyncio.sleep(first_delay)
+            yield ": OPENROUTER PROCESSING\n\n"
+            for chunk in chunks:
+                payload = {"id": "fake", "model": model, "choices": [{"index": 0, "delta": {"content": chunk}}]}
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(chunk_delay)
+            final = {"id": "fake", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": "fake",
+        "model": model,
+        "created": int(time.time()),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake OpenRouter chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "exponential", "lognormal"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Mean response latency")
+    parser.add_argument("--latency-spread", type=float, default=0.5,
+                        help="Relative half-width for uniform, sigma for lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 502")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--stream-chunk-chars", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--ms-per-prompt-token", type=float, default=0.0,
+                        help="Extra latency per uncached prompt token (system prompts seen before are cached)")
+    parser.add_argument("--ms-per-completion-token", type=float, default=0.0,
+                        help="Extra latency per generated token")
+    parser.add_argument("--model-latency-ms", action="append", default=[], metavar="MODEL=MS",
+                        help="Mean latency for one model (repeatable), e.g. to exercise hedging")
+    parser.add_argument("--model-error-rate", action="append", default=[], metavar="MODEL=RATE",
+                        help="502 rate for one model (repeatable), e.g. to trip its circuit breaker")
+    parser.add_argument("--truncate-rate", type=float, default=0.0,
+                        help="Fraction of answers cut off at a random point (tail follow-ups are never cut)")
+    parser.add_argument("--chatter-rate", type=float, default=0.0,
+                        help="Fraction of answers wrapped in prose and a code fence")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    global config
+    args = parse_args(argv)
+    config = FakeConfig(args)
+    if config.seed is not None:
+        random.seed(config.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
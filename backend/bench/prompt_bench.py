@@ -0,0 +1,94 @@
+"""
+Token and latency comparison of the "full" and "compact" analysis prompts.
+
+For every sentence, builds the request of each prompt mode and sends it to an
+OpenRouter-compatible endpoint one at a time. It reports, per mode:
+  - prompt tokens, and how many of them the provider served from its prompt cache
+  - completion tokens and the max_tokens that was requested
+  - latency (mean and p95)
+  - how many responses parsed into components
+Token counts come from the usage block of each response. The compact mode uses
+adaptive max_tokens; the full mode always asks for ANALYSIS_MAX_TOKENS.
+
+Usage (from the backend directory):
+    # Against the fake upstream, with latency that grows with uncached prompt and completion tokens
+    python -m bench.fake_openrouter --port 9100 --latency-dist fixed --latency-ms 150 \\
+        --ms-per-prompt-token 0.2 --ms-per-completion-token 8 &
+    python -m bench.prompt_bench --base-url http://127.0.0.1:9100/api/v1/chat/completions
+
+    # Against OpenRouter itself (uses OPENROUTER_API_KEY)
+    python -m bench.prompt_bench --base-url https://openrouter.ai/api/v1/chat/completions --repeat 2
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from app.llm_service import OpenRouterService, ANALYSIS_MAX_TOKENS
+from bench.benchmark import SENTENCES, percentile
+
+MODES = {
+    # mode: adaptive max_tokens
+    "full": False,
+    "compact": True,
+}
+
+
+async def run_mode(client: httpx.AsyncClient, args: argparse.Namespace, mode: str, adaptive: bool) -> dict:
+    totals = {"prompt": 0, "cached": 0, "completion": 0, "max_tokens": 0, "parsed": 0, "calls": 0}
+    latencies = []
+    for _ in range(args.repeat):
+        for sentence in SENTENCES:
+            messages = OpenRouterService._build_messages(sentence, mode)
+            max_tokens = OpenRouterService._max_tokens_for(sentence, adaptive)
+            body = OpenRouterService._completion_body(messages, max_tokens, args.model)
+            started = time.perf_counter()
+            response = await client.post(args.base_url, json=body)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            result = response.json()
+            usage = result.get("usage") or {}
+            totals["prompt"] += usage.get("prompt_tokens", 0)
+            totals["cached"] += (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+            totals["completion"] += usage.get("completion_tokens", 0)
+            totals["max_tokens"] += max_tokens
+            components, _, _ = OpenRouterService._parse_llm_response(result["choices"][0]["message"]["content"], sentence)
+            totals["parsed"] += bool(components)
+            totals["calls"] += 1
+    calls = totals["calls"]
+    return {
+        "mode": mode,
+        "prompt": totals["prompt"] / calls,
+        "cached": totals["cached"] / calls,
+        "completion": totals["completion"] / calls,
+        "max_tokens": totals["max_tokens"] / calls,
+        "mean_ms": sum(latencies) / calls * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "parsed": f"{totals['parsed']}/{calls}",
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("OPENROUTER_BASE_URL", "http://127.0.0.1:9100/api/v1/chat/completions"))
+    parser.add_argument("--model", default=os.getenv("OPENROUTER_MODEL", "mistralai/mistral-nemo"))
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the sentence set per mode")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY', 'bench')}"}
+    async with httpx.AsyncClient(headers=headers, timeout=120) as client:
+        rows = [await run_mode(client, args, mode, adaptive) for mode, adaptive in MODES.items()]
+
+    print(f"{len(SENTENCES)} sentences x {args.repeat} passes, model {args.model}, "
+          f"full-mode max_tokens {ANALYSIS_MAX_TOKENS}\n")
+    print(f"{'mode':8s} {'prompt tok':>10s} {'cached':>8s} {'compl tok':>10s} {'max_tokens':>10s} "
+          f"{'mean ms':>9s} {'p95 ms':>9s} {'parsed':>8s}")
+    for row in rows:
+        print(f"{row['mode']:8s} {row['prompt']:10.0f} {row['cached']:8.0f} {row['completion']:10.0f} "
+              f"{row['max_tokens']:10.0f} {row['mean_ms']:9.1f} {row['p95_ms']:9.1f} {row['parsed']:>8s}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Salvage rate of the tolerant LLM-output parser vs. the old span-based parser.
+
+Generates answers the way bench/fake_openrouter.py does, then cuts some off
+at a random point (as max_tokens does) and wraps some in prose and code
+fences (as chatty models do). Each answer is parsed by:
+  - legacy: json.loads of the text between the first "{" and the last "}"
+    (the parser before recovery was added)
+  - recover: OpenRouterService._parse_llm_response, which ignores
+    surrounding text and salvages complete components from cut-off JSON
+
+and the bench reports, per parser, the share of answers that yield
+components and the parse time. It also estimates upstream calls per useful
+result. An empty result is assumed to make the user re-analyze (one more
+full call). With recovery, a cut-off answer costs one tail request
+instead; tails are short and assumed to complete.
+
+Batched answers (a JSON array with one analysis per sentence) are cut off
+the same way and parsed with OpenRouterService._parse_batch_response. The
+bench reports how many sentences of cut-off batches were salvaged, and how
+many cut-off batches were wrongly taken for a complete (e.g. empty) answer.
+
+Usage (from the backend directory):
+    python -m bench.recovery_bench
+    python -m bench.recovery_bench --truncate-rate 0.2 --chatter-rate 0.1 --samples 5000
+    python -m bench.recovery_bench --batch-size 8
+"""
+import argparse
+import json
+import logging
+import random
+import time
+
+from app.json_stream import recover_array
+from app.llm_service import OpenRouterService
+from bench.benchmark import SENTENCES
+from bench.fake_openrouter import add_chatter, analyze
+
+
+def legacy_parse(content: str) -> list:
+    """The components the old parser got out of an answer"""
+    json_start = content.find("{")
+    json_end = content.rfind("}") + 1
+    if json_start == -1 or json_end == 0:
+        return []
+    try:
+        data = json.loads(content[json_start:json_end])
+    except json.JSONDecodeError:
+        return []
+    return OpenRouterService._build_components(data.get("components", []))
+
+
+def make_answers(args: argparse.Namespace) -> list[tuple[str, bool]]:
+    """Answers as (content, cut off) pairs"""
+    rng = random.Random(args.seed)
+    answers = []
+    for i in range(args.samples):
+        content = json.dumps(analyze(SENTENCES[i % len(SENTENCES)]), ensure_ascii=False)
+        cut = rng.random() < args.truncate_rate
+        if cut:
+            content = content[:int(len(content) * rng.uniform(0.2, 0.9))]
+        if rng.random() < args.chatter_rate:
+            content = "```json\n" + content if cut else add_chatter(content)
+        answers.append((content, cut))
+    return answers
+
+
+def make_batches(args: argparse.Namespace) -> list[tuple[str, list[str], bool]]:
+    """Batched answers as (content, sentences, cut off) tuples"""
+    rng = random.Random(args.seed)
+    batches = []
+    for i in range(0, args.samples, args.batch_size):
+        sentences = [SENTENCES[j % len(SENTENCES)] for j in range(i, i + args.batch_size)]
+        content = json.dumps([dict(index=index, **analyze(sentence)) for index, sentence in enumerate(sentences)],
+                             ensure_ascii=False)
+        cut = rng.random() < args.truncate_rate
+        if cut:
+            content = content[:int(len(content) * rng.uniform(0.2, 0.9))]
+        batches.append((content, sentences, cut))
+    # Cut inside a string after an empty "components": [], which used to be taken for the whole answer
+    first = json.dumps(dict(index=0, **analyze(SENTENCES[0])), ensure_ascii=False)
+    batches.append(('[' + first + ', {"index": 1, "components": [], "sentence_translation": "The ca', SENTENCES[:2], True))
+    return batches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--truncate-rate", type=float, default=0.1, help="Fraction of answers cut off")
+    parser.add_argument("--chatter-rate", type=float, default=0.1, help="Fraction of answers wrapped in prose")
+    parser.add_argument("--batch-size", type=int, default=5, help="Sentences per batched answer")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    # The recovering parser logs every salvage at WARNING
+    logging.disable(logging.WARNING)
+
+    answers = make_answers(args)
+
+    started = time.perf_counter()
+    legacy = [legacy_parse(content) for content, _ in answers]
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    recovered = [OpenRouterService._parse_llm_response(content, "") for content, _ in answers]
+    recover_seconds = time.perf_counter() - started
+
+    n = len(answers)
+    legacy_useful = sum(1 for components in legacy if components) / n
+    # Complete answers are useful as-is; cut-off ones with any output are finished by a tail request
+    recover_useful = sum(1 for components, translation, _ in recovered if components or translation) / n
+    tails = sum(1 for components, translation, cut in recovered if cut and (components or translation)) / n
+    salvaged = sum(1 for (components, _, cut), (_, was_cut) in zip(recovered, answers) if was_cut and components)
+    cut_total = sum(1 for _, was_cut in answers if was_cut)
+
+    print(f"{n} answers, {args.truncate_rate:.0%} cut off, {args.chatter_rate:.0%} wrapped in prose\n")
+    print(f"{'parser':8s} {'useful':>8s} {'us/parse':>9s} {'calls/useful':>13s}")
+    print(f"{'legacy':8s} {legacy_useful:8.1%} {legacy_seconds / n * 1e6:9.1f} {1 / legacy_useful:13.3f}")
+    print(f"{'recover':8s} {recover_useful:8.1%} {recover_seconds / n * 1e6:9.1f} {(1 + tails) / recover_useful:13.3f}")
+    if cut_total:
+        print(f"\ncut-off answers with salvaged components: {salvaged}/{cut_total}")
+
+    batches = make_batches(args)
+    cut_sentences = salvaged_sentences = false_complete = 0
+    for content, sentences, cut in batches:
+        if not cut:
+            continue
+        cut_sentences += len(sentences)
+        parsed = OpenRouterService._parse_batch_response(content, sentences)
+        salvaged_sentences += sum(1 for analysis in parsed or [] if analysis is not None)
+        if recover_array(content).complete:
+            false_complete += 1
+    cut_batches = sum(1 for _, _, cut in batches if cut)
+    print(f"\n{len(batches)} batches of {args.batch_size}, {cut_batches} cut off")
+    print(f"sentences salvaged from cut-off batches: {salvaged_sentences}/{cut_sentences}")
+    print(f"cut-off batches taken for complete answers: {false_complete}/{cut_batches}")
+
+
+if __name__ == "__main__":
+    main()
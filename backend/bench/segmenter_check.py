@@ -0,0 +1,78 @@
+"""
+Correctness and speed check for the Dutch sentence segmenter.
+
+Runs every case in segmenter_corpus.jsonl through app.segmenter and reports
+mismatches, checks that the returned offsets point back into the original
+text, and compares fragment counts (each fragment is one upstream LLM call)
+and split throughput against the previous regex splitter. Exits with status 1
+if any case fails.
+
+Usage (from the backend directory):
+    python -m bench.segmenter_check
+    python -m bench.segmenter_check --repeat 2000
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from app import segmenter
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "segmenter_corpus.jsonl")
+
+
+def legacy_split(text: str) -> list[str]:
+    """The splitter segmenter replaced: break on every run of . ! ?"""
+    return [s.strip() for s in re.split(r"[.!?]+", text) if s.strip() and re.search(r"[a-zA-ZÀ-ÿ]+", s)]
+
+
+def load_corpus(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(corpus: list[dict]) -> int:
+    failures = 0
+    for case in corpus:
+        segments = segmenter.segment(case["text"])
+        got = [s.text for s in segments]
+        bad_offsets = [s for s in segments if case["text"][s.start:s.end] != s.text]
+        if got != case["sentences"] or bad_offsets:
+            failures += 1
+            print(f"FAIL {case['text']!r}")
+            print(f"  expected: {case['sentences']}")
+            print(f"  got:      {got}")
+    return failures
+
+
+def benchmark(corpus: list[dict], repeat: int) -> None:
+    document = "\n\n".join(case["text"] for case in corpus)
+    for name, split in (("legacy", legacy_split), ("segmenter", segmenter.split_sentences)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fragments = split(document)
+        elapsed = time.perf_counter() - started
+        per_mb = elapsed / repeat / (len(document.encode("utf-8")) / 1e6)
+        print(f"{name:10s} {len(fragments):4d} fragments   {elapsed / repeat * 1e6:8.1f} us/document   {per_mb * 1e3:7.1f} ms/MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    failures = check(corpus)
+    expected = sum(len(case["sentences"]) for case in corpus)
+    legacy = sum(len(legacy_split(case["text"])) for case in corpus)
+    print(f"{len(corpus) - failures}/{len(corpus)} cases passed")
+    print(f"sentences expected: {expected}, legacy fragments: {legacy} ({legacy - expected:+d} LLM calls)")
+    benchmark(corpus, args.repeat)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
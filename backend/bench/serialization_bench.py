@@ -0,0 +1,135 @@
+"""
+Micro-benchmark for building and serializing analysis responses.
+
+Compares, per analyzed sentence:
+  - building SentenceComponents with validation vs. model_construct
+  - the response_model path FastAPI takes for a returned model (validate,
+    serialize to dicts, json.dumps) vs. FastJSONResponse (one pass through
+    pydantic-core's JSON encoder)
+  - gzip (and brotli, when installed) size and time for the encoded body
+
+Usage (from the backend directory):
+    python -m bench.serialization_bench
+    python -m bench.serialization_bench --sentences 200 --components 15 --repeat 50
+"""
+import argparse
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from app.main import app
+from app.models import SentenceAnalysis, SentenceComponent, TextAnalysisResponse
+from app.responses import FastJSONResponse, brotli, compress, orjson
+
+WORDS = ["De", "kinderen", "spelen", "vandaag", "buiten", "in", "de", "grote", "tuin", "van", "hun", "oma"]
+
+
+def component_data(index: int) -> dict:
+    """One component as the LLM returns it, with a realistic details dict"""
+    word = WORDS[index % len(WORDS)]
+    return {
+        "type": "noun",
+        "word": word,
+        "position": index * 6,
+        "translation": f"{word.lower()} (en)",
+        "details": {
+            "gender": "de",
+            "plural": f"{word.lower()}en",
+            "definite": True,
+            "explanation": f"'{word}' is a common noun; with 'de' it takes an inflected adjective.",
+        },
+    }
+
+
+def build_validated(items: list[dict]) -> list[SentenceComponent]:
+    return [
+        SentenceComponent(type=i["type"], value=i["word"], position=i["position"],
+                          translation=i["translation"], details=i["details"])
+        for i in items
+    ]
+
+
+def build_constructed(items: list[dict]) -> list[SentenceComponent]:
+    return [
+        SentenceComponent.model_construct(type=i["type"], value=i["word"], position=i["position"],
+                                          translation=i["translation"], details=i["details"])
+        for i in items
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    """Average seconds per call"""
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def response_field(path: str):
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path:
+            return route.secure_cloned_response_field
+    raise LookupError(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sentences", type=int, default=100)
+    parser.add_argument("--components", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    items = [component_data(i) for i in range(args.components)]
+    per_sentence = 1e6 / args.sentences
+
+    print(f"{args.sentences} sentences x {args.components} components, orjson={'yes' if orjson else 'no'}, "
+          f"brotli={'yes' if brotli else 'no'}\n")
+
+    print("build components (us/sentence)")
+    for name, build in (("validated", build_validated), ("model_construct", build_constructed)):
+        seconds = timed(lambda: [build(items) for _ in range(args.sentences)], args.repeat)
+        print(f"  {name:28s} {seconds * per_sentence:8.1f}")
+
+    response = TextAnalysisResponse(
+        original_text=" ".join(WORDS),
+        sentences=[
+            SentenceAnalysis(sentence=" ".join(WORDS), sentence_translation="The children play outside today.",
+                             components=build_validated(items))
+            for _ in range(args.sentences)
+        ],
+    )
+    field = response_field("/api/analyze")
+
+    def response_model_path() -> bytes:
+        # serialize_response never suspends for async routes; drive it without an event loop
+        coroutine = serialize_response(field=field, response_content=response)
+        try:
+            coroutine.send(None)
+        except StopIteration as done:
+            return JSONResponse(done.value).body
+        raise RuntimeError("serialize_response suspended")
+
+    def fast_path() -> bytes:
+        return FastJSONResponse(response).body
+
+    print("\nencode TextAnalysisResponse (us/sentence)")
+    before = timed(response_model_path, args.repeat)
+    after = timed(fast_path, args.repeat)
+    print(f"  {'response_model + JSONResponse':28s} {before * per_sentence:8.1f}")
+    print(f"  {'FastJSONResponse':28s} {after * per_sentence:8.1f}   ({before / after:.1f}x faster)")
+    if response_model_path() != fast_path():
+        print("  WARNING: encoded bodies differ")
+
+    body = fast_path()
+    print(f"\ncompress {len(body)} byte body")
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        seconds = timed(lambda: compress(body, encoding), args.repeat)
+        size = len(compress(body, encoding))
+        print(f"  {encoding:28s} {seconds * per_sentence:8.1f} us/sentence   {size} bytes ({size / len(body):.1%})")
+
+
+if __name__ == "__main__":
+    main()
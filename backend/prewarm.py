@@ -0,0 +1,219 @@
+"""
+Pre-warm the analysis cache from a sentence corpus.
+
+The corpus is split into sentences the same way the API splits text, and
+duplicates are dropped. What is left is analyzed through OpenRouterService,
+with bounded concurrency and the upstream scheduler's rate limit, in the
+bulk lane. The analyses are written to a snapshot file that the server maps
+at startup (ANALYSIS_SNAPSHOT_PATH), so known course material is served
+without an LLM call from the first request.
+
+Every analysis is appended to <snapshot>.progress.jsonl as it arrives. An
+interrupted run continues where it stopped when the same command is started
+again. Failed sentences are not recorded and are retried on the next run.
+Analyses from earlier runs with the same model and prompt version stay in the
+progress file, so several corpora can be added to one snapshot one after
+another.
+
+Usage (from the backend directory):
+    python prewarm.py course/week1.txt course/week2.txt
+    python prewarm.py sentences.jsonl --field sentence --concurrency 16 --rate 10
+    python prewarm.py --build-only    # write the snapshot from the progress file as it is
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds between progress lines
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="*", help="Plain text files, or .jsonl files with one record per line")
+    parser.add_argument("--output", help="Snapshot file (default: ANALYSIS_SNAPSHOT_PATH)")
+    parser.add_argument("--field", default="text", help="Text field of JSONL records (default: text)")
+    parser.add_argument("--concurrency", type=int, help="Sentences analyzed at once (default: ANALYZE_MAX_CONCURRENCY_PER_REQUEST)")
+    parser.add_argument("--rate", type=float, help="Upstream requests per second (default: UPSTREAM_RATE_PER_SECOND)")
+    parser.add_argument("--chunk", type=int, default=256, help="Sentences per checkpoint (default: 256)")
+    parser.add_argument("--use-lexicon", action="store_true",
+                        help="Let the local lexicon answer simple sentences instead of the LLM")
+    parser.add_argument("--build-only", action="store_true", help="Only write the snapshot from the progress file")
+    args = parser.parse_args()
+    if not args.corpus and not args.build_only:
+        parser.error("give at least one corpus file, or --build-only")
+    return args
+
+
+def read_corpus(path: str, field: str) -> list[str]:
+    """
+    Read the texts of a corpus file.
+
+    Args:
+        path: Plain text file (one text) or .jsonl file (one text per line,
+            either a JSON string or an object with the text in `field`)
+        field: Text field of JSONL objects
+
+    Returns:
+        Texts to split into sentences
+    """
+    with open(path, encoding="utf-8") as f:
+        if not path.endswith(".jsonl"):
+            return [f.read()]
+        texts = []
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record if isinstance(record, str) else record.get(field)
+            if not isinstance(text, str):
+                raise ValueError(f"{path}:{number}: no '{field}' text")
+            texts.append(text)
+        return texts
+
+
+def read_progress(path: str, prompt_version: str, model: str) -> tuple[dict[str, bytes], int, int]:
+    """
+    Load the analyses recorded by earlier runs.
+
+    Args:
+        path: Progress file
+        prompt_version: Current prompt version; other versions are skipped
+        model: Current model; other models are skipped
+
+    Returns:
+        Tuple of (SentenceAnalysis JSON by cache key, bytes of the file made
+        of complete lines, number of skipped records)
+    """
+    done: dict[str, bytes] = {}
+    committed = 0
+    skipped = 0
+    if not os.path.exists(path):
+        return done, committed, skipped
+    with open(path, "rb") as f:
+        for line in f:
+            # A run killed mid-write leaves a torn last line; it is overwritten on resume
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            committed += len(line)
+            if record["prompt_version"] != prompt_version or record["model"] != model:
+                skipped += 1
+                continue
+            done[record["key"]] = json.dumps(record["analysis"], ensure_ascii=False).encode("utf-8")
+    return done, committed, skipped
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+async def prewarm(args: argparse.Namespace) -> int:
+    # Imported here so the command-line overrides above reach the module-level settings
+    from app.cache import make_cache_key, ANALYSIS_SNAPSHOT_PATH
+    from app.http_client import create_http_client
+    from app.llm_service import OpenRouterService, MODEL
+    from app.scheduler import Priority, set_request_priority
+    from app.snapshot import write_snapshot
+
+    output = args.output or ANALYSIS_SNAPSHOT_PATH
+    progress_path = output + ".progress.jsonl"
+    prompt_version = OpenRouterService.prompt_version()
+    done, committed, skipped = read_progress(progress_path, prompt_version, MODEL)
+    print(f"[Prewarm] Model {MODEL}, prompt version {prompt_version}: {len(done)} analyses in {progress_path}"
+          + (f" ({skipped} from other versions skipped)" if skipped else ""))
+
+    failed = 0
+    if not args.build_only:
+        pending: dict[str, str] = {}
+        total = 0
+        for path in args.corpus:
+            for text in read_corpus(path, args.field):
+                for sentence in OpenRouterService._split_sentences(text):
+                    total += 1
+                    key = make_cache_key(sentence, MODEL, prompt_version)
+                    if key not in done:
+                        pending.setdefault(key, sentence)
+        print(f"[Prewarm] {total} sentences in {len(args.corpus)} file(s), {len(pending)} left to analyze")
+
+        if pending:
+            OpenRouterService.ensure_configured()
+            client = create_http_client()
+            OpenRouterService.set_http_client(client)
+            items = list(pending.items())
+            analyzed = 0
+            started = time.monotonic()
+            reported = started
+            try:
+                with open(progress_path, "ab") as f:
+                    f.truncate(committed)
+                    for start in range(0, len(items), max(1, args.chunk)):
+                        chunk = items[start:start + args.chunk]
+                        # Fresh bulk-lane deadline per chunk, as for background jobs
+                        set_request_priority(Priority.BULK)
+                        async for index, analysis in OpenRouterService.iter_analyses([sentence for _, sentence in chunk]):
+                            key = chunk[index][0]
+                            if analysis.error or analysis.partial or not analysis.components:
+                                failed += 1
+                                continue
+                            payload = analysis.model_dump(mode="json")
+                            f.write(json.dumps({
+                                "key": key, "prompt_version": prompt_version, "model": MODEL, "analysis": payload,
+                            }, ensure_ascii=False).encode("utf-8") + b"\n")
+                            done[key] = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                            analyzed += 1
+
+                            now = time.monotonic()
+                            if now - reported >= PROGRESS_INTERVAL_SECONDS:
+                                reported = now
+                                finished = analyzed + failed
+                                rate = finished / (now - started)
+                                print(f"[Prewarm] {finished}/{len(items)} analyzed ({failed} failed), {rate:.1f}/s, "
+                                      f"ETA {format_eta((len(items) - finished) / rate)}", flush=True)
+                        f.flush()
+                        os.fsync(f.fileno())
+            finally:
+                OpenRouterService.set_http_client(None)
+                await client.aclose()
+            elapsed = time.monotonic() - started
+            print(f"[Prewarm] Analyzed {analyzed} sentence(s) in {elapsed:.1f}s, {failed} failed"
+                  + (" (run again to retry them)" if failed else ""))
+
+    count = write_snapshot(output, done.items(), {
+        "prompt_version": prompt_version,
+        "model": MODEL,
+        "created_at": time.time(),
+    })
+    print(f"[Prewarm] Wrote {count} analyses to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+    return 1 if failed else 0
+
+
+def main() -> None:
+    args = parse_args()
+    if args.concurrency:
+        os.environ["ANALYZE_MAX_CONCURRENCY_PER_REQUEST"] = str(args.concurrency)
+    if args.rate:
+        os.environ["UPSTREAM_RATE_PER_SECOND"] = str(args.rate)
+    if not args.use_lexicon:
+        # The snapshot should hold LLM analyses, not what the lexicon can answer anyway
+        os.environ["LEXICON_ENABLED"] = "False"
+    try:
+        sys.exit(asyncio.run(prewarm(args)))
+    except KeyboardInterrupt:
+        print("\n[Prewarm] Interrupted; finished analyses are kept, run the same command again to resume")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
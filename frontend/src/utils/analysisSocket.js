@@ -0,0 +1,113 @@
+/**
+ * Client for the backend's WebSocket analysis session (GET /api/ws)
+ *
+ * Many sentences are analyzed over one connection instead of one HTTP
+ * request each, which avoids the browser's per-origin connection cap and the
+ * per-request header/CORS overhead. Each sentence is sent with an ID and its
+ * promise settles when the server answers under that ID, in completion order.
+ */
+
+export class AnalysisSocketError extends Error {
+    constructor(detail, status) {
+        super(detail)
+        this.status = status
+    }
+}
+
+export class AnalysisSocket {
+    /**
+     * @param {string} url - WebSocket URL, e.g. ws://localhost:8000/api/ws
+     */
+    constructor(url) {
+        this.url = url
+        this.socket = null
+        this.ready = null
+        this.pending = new Map()
+        this.nextId = 0
+    }
+
+    /**
+     * Open the connection if it is not open yet.
+     * @param {number} timeoutMs - Give up if the server has not said "ready" by then
+     * @returns {Promise<void>} Resolves once the server is ready for jobs
+     */
+    connect(timeoutMs = 3000) {
+        if (this.ready) return this.ready
+        this.ready = new Promise((resolve, reject) => {
+            const socket = new WebSocket(this.url)
+            const timer = setTimeout(() => {
+                socket.close()
+                reject(new Error('WebSocket connection timed out'))
+            }, timeoutMs)
+            this.socket = socket
+
+            socket.onmessage = event => {
+                const message = JSON.parse(event.data)
+                if (message.type === 'ready') {
+                    clearTimeout(timer)
+                    resolve()
+                    return
+                }
+                const job = this.pending.get(String(message.id))
+                if (!job) return
+                this.pending.delete(String(message.id))
+                if (message.type === 'result') {
+                    job.resolve(message.analysis)
+                } else if (message.type === 'cancelled') {
+                    job.reject(new AnalysisSocketError('Cancelled', 499))
+                } else {
+                    job.reject(new AnalysisSocketError(message.detail || 'Unknown error', message.status))
+                }
+            }
+            socket.onerror = () => {
+                clearTimeout(timer)
+                reject(new Error('WebSocket connection failed'))
+            }
+            socket.onclose = () => {
+                clearTimeout(timer)
+                reject(new Error('WebSocket connection closed'))
+                this.failAll('Connection to the server was lost')
+                this.socket = null
+                this.ready = null
+            }
+        })
+        return this.ready
+    }
+
+    /**
+     * Analyze one sentence.
+     * @param {string} sentence - Sentence to analyze
+     * @returns {{id: string, result: Promise<object>}} Job ID (for cancel) and the SentenceAnalysis promise
+     */
+    analyze(sentence) {
+        const id = String(this.nextId++)
+        const result = new Promise((resolve, reject) => {
+            this.pending.set(id, { resolve, reject })
+        })
+        this.socket.send(JSON.stringify({ type: 'analyze', id, sentence }))
+        return { id, result }
+    }
+
+    /**
+     * Stop a job; its promise rejects once the server confirms.
+     * @param {string} id - Job ID returned by analyze
+     */
+    cancel(id) {
+        if (this.pending.has(id) && this.socket) {
+            this.socket.send(JSON.stringify({ type: 'cancel', id }))
+        }
+    }
+
+    cancelAll() {
+        for (const id of this.pending.keys()) this.cancel(id)
+    }
+
+    failAll(detail) {
+        for (const job of this.pending.values()) job.reject(new AnalysisSocketError(detail, 0))
+        this.pending.clear()
+    }
+
+    close() {
+        if (this.socket) this.socket.close()
+    }
+}
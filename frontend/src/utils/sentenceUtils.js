@@ -1,33 +1,153 @@
 /**
  * Utility functions for sentence processing
  * Used by the frontend to split and validate Dutch text before sending to backend
+ *
+ * The segmentation rules mirror backend/app/segmenter.py so both sides agree
+ * on what a sentence is (and therefore on the analysis cache keys).
  */
 
+// Abbreviations (lowercase, without the final period) that never end a sentence
+const ABBREVIATIONS = new Set([
+    'dhr', 'mevr', 'mw', 'mr', 'dr', 'drs', 'ir', 'ing', 'prof', 'st', 'sr', 'jr',
+    'bijv', 'bv', 'o.a', 'd.w.z', 'm.a.w', 'i.p.v', 'm.b.t', 't.a.v', 't.o.v', 'm.u.v',
+    'o.b.v', 'i.v.m', 'n.a.v', 'vgl', 'zgn', 'z.g', 'resp', 'evt', 'ong', 'vs',
+    'nr', 'blz', 'hfst', 'fig', 'afd', 'mln', 'mrd',
+])
+
+// Abbreviations that are also ordinary words; they only continue the sentence before a number
+const NUMBER_ABBREVIATIONS = new Set(['ca', 'art', 'tel', 'gem'])
+
+// Month abbreviations that are also names or words; abbreviations only after a day number
+const MONTH_ABBREVIATIONS = new Set([
+    'jan', 'feb', 'mrt', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'okt', 'nov', 'dec',
+])
+
+// Abbreviations that end a sentence when the next word is capitalized
+const FINAL_ABBREVIATIONS = new Set([
+    'enz', 'etc', 'e.d', 'e.a', 'e.v', 'a.u.b', 'z.s.m', 'jl', 'v.chr', 'n.chr', 'incl', 'excl',
+    'max', 'min',
+])
+
+// Terminator run plus closing quotes followed by whitespace/end; a blank line; or a line break
+const CANDIDATE_RE = /([.!?…]+)(["'”’»)\]]*)(?=\s|$)|(\n[ \t\r\f\v]*\n)|(\n)/gu
+const NEXT_RE = /\s*["'“‘„«([]*(\S?)/uy
+const CLITIC_RE = /\s*'[stk]\b/uy
+const TOKEN_BEFORE_RE = /(\p{L}(?:[\p{L}\p{N}_.]*[\p{L}\p{N}])?)$/u
+const INITIALS_RE = /^(?:[A-Z]\.)*[A-Z]$/
+const DAY_BEFORE_RE = /\d[ \t]*$/
+const DIGIT_RE = /\d/u
+const WORD_RE = /\p{L}/u
+const CONTINUATION_CHARS = ',;-–('
+
+function nextChar(text, pos) {
+    NEXT_RE.lastIndex = pos
+    return NEXT_RE.exec(text)[1]
+}
+
+function isLower(ch) {
+    return ch !== '' && ch === ch.toLowerCase() && ch !== ch.toUpperCase()
+}
+
+function isUpper(ch) {
+    return ch !== '' && ch === ch.toUpperCase() && ch !== ch.toLowerCase()
+}
+
+function startsSentence(text, pos) {
+    const next = nextChar(text, pos)
+    if (!isLower(next)) return true
+    CLITIC_RE.lastIndex = pos
+    return CLITIC_RE.test(text)
+}
+
+function isPeriodBoundary(text, start, dot, end) {
+    const tokenMatch = TOKEN_BEFORE_RE.exec(text.slice(Math.max(start, dot - 24), dot))
+    if (!tokenMatch) return true
+    const token = tokenMatch[1]
+    const lowered = token.toLowerCase()
+    if (ABBREVIATIONS.has(lowered)) return false
+    // "ca. 20", "art. 5", but "Ik tel. Jij telt."
+    if (NUMBER_ABBREVIATIONS.has(lowered)) return !DIGIT_RE.test(nextChar(text, end))
+    // "3 jan.", but "Dit is Jan. Hij is aardig."
+    if (MONTH_ABBREVIATIONS.has(lowered)) {
+        const tokenStart = dot - token.length
+        return !DAY_BEFORE_RE.test(text.slice(Math.max(start, tokenStart - 4), tokenStart))
+    }
+    // "J. de Vries", "A.B. Jansen"
+    if (INITIALS_RE.test(token)) return false
+    if (FINAL_ABBREVIATIONS.has(lowered)) {
+        const next = nextChar(text, end)
+        return next === '' || isUpper(next)
+    }
+    return true
+}
+
+function isBoundary(text, start, match) {
+    if (match[3] !== undefined) return true
+    if (match[4] !== undefined) {
+        // A single line break ends a sentence unless the text is hard-wrapped mid-sentence
+        const before = text.slice(start, match.index).trimEnd()
+        if (before && CONTINUATION_CHARS.includes(before[before.length - 1])) return false
+        return !isLower(nextChar(text, match.index + match[0].length))
+    }
+
+    const end = match.index + match[0].length
+    // '"Kom je?" vroeg hij.' and "Ik dacht... misschien niet."
+    if (!startsSentence(text, end)) return false
+    const term = match[1]
+    if (term === '.') return isPeriodBoundary(text, start, match.index, end)
+    if (term.startsWith('..') || term.startsWith('…')) {
+        // An ellipsis only ends a sentence before a capitalized word or at the end
+        const next = nextChar(text, end)
+        return next === '' || isUpper(next) || !WORD_RE.test(next)
+    }
+    return true
+}
+
+function pushSegment(segments, text, start, end) {
+    const chunk = text.slice(start, end)
+    const stripped = chunk.trim()
+    if (!stripped || !WORD_RE.test(stripped)) return
+    const offset = start + (chunk.length - chunk.trimStart().length)
+    segments.push({ text: stripped, start: offset, end: offset + stripped.length })
+}
+
+/**
+ * Split Dutch text into sentences with their character offsets
+ * Periods after abbreviations ("bijv.", "d.w.z."), initials ("J. de Vries") and
+ * inside numbers ("3.5") do not end a sentence; blank lines always do
+ * @param {string} text - The text to split
+ * @returns {{text: string, start: number, end: number}[]} Sentences with offsets into text
+ */
+export function segmentSentences(text) {
+    const segments = []
+    let start = 0
+    for (const match of text.matchAll(CANDIDATE_RE)) {
+        if (!isBoundary(text, start, match)) continue
+        const end = match[1] !== undefined ? match.index + match[0].length : match.index
+        pushSegment(segments, text, start, end)
+        start = match.index + match[0].length
+    }
+    pushSegment(segments, text, start, text.length)
+    return segments
+}
+
 /**
- * Split text into sentences by common sentence-ending punctuation
+ * Split text into sentences, collapsing line breaks inside a sentence
  * @param {string} text - The text to split
- * @returns {string[]} Array of sentence fragments
+ * @returns {string[]} Array of sentences
  */
 export function splitSentences(text) {
-    // Split by common sentence-ending punctuation (.!?)
-    const sentences = text.split(/[.!?]+/)
-        .map(s => s.trim())
-        .filter(Boolean)
-    return sentences
+    return segmentSentences(text).map(s => s.text.replace(/\s+/g, ' '))
 }
 
 /**
  * Check if a sentence is valid (contains at least one word)
- * A valid sentence must have at least one letter sequence (including accented characters)
+ * A valid sentence must have at least one letter (any script, including accented characters)
  * @param {string} sentence - The sentence to validate
  * @returns {boolean} True if valid, false otherwise
  */
 export function isValidSentence(sentence) {
-    // Check if sentence contains at least one word (letter sequence)
-    // Pattern matches English letters (a-z, A-Z) and accented characters (À-ÿ)
-    // This supports Dutch, French, German, Spanish, Portuguese, Italian, etc.
-    const hasWord = /[a-zA-Z\u00C0-\u00FF]+/.test(sentence)
-    return hasWord
+    return WORD_RE.test(sentence)
 }
 
 /**